@@ -0,0 +1,151 @@
+# background_writer.py
+
+import threading
+import time
+from file_handling import get_backend, record_operations
+
+"""
+This module contains the writer that persists changes off the interactive path.
+The menu and the daemon apply every change to the in-memory store right away
+and hand its operation records to a 'BackgroundWriter', which journals them
+on a thread of its own once no further change has come in for
+``WRITE_DELAY`` seconds. A burst of edits is thus written as one append, and
+the user never waits for the disk; closing the writer, which the menu does on
+exit and on Ctrl+C or SIGTERM, writes whatever is still pending.
+
+Changing the store and saving it must not overlap, so code that changes the
+store holds the writer's 'lock' while doing so; the writer holds it while
+the backend may read the store, i.e. while it writes.
+"""
+
+# Seconds without further changes after which the pending changes are written
+WRITE_DELAY = 1.0
+
+class BackgroundWriter:
+    """
+    Journals the changes to a loaded store on a background thread.
+    """
+
+    def __init__(self, tasks, file_path, delay=WRITE_DELAY):
+        """
+        Args:
+            tasks (TaskStore | SQLiteTaskStore): The loaded tasks.
+            file_path (str): The path to the tasks file.
+            delay (float): Seconds to wait for further changes before writing.
+        """
+        self.tasks = tasks
+        self.file_path = file_path
+        self.delay = delay
+        self.lock = threading.RLock()  # held while the store is changed or written
+        self._write_lock = threading.Lock()  # keeps the batches in order
+        self._condition = threading.Condition()
+        self._pending = []  # operations applied to the store but not yet written
+        self._writing = []  # operations taken out of _pending by the write in progress
+        self._due = None  # when the pending operations are written
+        self._error = None  # the error of a failed write, raised to the next caller
+        self._closed = False
+        self._thread = None
+        if get_backend(file_path).background_writes:
+            self._thread = threading.Thread(target=self._run, name="background-writer", daemon=True)
+            self._thread.start()
+
+    def record(self, operations):
+        """
+        Queues operations to be written once the changes have settled.
+
+        Without a writer thread, e.g. for SQLite, they are written right away.
+
+        Args:
+            operations (list): The operation records of changes already applied to the store.
+
+        Raises:
+            Exception: The error of an earlier failed write, usually an
+                OSError. Its operations, and these, are still pending and are
+                retried with the next write.
+        """
+        with self._condition:
+            self._pending.extend(operations)
+            self._due = time.monotonic() + self.delay
+            self._condition.notify()
+            if self._thread is not None:
+                self._raise_error()
+        if self._thread is None:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the pending operations now, in the calling thread.
+
+        Raises:
+            Exception: The error of a failed write, usually an OSError; the
+                operations stay pending.
+        """
+        self._write()
+        with self._condition:
+            self._raise_error()
+
+    def close(self):
+        """
+        Stops the writer thread after it has written every pending operation.
+
+        Raises:
+            Exception: The error of the final write, if it fails.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def unwritten(self):
+        """Returns the operations applied to the store that are not written yet, oldest first."""
+        with self._condition:
+            return self._writing + self._pending
+
+    def _raise_error(self):
+        """Raises the error of a failed write once; called with the condition held."""
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def _write(self):
+        """Writes the operations pending at the time of the call."""
+        with self._write_lock:
+            with self._condition:
+                operations, self._pending = self._pending, []
+                self._writing = operations
+                self._due = None
+            if not operations:
+                return
+            try:
+                with self.lock:
+                    record_operations(self.tasks, operations, self.file_path)
+                with self._condition:
+                    self._writing = []
+                    self._error = None
+            except Exception as e:
+                with self._condition:
+                    # Retried with the next write; whatever the error, the writer thread
+                    # must survive it, or the changes would never be written
+                    self._writing = []
+                    self._pending[:0] = operations
+                    self._due = self._due or time.monotonic() + self.delay
+                    self._error = e
+
+    def _run(self):
+        """Waits for changes to settle and writes them, until the writer is closed."""
+        while True:
+            with self._condition:
+                while not self._closed:
+                    if self._pending and self._error is None:
+                        remaining = self._due - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    else:
+                        # Idle, or waiting for the caller to pick up a failed write
+                        self._condition.wait()
+                if self._closed:
+                    return
+            self._write()
@@ -0,0 +1,7 @@
+# benchmarks/__init__.py
+
+"""
+This package contains the performance checks the project tracks.
+Each module can be run with ``python -m benchmarks.<name>`` from the
+repository root.
+"""
@@ -0,0 +1,160 @@
+# benchmarks/dataset.py
+
+import argparse
+import random
+import sys
+from file_handling import save_tasks
+from task import PRIORITIES, STATUSES
+from task_store import TaskStore
+
+"""
+This module generates synthetic task lists for the benchmarks.
+Titles and descriptions are drawn from a fixed vocabulary with a Zipf-like
+word frequency, so a few words are very common and most are rare, much like
+real to-do lists; lengths, the status mix and the priority mix are
+configurable. The same seed always produces the same tasks.
+
+It can also be run on its own to write a dataset:
+
+    python -m benchmarks.dataset 100000 -o tasks.json
+"""
+
+# Common words of to-do lists, most frequent first
+_COMMON_WORDS = (
+    "the to and for a of call buy email fix review send update meeting with "
+    "report plan clean write check book pay order schedule team project "
+    "groceries milk bread doctor dentist gym laundry car bills rent invoice "
+    "client draft slides budget notes release bug test deploy backup kitchen "
+    "garden birthday gift flight hotel passport insurance taxes bank tickets "
+    "mom dad sister friend weekly monthly urgent tomorrow today morning evening"
+).split()
+
+_SYLLABLES = ("ka", "lo", "mi", "ren", "to", "sa", "vel", "dor", "pi", "qua", "nes", "tri", "bo", "zen", "ul", "ar")
+
+def _vocabulary(size, rng):
+    """Returns the common words followed by made-up rare words, up to 'size' words."""
+    words = list(_COMMON_WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words[:size]
+
+def parse_mix(text, values):
+    """
+    Parses a mix like 'pending=0.7,completed=0.3' into weights.
+
+    Args:
+        text (str): Comma-separated value=weight pairs; the weights need not sum to 1.
+        values (tuple): The allowed values.
+
+    Returns:
+        dict: The weight of every allowed value, 0 for those not mentioned.
+
+    Raises:
+        ValueError: If a value is not allowed or a weight is not a number.
+    """
+    weights = dict.fromkeys(values, 0.0)
+    for pair in text.split(","):
+        value, _, weight = pair.partition("=")
+        value = value.strip().lower()
+        if value not in weights:
+            raise ValueError(f"Unknown value '{value}'; choose from {', '.join(values)}.")
+        weights[value] = float(weight)
+    return weights
+
+def generate_tasks(count, title_words=(2, 8), description_words=(0, 24), status_mix=None,
+                   priority_mix=None, vocabulary_size=5000, seed=0):
+    """
+    Generates a list of synthetic tasks with IDs 1 to count.
+
+    Args:
+        count (int): The number of tasks.
+        title_words (tuple): The minimum and maximum number of words per title.
+        description_words (tuple): The minimum and maximum number of words per
+            description; an empty description is stored as '-'.
+        status_mix (dict): The weight of each status; 70% pending by default.
+        priority_mix (dict): The weight of each priority; mostly medium by default.
+        vocabulary_size (int): The number of distinct words to draw from.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        list: The generated tasks, as dictionaries.
+    """
+    rng = random.Random(seed)
+    status_mix = status_mix or {"pending": 0.7, "completed": 0.3}
+    priority_mix = priority_mix or {"low": 0.3, "medium": 0.5, "high": 0.2}
+    words = _vocabulary(vocabulary_size, rng)
+    # Zipf-like frequencies: the n-th word is n times rarer than the first
+    cumulative = []
+    total = 0.0
+    for rank in range(1, len(words) + 1):
+        total += 1 / rank
+        cumulative.append(total)
+
+    statuses = rng.choices(list(status_mix), weights=list(status_mix.values()), k=count)
+    priorities = rng.choices(list(priority_mix), weights=list(priority_mix.values()), k=count)
+    tasks = []
+    for i in range(count):
+        title = rng.choices(words, cum_weights=cumulative, k=rng.randint(*title_words))
+        description = rng.choices(words, cum_weights=cumulative, k=rng.randint(*description_words))
+        tasks.append({
+            "id": i + 1,
+            "title": " ".join(title).capitalize(),
+            "description": " ".join(description) or "-",
+            "priority": priorities[i],
+            "status": statuses[i]
+        })
+    return tasks
+
+def write_dataset(file_path, tasks):
+    """
+    Writes generated tasks to a file with the backend matching its extension.
+
+    Args:
+        file_path (str): The path to write, e.g. 'tasks.json' or 'tasks.db'.
+        tasks (list): The tasks, e.g. from generate_tasks.
+    """
+    save_tasks(TaskStore(tasks), file_path)
+
+def _range(text):
+    """Parses 'min-max' or a single number into a (min, max) tuple."""
+    low, _, high = text.partition("-")
+    return int(low), int(high or low)
+
+def add_dataset_arguments(parser):
+    """Adds the options shared by every command that generates datasets."""
+    parser.add_argument("--title-words", type=_range, default=(2, 8), metavar="MIN-MAX", help="words per title (default: 2-8)")
+    parser.add_argument("--description-words", type=_range, default=(0, 24), metavar="MIN-MAX", help="words per description (default: 0-24)")
+    parser.add_argument("--status-mix", default="pending=0.7,completed=0.3", help="weights of the statuses (default: %(default)s)")
+    parser.add_argument("--priority-mix", default="low=0.3,medium=0.5,high=0.2", help="weights of the priorities (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator (default: 0)")
+
+def dataset_options(args):
+    """Turns the options added by add_dataset_arguments into generate_tasks keyword arguments."""
+    return {
+        "title_words": args.title_words,
+        "description_words": args.description_words,
+        "status_mix": parse_mix(args.status_mix, STATUSES),
+        "priority_mix": parse_mix(args.priority_mix, PRIORITIES),
+        "seed": args.seed
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic tasks file.")
+    parser.add_argument("count", type=int, help="the number of tasks")
+    parser.add_argument("-o", "--output", default="tasks.json", help="the file to write; the extension picks the format (default: tasks.json)")
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+    try:
+        options = dataset_options(args)
+    except ValueError as e:
+        parser.error(str(e))
+    write_dataset(args.output, generate_tasks(args.count, **options))
+    print(f"Wrote {args.count} tasks to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# benchmarks/startup.py
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+"""
+This module checks the start-up budget of the To-Do CLI.
+It imports 'main' in a fresh interpreter with ``python -X importtime``,
+reads the cumulative import time of the application from the report, and
+fails if the median over several runs exceeds the budget or if anything from
+'rich' was imported: commands in a plain output format must not load it.
+
+Run it from the repository root:
+
+    python -m benchmarks.startup
+"""
+
+# Budget for importing 'main' and everything it pulls in, in milliseconds.
+# Importing rich alone costs more than this, so the check also catches an
+# accidental top-level rich import.
+STARTUP_BUDGET_MS = 50
+
+# The repository root, where 'main.py' lives
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure_import():
+    """
+    Imports 'main' in a fresh interpreter and parses the import-time report.
+
+    Returns:
+        tuple: The cumulative import time of 'main' in milliseconds, and the
+            names of all modules imported along the way.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    total_us = None
+    modules = []
+    for line in result.stderr.splitlines():
+        # Lines look like 'import time:   self [us] | cumulative | name'
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue  # the header line
+        name = fields[2].strip()
+        modules.append(name)
+        if name == "main":
+            total_us = int(fields[1])
+    if total_us is None:
+        raise RuntimeError("'main' did not appear in the import-time report")
+    return total_us / 1000, modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the start-up import budget.")
+    parser.add_argument("--runs", type=int, default=7, help="number of fresh interpreters to time (default: 7)")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_MS, help=f"budget in milliseconds (default: {STARTUP_BUDGET_MS})")
+    args = parser.parse_args()
+
+    # The first run also writes the bytecode cache, so it is not timed
+    measure_import()
+    timings = []
+    for _ in range(args.runs):
+        elapsed, modules = measure_import()
+        timings.append(elapsed)
+    median = statistics.median(timings)
+
+    eager_rich = sorted({name for name in modules if name.split(".")[0] == "rich"})
+    print(f"import main: median {median:.1f} ms over {args.runs} runs (budget {args.budget:g} ms)")
+    if eager_rich:
+        print(f"FAIL: rich is imported at start-up: {', '.join(eager_rich)}")
+        return 1
+    if median > args.budget:
+        print("FAIL: over budget")
+        return 1
+    print("OK")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+# benchmarks/suite.py
+
+import argparse
+import collections
+import contextlib
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import task
+from benchmarks.dataset import add_dataset_arguments, dataset_options, generate_tasks, write_dataset
+from file_handling import load_tasks, save_tasks, scan_tasks
+from task import (
+    create_task, filter_tasks, find_task, fuzzy_search_tasks, list_tasks, query_tasks, remove_task, scan_search_tasks,
+    search_tasks
+)
+
+"""
+This module runs the benchmark suite of the To-Do CLI.
+For every dataset size it writes a synthetic tasks file, then times loading
+and saving it, looking tasks up by ID, searching, filtering, querying, allocating IDs
+for new tasks, re-numbering after deletes, and rendering the first and last
+page of the task table to a console that discards its output. Searches,
+filters and queries run against an empty result cache, plus one search that
+is answered from it.
+
+Results are printed as JSON, one record per benchmark and size with the
+minimum and median time over the repeats, together with the commit and the
+Python version. Saving them and passing the file to '--compare' on a later
+commit reports how much slower or faster every benchmark became:
+
+    python -m benchmarks.suite --sizes 1000,100000 -o before.json
+    python -m benchmarks.suite --sizes 1000,100000 --compare before.json
+"""
+
+# Number of lookups, additions and deletions timed per repeat
+BATCH_SIZE = 1000
+
+# Default ratio to a baseline above which '--compare' reports a regression
+REGRESSION_THRESHOLD = 1.25
+
+@contextlib.contextmanager
+def null_console():
+    """Points the task module's console at a terminal-like console that writes to /dev/null."""
+    from rich.console import Console
+    original = task.console
+    with open(os.devnull, "w") as devnull:
+        task.console = Console(file=devnull, width=120, force_terminal=True, color_system="truecolor")
+        try:
+            yield
+        finally:
+            task.console = original
+
+def _time(function, repeat, setup=None):
+    """
+    Times a function, running an optional setup before each repeat untimed.
+
+    Returns:
+        list: The duration of every repeat in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def _record(size, name, timings, operations=1):
+    """Summarizes the timings of one benchmark as a result record."""
+    return {
+        "size": size,
+        "benchmark": name,
+        "operations": operations,
+        "repeat": len(timings),
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "per_operation": min(timings) / operations
+    }
+
+def run_size(size, directory, extension, repeat, options):
+    """
+    Runs every benchmark on one dataset size.
+
+    Args:
+        size (int): The number of tasks in the dataset.
+        directory (str): A scratch directory for the tasks file.
+        extension (str): The extension of the tasks file, which picks the backend.
+        repeat (int): How often each benchmark is timed.
+        options (dict): Keyword arguments for generate_tasks.
+
+    Returns:
+        list: The result records.
+    """
+    rng = random.Random(size)
+    file_path = os.path.join(directory, f"tasks-{size}{extension}")
+    generated = generate_tasks(size, **options)
+    write_dataset(file_path, generated)
+    # The most common title word, a word from a random task and a term that never occurs
+    words = collections.Counter(word for new_task in generated for word in new_task["title"].lower().split())
+    search_terms = [words.most_common(1)[0][0], rng.choice(generated)["title"].lower().split()[-1], "xyzzy"]
+    del generated
+
+    results = []
+
+    def add(name, timings, operations=1):
+        results.append(_record(size, name, timings, operations))
+        print(f"{size:>9} {name:<28} {min(timings) * 1000:10.3f} ms", file=sys.stderr)
+
+    add("load_tasks", _time(lambda: load_tasks(file_path), repeat))
+    tasks = load_tasks(file_path)
+    add("save_tasks", _time(lambda: save_tasks(tasks, file_path), repeat))
+
+    ids = [rng.randint(1, size) for _ in range(BATCH_SIZE)]
+    add("find_task", _time(lambda: [find_task(tasks, task_id) for task_id in ids], repeat), len(ids))
+    # Queries are timed against an empty result cache, which the repeats would otherwise answer
+    uncached = task.query_cache.clear
+    for term in search_terms:
+        add(f"search_tasks[{term}]", _time(lambda: search_tasks(tasks, term), repeat, setup=uncached))
+    warm = lambda: search_tasks(tasks, search_terms[0])
+    add(f"search_tasks[{search_terms[0]}, cached]", _time(warm, repeat, setup=warm))
+    # The scan of command mode, which reads the file instead of the loaded store
+    add(f"scan_tasks[{search_terms[1]}]", _time(lambda: scan_tasks(file_path, scan_search_tasks, search_terms[1]), repeat))
+    for criterion in ("pending", "completed high"):
+        add(f"filter_tasks[{criterion}]", _time(lambda: filter_tasks(tasks, criterion), repeat, setup=uncached))
+    queries = (
+        f"status:pending priority:high text:{search_terms[1]}",
+        f"id:{size // 2}..{size // 2 + 100} status:pending",
+        "status:pending sort:priority limit:50",
+    )
+    for text in queries:
+        add(f"query_tasks[{text}]", _time(lambda: query_tasks(tasks, text), repeat, setup=uncached))
+    # A misspelt term: the first call also builds the fuzzy index
+    typo = search_terms[1][:-2] + search_terms[1][-1:] + search_terms[1][-2:-1]
+    add(f"fuzzy_search_tasks[{typo}]", _time(lambda: fuzzy_search_tasks(tasks, typo), repeat, setup=uncached))
+
+    # ID allocation and insertion, as done by add_task after its prompts
+    def create_batch():
+        for _ in range(BATCH_SIZE):
+            create_task(tasks, "Benchmark task", "-", "medium")
+    add("create_task", _time(create_batch, repeat), BATCH_SIZE)
+
+    # Re-numbering after deletes, as done by compact_task_ids
+    def delete_batch():
+        for task_id in rng.sample(list(tasks.ids()), min(BATCH_SIZE, len(tasks) // 2)):
+            remove_task(tasks, task_id)
+    add("renumber", _time(tasks.renumber, repeat, setup=delete_batch))
+
+    with null_console():
+        add("list_tasks[first page]", _time(lambda: list_tasks(tasks, page=1), repeat))
+        add("list_tasks[last page]", _time(lambda: list_tasks(tasks, page=len(tasks)), repeat))
+
+    # The cached results would keep the store of this size alive
+    task.query_cache.clear()
+    close = getattr(tasks, "close", None)
+    if close:
+        close()
+    return results
+
+def _commit():
+    """Returns the current git commit, or None outside a git checkout."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+def compare(results, baseline, threshold):
+    """
+    Prints the ratio of every result to the same benchmark in a baseline.
+
+    Args:
+        results (list): The new result records.
+        baseline (list): The result records of an earlier run.
+        threshold (float): The ratio above which a benchmark counts as a regression.
+
+    Returns:
+        int: The number of regressions.
+    """
+    previous = {(record["size"], record["benchmark"]): record for record in baseline}
+    regressions = 0
+    for record in results:
+        before = previous.get((record["size"], record["benchmark"]))
+        if before is None or not before["min"]:
+            continue
+        ratio = record["min"] / before["min"]
+        flag = ""
+        if ratio > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{record['size']:>9} {record['benchmark']:<28} {ratio:6.2f}x{flag}", file=sys.stderr)
+    return regressions
+
+def _sizes(text):
+    return [int(size) for size in text.split(",")]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and print the results as JSON.")
+    parser.add_argument("--sizes", type=_sizes, default=[1000, 10000, 100000], help="comma-separated dataset sizes (default: 1000,10000,100000)")
+    parser.add_argument("--repeat", type=int, default=5, help="repeats per benchmark; the minimum is reported (default: 5)")
+    parser.add_argument("--extension", default=".json", help="extension of the tasks file, which picks the backend (default: .json)")
+    parser.add_argument("-o", "--output", help="write the JSON results to a file instead of standard output")
+    parser.add_argument("--compare", metavar="FILE", help="results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help=f"slow-down ratio reported as a regression (default: {REGRESSION_THRESHOLD})")
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+    try:
+        options = dataset_options(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            results.extend(run_size(size, directory, args.extension, args.repeat, options))
+
+    report = {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "options": {"sizes": args.sizes, "repeat": args.repeat, "extension": args.extension, **options},
+        "results": results
+    }
+    text = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+# binary_snapshot.py
+
+import json
+import struct
+import sys
+from array import array
+from itertools import accumulate
+from columns import CodeColumn, StringColumn
+
+"""
+This module reads and writes the binary snapshot format for task stores.
+Where a JSON snapshot has to be parsed field by field, a binary snapshot is a
+header followed by the columns of a 'task_store.TaskStore' laid out one after
+the other, so loading is a handful of bulk copies out of a memoryview:
+
+    header       magic b"TODOSNAP", format version (u16), flags (u16),
+                 task count (u64), next ID (i64)
+    code tables  for statuses, then priorities: value count (u16), then each
+                 value as a u32 length and UTF-8 bytes
+    ids          one i64 per task
+    statuses     one u16 code per task
+    priorities   one u16 code per task
+    titles       one u32 byte length per task, then all titles as UTF-8
+    descriptions one u32 byte length per task, then all descriptions as UTF-8
+    extra        u64 length, then a JSON object of the fields beyond the core
+                 ones, keyed by task ID
+
+All numbers are little-endian. Every task field survives a round trip, so a
+store can be converted between this format and JSON without losing anything.
+"""
+
+MAGIC = b"TODOSNAP"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sHHQq")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+def _little_endian(values):
+    """Returns an array in little-endian byte order, swapping a copy if needed."""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+def _encode_code_table(values):
+    parts = [_U16.pack(len(values))]
+    for value in values:
+        encoded = value.encode("utf-8")
+        parts += [_U32.pack(len(encoded)), encoded]
+    return b"".join(parts)
+
+def write_snapshot(f, columns, next_id):
+    """
+    Writes task columns to a binary file.
+
+    Args:
+        f (file): A file opened for binary writing.
+        columns (dict): The columns, as returned by ``TaskStore.columns``.
+        next_id (int): The lowest ID the allocator may hand out.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    ids = columns["ids"]
+    extra = json.dumps({str(task_id): fields for task_id, fields in columns["extra"].items()}).encode("utf-8")
+    parts = [
+        _HEADER.pack(MAGIC, VERSION, 0, len(ids), next_id),
+        _encode_code_table(columns["statuses"].values),
+        _encode_code_table(columns["priorities"].values),
+        _little_endian(ids),
+        _little_endian(columns["statuses"].codes()),
+        _little_endian(columns["priorities"].codes()),
+    ]
+    for key in ("titles", "descriptions"):
+        text = columns[key]
+        parts += [_little_endian(text.lengths), text.data]
+    parts += [_U64.pack(len(extra)), extra]
+    written = 0
+    for part in parts:
+        written += f.write(part)
+    return written
+
+class _Reader:
+    """Reads consecutive values out of a buffer."""
+
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.pos = 0
+
+    def unpack(self, layout):
+        values = layout.unpack_from(self.view, self.pos)
+        self.pos += layout.size
+        return values
+
+    def take(self, size):
+        if self.pos + size > len(self.view):
+            raise ValueError("The task snapshot is truncated")
+        chunk = self.view[self.pos:self.pos + size]
+        self.pos += size
+        return chunk
+
+    def array(self, typecode, count):
+        values = array(typecode)
+        values.frombytes(self.take(values.itemsize * count))
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    def code_table(self):
+        values = []
+        count, = self.unpack(_U16)
+        for _ in range(count):
+            length, = self.unpack(_U32)
+            values.append(str(self.take(length), "utf-8"))
+        return values
+
+    def rows(self, typecode, count, start, stop):
+        """Reads only the rows from start to stop of an array of count values, skipping the rest."""
+        values = array(typecode)
+        size = values.itemsize
+        values.frombytes(self.take(size * count)[size * start:size * stop])
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    def string_rows(self, count, start, stop):
+        """
+        Finds the rows from start to stop of a string column, skipping the rest.
+
+        Returns:
+            tuple: The byte lengths of the rows and a memoryview of the
+            column's data that starts at the first of them.
+        """
+        lengths = self.array('I', count)
+        skipped = sum(lengths[:start])
+        wanted = lengths[start:stop]
+        data = self.take(skipped + sum(wanted) + sum(lengths[stop:]))
+        return wanted, data[skipped:]
+
+    def string_column(self, count):
+        column = StringColumn()
+        column.lengths = self.array('I', count)
+        offsets = array('Q', accumulate(column.lengths, initial=0))
+        column.data = bytearray(self.take(offsets.pop()))
+        column.offsets = offsets
+        return column
+
+def _read_header(reader):
+    """
+    Reads the header and the code tables of a snapshot.
+
+    Returns:
+        tuple: The task count, the next ID and the status and priority values.
+
+    Raises:
+        ValueError: If the data is not a snapshot this version can read.
+        struct.error: If the data ends within the header.
+    """
+    if reader.view[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a binary task snapshot")
+    _, version, _, count, next_id = reader.unpack(_HEADER)
+    if version > VERSION:
+        raise ValueError(f"Task snapshot version {version} is newer than this program supports")
+    return count, next_id, reader.code_table(), reader.code_table()
+
+def read_snapshot(data):
+    """
+    Reads the columns of a binary snapshot.
+
+    Args:
+        data (bytes): The contents of the snapshot file.
+
+    Returns:
+        tuple: The columns, as accepted by ``TaskStore.from_columns``, and the next ID.
+
+    Raises:
+        ValueError: If the data is not a snapshot this version can read.
+    """
+    reader = _Reader(data)
+    try:
+        count, next_id, status_values, priority_values = _read_header(reader)
+        ids = reader.array('q', count)
+        statuses = CodeColumn.from_codes(status_values, reader.array('H', count))
+        priorities = CodeColumn.from_codes(priority_values, reader.array('H', count))
+        titles = reader.string_column(count)
+        descriptions = reader.string_column(count)
+        extra_size, = reader.unpack(_U64)
+        extra = json.loads(str(reader.take(extra_size), "utf-8"))
+    except struct.error:
+        raise ValueError("The task snapshot is truncated")
+    columns = {
+        "ids": ids,
+        "titles": titles,
+        "descriptions": descriptions,
+        "priorities": priorities,
+        "statuses": statuses,
+        "extra": {int(task_id): fields for task_id, fields in extra.items()}
+    }
+    return columns, next_id
+
+def task_count(data):
+    """
+    Returns the number of tasks in a binary snapshot, read from its header.
+
+    Raises:
+        ValueError: If the data is not a snapshot.
+    """
+    if data[:len(MAGIC)] != MAGIC or len(data) < _HEADER.size:
+        raise ValueError("Not a binary task snapshot")
+    return _HEADER.unpack_from(data)[3]
+
+def iter_snapshot(data, start=0, stop=None):
+    """
+    Yields the tasks of a binary snapshot as dictionaries, without building a store.
+
+    Only the rows asked for are copied out of the columns and decoded, so the
+    workers of a parallel scan, each given a memory-mapped file and a range
+    of rows, read little more than their own part of it. The fields beyond
+    the core ones are kept as one JSON object keyed by ID, which is read whole.
+
+    Args:
+        data (bytes | mmap.mmap): The contents of the snapshot file.
+        start (int): The first row to yield, e.g. for a chunk of a parallel scan.
+        stop (int): The row to stop before, or None to go on to the end.
+
+    Yields:
+        dict: Each task, in insertion order.
+
+    Raises:
+        ValueError: If the data is not a snapshot this version can read.
+    """
+    reader = _Reader(data)
+    try:
+        count, _, status_values, priority_values = _read_header(reader)
+        stop = count if stop is None else min(stop, count)
+        start = min(start, stop)
+        ids = reader.rows('q', count, start, stop)
+        statuses = reader.rows('H', count, start, stop)
+        priorities = reader.rows('H', count, start, stop)
+        title_lengths, titles = reader.string_rows(count, start, stop)
+        description_lengths, descriptions = reader.string_rows(count, start, stop)
+        extra_size, = reader.unpack(_U64)
+        extra = json.loads(str(reader.take(extra_size), "utf-8"))
+    except struct.error:
+        raise ValueError("The task snapshot is truncated")
+    for codes, values in ((statuses, status_values), (priorities, priority_values)):
+        if any(code >= len(values) for code in set(codes)):
+            raise ValueError("Code out of range of the code table")
+
+    title_pos = description_pos = 0
+    for row, task_id in enumerate(ids):
+        title_end = title_pos + title_lengths[row]
+        description_end = description_pos + description_lengths[row]
+        task = {
+            "id": task_id,
+            "title": str(titles[title_pos:title_end], "utf-8"),
+            "description": str(descriptions[description_pos:description_end], "utf-8"),
+            "priority": priority_values[priorities[row]],
+            "status": status_values[statuses[row]]
+        }
+        title_pos, description_pos = title_end, description_end
+        fields = extra.get(str(task_id))
+        if fields:
+            task.update(fields)
+        yield task
@@ -0,0 +1,503 @@
+# cli.py
+
+import argparse
+import copy
+import json
+import os
+import sys
+import profiling
+from file_handling import (
+    ARCHIVE_AFTER_DAYS, Archive, archive_tasks, convert_tasks, get_backend, iter_tasks, load_tasks,
+    record_operations, scan_tasks
+)
+from output import write_tasks
+from query import parse_terms
+from task import (
+    FUZZY_LIMIT, PAGE_SIZE, PRIORITIES, STATUSES, change_task, check_fields, console, create_task, filter_tasks,
+    find_task, fuzzy_search_tasks, list_tasks, query_tasks, remove_task, scan_filter_tasks, scan_page,
+    scan_query_tasks, scan_search_tasks, search_tasks
+)
+from task_store import OrderedTasks
+
+"""
+This module implements the non-interactive command mode of the To-Do CLI.
+Each subcommand runs the same logic as the menu, without prompts, so scripts
+can drive the application. Commands that change tasks accept many items per
+invocation, or read them from standard input as JSON lines when given '-',
+apply them all in memory and persist them in a single write. Read-only
+commands stream the tasks file instead of loading it. 'find', 'search' and
+'filter' only read the archive of old completed tasks when given --archived.
+
+The commands reach the tasks through a storage object: 'FileStorage' reads
+and writes the file directly, and the daemon started by 'serve' runs the same
+commands against the tasks it holds in memory. When a daemon serves the file,
+'run' only forwards the command line to it and prints the reply.
+
+With '--plain' or '--format tsv/json' results are written in a machine-readable
+format and the 'rich' library is never imported, which keeps scripted calls fast.
+"""
+
+def _read_json_lines(stream):
+    """Yields the JSON value on each non-blank line of a stream."""
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+def _items(values):
+    """Returns the command-line values, or the JSON lines on stdin if they are just '-'."""
+    if values == ["-"]:
+        return list(_read_json_lines(sys.stdin))
+    return values
+
+def _reads_stdin(args):
+    """Tells whether a parsed command line takes its items from standard input, like '_items' and '_import'."""
+    values = getattr(args, "ids", None) or getattr(args, "titles", None)
+    return values == ["-"] or (args.command == "import" and args.source == "-")
+
+def _task_id(item):
+    """
+    Extracts a task ID from a command-line value or a JSON line.
+
+    Raises:
+        ValueError: If the value is not an integer, or the JSON line has no integer 'id'.
+    """
+    if isinstance(item, dict):
+        item = item.get("id")
+    if isinstance(item, int) and not isinstance(item, bool):
+        return item
+    if isinstance(item, str):
+        try:
+            return int(item)
+        except ValueError:
+            pass
+    raise ValueError(f"A task needs an integer 'id', not {item!r}.")
+
+# Output formats; everything but 'table' is written without rich
+FORMATS = ("table", "tsv", "json")
+
+def _print_tasks(tasks, output_format):
+    """Prints every task in one table, or in a machine-readable format."""
+    if output_format == "table":
+        list_tasks(tasks, page_size=max(len(tasks), 1))
+    else:
+        write_tasks(tasks, output_format)
+
+def _print_summary(message, output_format):
+    """Prints the outcome of a change, styled only in the table format."""
+    if output_format == "table":
+        console.print(f"[bold green]✅ {message}[/bold green]")
+    else:
+        print(message)
+
+class FileStorage:
+    """
+    Gives the commands access to the tasks in a file.
+
+    Changes load the whole store and journal the operations; read-only
+    queries stream the file instead of loading it, on several processes
+    for large files, except lookups by ID in stores that read only the tasks
+    asked for, and queries of stores that answer them from indexes on disk,
+    like SQLite. Queries that include
+    archived tasks load the store, to leave out the archived copies of tasks
+    that are still in the file.
+    """
+
+    def __init__(self, file_path):
+        """
+        Args:
+            file_path (str): The path to the tasks file.
+        """
+        self.file_path = file_path
+        self.archive = Archive(file_path)
+
+    def load(self):
+        """Returns the tasks, to be changed in place."""
+        return load_tasks(self.file_path)
+
+    def record(self, tasks, operations):
+        """Persists the operations applied to the loaded tasks."""
+        record_operations(tasks, operations, self.file_path)
+
+    def find(self, task_ids, archived=False):
+        """Returns the tasks with the given IDs that exist, in the order asked for."""
+        if archived or get_backend(self.file_path).loads_on_demand:
+            # Such stores read only what the lookups ask for, e.g. one shard per ID
+            tasks = self.load()
+            archive = self.archive if archived else None
+            found = (find_task(tasks, task_id, archive) for task_id in dict.fromkeys(task_ids))
+            return [found_task for found_task in found if found_task is not None]
+        wanted = dict.fromkeys(task_ids)
+        missing = set(wanted)
+        for found_task in iter_tasks(self.file_path):
+            if found_task.get("id") in missing:
+                wanted[found_task["id"]] = found_task
+                missing.discard(found_task["id"])
+                if not missing:
+                    # Stop reading as soon as every task has been found
+                    break
+        return [found_task for found_task in wanted.values() if found_task is not None]
+
+    def page(self, page, page_size):
+        """Returns one page of the tasks in the order they are kept, reading the file only up to its end."""
+        return scan_page(iter_tasks(self.file_path), page, page_size)
+
+    def _in_store(self, function, argument):
+        """Runs a query function of the 'task' module against the loaded store, then closes it."""
+        tasks = self.load()
+        try:
+            return function(tasks, argument)
+        finally:
+            close = getattr(tasks, "close", None)
+            if close:
+                close()
+
+    def search(self, term, archived=False):
+        """Returns the tasks whose title or description contains a term."""
+        if archived:
+            return search_tasks(self.load(), term, self.archive)
+        if get_backend(self.file_path).indexed_queries:
+            return self._in_store(search_tasks, term)
+        return scan_tasks(self.file_path, scan_search_tasks, term)
+
+    def fuzzy_search(self, term, limit):
+        """Returns the tasks best matching a term; this needs the indexes, so it loads the store."""
+        return fuzzy_search_tasks(self.load(), term, limit)
+
+    def filter(self, criterion, archived=False):
+        """Returns the tasks matching a filter criterion."""
+        if archived:
+            return filter_tasks(self.load(), criterion, self.archive)
+        if get_backend(self.file_path).indexed_queries:
+            return self._in_store(filter_tasks, criterion)
+        return scan_tasks(self.file_path, scan_filter_tasks, criterion)
+
+    def query(self, query):
+        """Returns the tasks matching a parsed query, reading no further than its limit needs."""
+        if get_backend(self.file_path).indexed_queries:
+            return self._in_store(query_tasks, query)
+        if query.limit is not None and query.sort is None:
+            # Stopping at the limit reads less than scanning everything in parallel
+            return list(scan_query_tasks(iter_tasks(self.file_path), query))
+        # The chunks are matched without the order and limit, which apply to all matches
+        conditions = copy.copy(query)
+        conditions.sort = conditions.limit = None
+        return list(query.order(scan_tasks(self.file_path, scan_query_tasks, conditions)))
+
+def _apply(args, storage, items, make_operation, verb):
+    """
+    Applies one change per item to the tasks and persists them all at once.
+
+    Items that fail are reported and skipped; the others are still saved.
+
+    Args:
+        args (argparse.Namespace): The parsed command line.
+        storage (FileStorage | daemon.Daemon): Where the tasks are kept.
+        items (list): The items to apply.
+        make_operation (callable): Applies one item to the tasks and returns
+            its operation record, or raises ValueError/KeyError/TypeError.
+        verb (str): Describes the change in the summary, e.g. "added".
+
+    Returns:
+        int: The exit status: 0 if every item was applied, 1 otherwise.
+    """
+    tasks = storage.load()
+    operations = []
+    failed = 0
+    for item in items:
+        try:
+            operations.append(make_operation(tasks, item))
+        except (ValueError, KeyError, TypeError) as e:
+            failed += 1
+            print(f"Error: {item!r}: {e}", file=sys.stderr)
+
+    storage.record(tasks, operations)
+    _print_summary(f"{len(operations)} task(s) {verb}.", args.format)
+    return 1 if failed else 0
+
+def _add(args, storage):
+    items = _items(args.titles)
+    reserved = None
+
+    def make_operation(tasks, item):
+        nonlocal reserved
+        if reserved is None:
+            # Reserve the IDs for the whole batch in one step
+            reserved = iter(tasks.allocate_ids(len(items)))
+        if not isinstance(item, dict):
+            item = {"title": item}
+        return create_task(
+            tasks, item.get("title", ""), item.get("description", args.description),
+            item.get("priority", args.priority), task_id=next(reserved)
+        )
+
+    return _apply(args, storage, items, make_operation, "added")
+
+def _done(args, storage):
+    status = "pending" if args.undo else "completed"
+
+    def make_operation(tasks, item):
+        return change_task(tasks, _task_id(item), {"status": status})
+
+    return _apply(args, storage, _items(args.ids), make_operation, f"marked as {status}")
+
+def _update(args, storage):
+    flags = {
+        field: getattr(args, field)
+        for field in ("title", "description", "priority", "status")
+        if getattr(args, field) is not None
+    }
+
+    def make_operation(tasks, item):
+        if isinstance(item, dict):
+            fields = {key: value for key, value in item.items() if key != "id"}
+        else:
+            fields = flags
+        if not fields:
+            raise ValueError("Nothing to update.")
+        return change_task(tasks, _task_id(item), fields)
+
+    return _apply(args, storage, _items(args.ids), make_operation, "updated")
+
+def _rm(args, storage):
+    def make_operation(tasks, item):
+        return remove_task(tasks, _task_id(item))
+
+    return _apply(args, storage, _items(args.ids), make_operation, "deleted")
+
+def _import(args, storage):
+    with (sys.stdin if args.source == "-" else open(args.source, 'r')) as f:
+        text = f.read()
+    # Accept a JSON array, like tasks.json itself, or JSON lines
+    if text.lstrip().startswith("["):
+        items = json.loads(text)
+    else:
+        items = list(_read_json_lines(text.splitlines()))
+    def make_operation(tasks, item):
+        # Check everything before the store is touched, so a bad item changes nothing
+        if not isinstance(item, dict):
+            raise TypeError(f"A task must be a JSON object, not {type(item).__name__}.")
+        fields = {"title": "", "description": "", "priority": "medium", "status": "pending"}
+        # Keep any other fields, like the rest of the application does
+        fields.update((key, value) for key, value in item.items() if key != "id")
+        fields = check_fields(fields)
+        if args.keep_ids:
+            task_id = item.get("id")
+            if isinstance(task_id, bool) or not isinstance(task_id, int) or not 0 < task_id < 2 ** 63:
+                raise ValueError(f"Invalid task ID {task_id!r}; --keep-ids needs a positive integer 'id'.")
+            if task_id in tasks and not args.replace:
+                raise ValueError(f"Task with ID '{task_id}' already exists; use --replace to overwrite it.")
+        else:
+            # Allocated only once the task is known to be valid, so a bad item uses up no ID
+            task_id = tasks.allocate_id()
+        new_task = {"id": task_id, **fields}
+        tasks.add(new_task)
+        return {"op": "add", "task": new_task}
+
+    return _apply(args, storage, items, make_operation, "imported")
+
+def _archive(args, storage):
+    tasks = storage.load()
+    operation = archive_tasks(tasks, storage.archive, args.days)
+    if operation:
+        storage.record(tasks, [operation])
+    _print_summary(f"{len(operation['ids']) if operation else 0} task(s) moved to {storage.archive.path}.", args.format)
+    return 0
+
+def _convert(args, storage):
+    count = convert_tasks(args.source, args.target)
+    _print_summary(f"{count} task(s) converted from {args.source} to {args.target}.", args.format)
+    return 0
+
+def _list(args, storage):
+    if args.page_size < 1:
+        raise ValueError("--page-size must be at least 1.")
+    found = storage.page(args.page, args.page_size)
+    # Keep the order of the file, which otherwise becomes ID order in the table
+    _print_tasks(OrderedTasks(found), args.format)
+    return 0 if found else 1
+
+def _find(args, storage):
+    wanted = [_task_id(item) for item in _items(args.ids)]
+    found = storage.find(wanted, args.archived)
+    missing = set(wanted) - {found_task["id"] for found_task in found}
+
+    if found:
+        _print_tasks(found, args.format)
+    for task_id in sorted(missing):
+        print(f"Error: Task with ID '{task_id}' not found.", file=sys.stderr)
+    return 1 if missing else 0
+
+def _search(args, storage):
+    if args.fuzzy:
+        found = storage.fuzzy_search(args.term, args.limit)
+        # Best matches first, also in the table
+        _print_tasks(OrderedTasks(found), args.format)
+    else:
+        found = storage.search(args.term, args.archived)
+        _print_tasks(found, args.format)
+    return 0 if found else 1
+
+def _filter(args, storage):
+    found = storage.filter(" ".join(args.criteria), args.archived)
+    _print_tasks(found, args.format)
+    return 0 if found else 1
+
+def _query(args, storage):
+    found = storage.query(parse_terms(args.terms))
+    # Keep the query's order in the table, which otherwise shows tasks by ID
+    _print_tasks(OrderedTasks(found), args.format)
+    return 0 if found else 1
+
+def _serve(args, storage):
+    import daemon
+    if args.stop:
+        if not daemon.stop(storage.file_path):
+            print(f"Error: No daemon is serving {storage.file_path}.", file=sys.stderr)
+            return 1
+        return 0
+    return daemon.serve(storage.file_path)
+
+def build_parser():
+    """Builds the argument parser for the command mode."""
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Manage tasks without the interactive menu. Run without arguments for the menu."
+    )
+    parser.add_argument("--file", help="the tasks file to use (default: $TODO_FILE or tasks.json)")
+    parser.add_argument("--format", default="table", choices=FORMATS, help="how to print results (default: table)")
+    parser.add_argument("--plain", dest="format", action="store_const", const="tsv", help="short for --format tsv")
+    parser.add_argument("--profile", action="store_true", help="print timings of the storage calls and queries on exit (or set TODO_PROFILE=1)")
+    parser.add_argument("--profile-stats", metavar="FILE", help="also write a cProfile pstats file (or set TODO_PROFILE_STATS)")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="COMMAND")
+    stdin_help = "or '-' to read JSON lines from standard input"
+    archived_help = "also show matching tasks from the archive of old completed tasks"
+
+    add = commands.add_parser("add", help="add tasks")
+    add.add_argument("titles", nargs="+", metavar="TITLE", help=f"the titles of the tasks to add, {stdin_help}")
+    add.add_argument("-d", "--description", default="-", help="the description of every task")
+    add.add_argument("-p", "--priority", default="medium", type=str.lower, choices=PRIORITIES, help="the priority of every task")
+    add.set_defaults(handler=_add)
+
+    done = commands.add_parser("done", help="mark tasks as completed")
+    done.add_argument("ids", nargs="+", metavar="ID", help=f"the IDs of the tasks, {stdin_help}")
+    done.add_argument("--undo", action="store_true", help="mark the tasks as pending instead")
+    done.set_defaults(handler=_done)
+
+    update = commands.add_parser("update", help="change fields of tasks")
+    update.add_argument("ids", nargs="+", metavar="ID", help=f"the IDs of the tasks, {stdin_help}")
+    update.add_argument("-t", "--title")
+    update.add_argument("-d", "--description")
+    update.add_argument("-p", "--priority", type=str.lower, choices=PRIORITIES)
+    update.add_argument("-s", "--status", type=str.lower, choices=STATUSES)
+    update.set_defaults(handler=_update)
+
+    rm = commands.add_parser("rm", help="delete tasks")
+    rm.add_argument("ids", nargs="+", metavar="ID", help=f"the IDs of the tasks, {stdin_help}")
+    rm.set_defaults(handler=_rm)
+
+    list_ = commands.add_parser("list", help="show one page of tasks in the order they were added")
+    list_.add_argument("--page", type=int, default=1, help="the page to show, starting at 1 (default: 1)")
+    list_.add_argument("--page-size", type=int, default=PAGE_SIZE, help=f"the number of tasks per page (default: {PAGE_SIZE})")
+    list_.set_defaults(handler=_list)
+
+    find = commands.add_parser("find", help="show tasks by ID")
+    find.add_argument("ids", nargs="+", metavar="ID", help=f"the IDs of the tasks, {stdin_help}")
+    find.add_argument("--archived", action="store_true", help="also look for the tasks in the archive of old completed tasks")
+    find.set_defaults(handler=_find)
+
+    search = commands.add_parser("search", help="show tasks whose title or description contains a term")
+    search.add_argument("term")
+    search.add_argument("--fuzzy", action="store_true", help="rank tasks by similarity to the term, tolerating typos, instead of matching it exactly")
+    search.add_argument("--limit", type=int, default=FUZZY_LIMIT, help=f"the number of best matches a fuzzy search shows (default: {FUZZY_LIMIT})")
+    search.add_argument("--archived", action="store_true", help=archived_help)
+    search.set_defaults(handler=_search)
+
+    filter_ = commands.add_parser("filter", help="show tasks with a status and/or priority")
+    filter_.add_argument("criteria", nargs="+", metavar="CRITERION", help="e.g. pending, completed, high, medium, low")
+    filter_.add_argument("--archived", action="store_true", help=archived_help)
+    filter_.set_defaults(handler=_filter)
+
+    query = commands.add_parser("query", help="show tasks matching a query that combines search, filters, sorting and a limit")
+    query.add_argument(
+        "terms", nargs="+", metavar="TERM",
+        help="e.g. status:pending priority:high,medium text:gym id:100..200 sort:-priority limit:50; a bare word is text:"
+    )
+    query.set_defaults(handler=_query)
+
+    archive = commands.add_parser("archive", help="move old completed tasks to a compressed archive next to the tasks file")
+    archive.add_argument(
+        "--days", type=float, default=ARCHIVE_AFTER_DAYS,
+        help=f"archive tasks completed at least this many days ago (default: {ARCHIVE_AFTER_DAYS}); 0 archives every completed task"
+    )
+    archive.set_defaults(handler=_archive)
+
+    import_ = commands.add_parser("import", help="add tasks from a JSON array or JSON lines file")
+    import_.add_argument("source", metavar="FILE", help="the file to import, or '-' for standard input")
+    import_.add_argument("--keep-ids", action="store_true", help="keep the IDs in the file instead of allocating new ones")
+    import_.add_argument(
+        "--replace", action="store_true",
+        help="with --keep-ids, overwrite the tasks whose IDs are taken; without it, those tasks are reported as errors and not imported"
+    )
+    import_.set_defaults(handler=_import)
+
+    convert = commands.add_parser("convert", help="copy all tasks into a file of another format, e.g. tasks.json to tasks.bin")
+    convert.add_argument("source", help="the file to read")
+    convert.add_argument("target", help="the file to write; its extension (.json, .bin, .db) picks the format")
+    convert.set_defaults(handler=_convert, local=True)
+
+    serve = commands.add_parser("serve", help="keep the tasks in memory and answer the commands of other invocations")
+    serve.add_argument("--stop", action="store_true", help="stop the daemon serving the tasks file")
+    serve.set_defaults(handler=_serve, local=True)
+
+    return parser
+
+def run(argv, file_path):
+    """
+    Runs one command of the command mode.
+
+    Args:
+        argv (list): The command-line arguments, without the program name.
+        file_path (str): The tasks file to use unless --file is given.
+
+    Returns:
+        int: The exit status.
+    """
+    args = build_parser().parse_args(argv)
+    if args.profile or args.profile_stats:
+        profiling.start(args.profile_stats)
+    file_path = args.file or file_path
+    try:
+        if not getattr(args, "local", False):
+            # A running daemon already has the tasks in memory
+            import daemon
+            status = daemon.forward(file_path, argv, _reads_stdin(args))
+            if status is not None:
+                return status
+        return execute(args, FileStorage(file_path))
+    except BrokenPipeError:
+        # The reader of the output went away, e.g. 'head'; stop quietly like other tools
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+def execute(args, storage):
+    """
+    Runs a parsed command against a storage, reporting storage errors.
+
+    Args:
+        args (argparse.Namespace): The parsed command line.
+        storage (FileStorage | daemon.Daemon): Where the tasks are kept.
+
+    Returns:
+        int: The exit status.
+    """
+    try:
+        with profiling.span(f"command.{args.command}"):
+            return args.handler(args, storage)
+    except BrokenPipeError:
+        raise
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
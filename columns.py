@@ -0,0 +1,131 @@
+# columns.py
+
+from array import array
+
+"""
+This module contains the compact column types the task store is built from.
+Instead of one dictionary per task, each field is kept in its own column,
+addressed by row number: small fixed domains like status and priority are
+stored as one code per row, and free text is packed into a single UTF-8 buffer.
+"""
+
+class CodeColumn:
+    """
+    A column of strings from a small domain, stored as one 2-byte code per row.
+
+    Each distinct value is kept once in a code table, so a million 'pending'
+    statuses cost two bytes each instead of a pointer to a string.
+    """
+
+    def __init__(self, values=()):
+        """
+        Args:
+            values (iterable): Values to put in the code table up front, so
+                the common values get stable, low codes.
+        """
+        self.values = []  # code -> value
+        self._codes = {}  # value -> code
+        self._rows = array('H')
+        for value in values:
+            self.code(value)
+
+    @classmethod
+    def from_codes(cls, values, codes):
+        """
+        Builds a column from a code table and one code per row.
+
+        Args:
+            values (iterable): The code table, in code order.
+            codes (array): An array('H') of codes, taken over as it is.
+        """
+        column = cls(values)
+        if any(code >= len(column.values) for code in set(codes)):
+            raise ValueError("Code out of range of the code table")
+        column._rows = codes
+        return column
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, row):
+        return self.values[self._rows[row]]
+
+    def __setitem__(self, row, value):
+        self._rows[row] = self.code(value)
+
+    def code(self, value):
+        """Returns the code of a value, adding it to the code table if needed."""
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def append(self, value):
+        self._rows.append(self.code(value))
+
+    def codes(self):
+        """Returns the raw code array, one entry per row."""
+        return self._rows
+
+    def take(self, rows):
+        """Returns a new column holding only the given rows, in that order."""
+        column = CodeColumn()
+        column.values = list(self.values)
+        column._codes = dict(self._codes)
+        column._rows = array('H', (self._rows[row] for row in rows))
+        return column
+
+class StringColumn:
+    """
+    A column of strings packed as UTF-8 into one growing buffer.
+
+    Overwriting a row appends the new text and leaves the old bytes behind as
+    garbage; ``take`` copies only the live text when the store compacts.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array('Q')
+        self.lengths = array('I')
+        self.garbage = 0  # bytes no longer referenced by any row
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, row):
+        offset = self.offsets[row]
+        return self.data[offset:offset + self.lengths[row]].decode("utf-8")
+
+    def __setitem__(self, row, text):
+        self.set_encoded(row, text.encode("utf-8"))
+
+    def set_encoded(self, row, encoded):
+        """Overwrites a row with text that is already encoded as UTF-8."""
+        self.garbage += self.lengths[row]
+        self.offsets[row] = len(self.data)
+        self.lengths[row] = len(encoded)
+        self.data += encoded
+
+    def append(self, text):
+        self.append_encoded(text.encode("utf-8"))
+
+    def append_encoded(self, encoded):
+        """Appends a row with text that is already encoded as UTF-8."""
+        self.offsets.append(len(self.data))
+        self.lengths.append(len(encoded))
+        self.data += encoded
+
+    def drop(self, row):
+        """Marks the text of a deleted row as garbage."""
+        self.garbage += self.lengths[row]
+
+    def take(self, rows):
+        """Returns a new column holding only the given rows, in that order."""
+        column = StringColumn()
+        for row in rows:
+            offset = self.offsets[row]
+            column.offsets.append(len(column.data))
+            column.lengths.append(self.lengths[row])
+            column.data += self.data[offset:offset + self.lengths[row]]
+        return column
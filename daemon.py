@@ -0,0 +1,336 @@
+# daemon.py
+
+import io
+import json
+import os
+import shutil
+import signal
+import socket
+import sys
+from contextlib import redirect_stderr, redirect_stdout
+from background_writer import BackgroundWriter
+from file_handling import Archive, apply_operation, archive_tasks, load_tasks
+from task import filter_tasks, find_task, fuzzy_search_tasks, query_tasks, scan_page, search_tasks
+
+"""
+This module contains the daemon started by 'main.py serve' and its client.
+The daemon loads the tasks once, keeps the store and its indexes in memory,
+and answers the commands of other invocations over a Unix domain socket next
+to the tasks file (``tasks.json.sock``), so their cost no longer depends on
+the size of the data. Requests are handled one at a time, which also keeps
+concurrent invocations from overwriting each other's changes.
+
+The protocol is one JSON object per connection in each direction. A request
+has an 'op': 'run' carries a command line together with the client's working
+directory, standard input and terminal size, and is answered with the exit
+status and the text the command printed; 'ping' and 'shutdown' are answered
+with an empty reply. Changes are journaled by a background writer, so a burst
+of commands is written as one batch once it has settled.
+"""
+
+# Suffix of the socket created next to the tasks file
+SOCKET_SUFFIX = ".sock"
+
+# Seconds the daemon waits for a client to send its request
+REQUEST_TIMEOUT = 10
+
+def socket_path(file_path):
+    """Returns the path of the socket of the daemon serving a tasks file."""
+    return os.path.abspath(file_path) + SOCKET_SUFFIX
+
+def _receive(sock):
+    """Reads everything the other side sends until it shuts down its end."""
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+def request(file_path, message):
+    """
+    Sends one request to the daemon serving a tasks file.
+
+    Args:
+        file_path (str): The path to the tasks file.
+        message (dict): The request.
+
+    Returns:
+        dict: The reply, or None if no daemon is serving the file.
+
+    Raises:
+        OSError: If the daemon accepted the request but did not answer it.
+    """
+    path = socket_path(file_path)
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # A socket left behind by a daemon that did not shut down cleanly
+            return None
+        sock.sendall(json.dumps(message).encode("utf-8"))
+        sock.shutdown(socket.SHUT_WR)
+        reply = _receive(sock)
+    if not reply:
+        raise OSError(f"The daemon serving {file_path} closed the connection without answering")
+    return json.loads(reply)
+
+def is_running(file_path):
+    """Tells whether a daemon is serving a tasks file."""
+    return request(file_path, {"op": "ping"}) is not None
+
+def stop(file_path):
+    """
+    Asks the daemon serving a tasks file to shut down.
+
+    Returns:
+        bool: True if a daemon was running.
+    """
+    return request(file_path, {"op": "shutdown"}) is not None
+
+def forward(file_path, argv, stdin=False):
+    """
+    Runs a command in the daemon serving a tasks file and prints its output.
+
+    Args:
+        file_path (str): The path to the tasks file.
+        argv (list): The command line, without the program name.
+        stdin (bool): Whether the command reads standard input, which only
+            the client can do, so it is read here and sent along.
+
+    Returns:
+        int: The exit status of the command, or None if no daemon is serving
+            the file and the command has to run directly.
+    """
+    if not os.path.exists(socket_path(file_path)):
+        return None
+    text = sys.stdin.read() if stdin else ""
+    message = {
+        "op": "run",
+        "argv": argv,
+        "cwd": os.getcwd(),
+        "stdin": text,
+        "width": shutil.get_terminal_size().columns,
+        "color": sys.stdout.isatty()
+    }
+    reply = request(file_path, message)
+    if reply is None:
+        if stdin:
+            # The command runs directly after all, so give it back its input
+            sys.stdin = io.StringIO(text)
+        return None
+    sys.stdout.write(reply["stdout"])
+    sys.stderr.write(reply["stderr"])
+    return reply["status"]
+
+class Daemon:
+    """
+    Holds the tasks of one file in memory and runs commands against them.
+
+    The daemon is also the storage the commands of the 'cli' module use while
+    it runs them: changes are applied to the in-memory store and queries are
+    answered from its indexes. The archive is read by the first query that
+    asks for archived tasks and then kept in memory as well.
+    """
+
+    def __init__(self, file_path):
+        """
+        Args:
+            file_path (str): The path to the tasks file.
+        """
+        self.file_path = os.path.abspath(file_path)
+        self.tasks = load_tasks(self.file_path)
+        self.archive = Archive(self.file_path)
+        self.writer = BackgroundWriter(self.tasks, self.file_path)
+        # Keep the working set to the tasks still being worked on
+        operation = archive_tasks(self.tasks, self.archive)
+        if operation:
+            self.writer.record([operation])
+        self._build_indexes()
+
+    def _build_indexes(self):
+        """Builds the search indexes of the store up front, so no command waits for them."""
+        build_indexes = getattr(self.tasks, "build_indexes", None)
+        if build_indexes:
+            build_indexes()
+
+    def load(self):
+        """Returns the tasks held in memory, to be changed in place."""
+        return self.tasks
+
+    def record(self, tasks, operations):
+        """Queues the operations to be journaled in the background."""
+        self.writer.record(operations)
+
+    def reload(self):
+        """
+        Replaces the store with the tasks on disk plus the changes not written yet.
+
+        Called after a command failed unexpectedly, which may have left the
+        store half-changed; the changes of that command are dropped with it.
+        Called with the writer's lock held, so no write is under way.
+        """
+        close = getattr(self.tasks, "close", None)
+        if close:
+            # Rolls back what the failed command did to the database
+            close()
+        tasks = load_tasks(self.file_path)
+        for operation in self.writer.unwritten():
+            apply_operation(tasks, operation)
+        self.tasks = self.writer.tasks = tasks
+        self._build_indexes()
+
+    def _archive(self, archived):
+        """Returns the archive if a query asks for archived tasks, else None."""
+        return self.archive if archived else None
+
+    def find(self, task_ids, archived=False):
+        """Returns the tasks with the given IDs that exist, in the order asked for."""
+        archive = self._archive(archived)
+        found = (find_task(self.tasks, task_id, archive) for task_id in dict.fromkeys(task_ids))
+        return [found_task for found_task in found if found_task is not None]
+
+    def page(self, page, page_size):
+        """Returns one page of the tasks in the order they are kept."""
+        return scan_page(iter(self.tasks), page, page_size)
+
+    def search(self, term, archived=False):
+        """Returns the tasks whose title or description contains a term."""
+        return search_tasks(self.tasks, term, self._archive(archived))
+
+    def fuzzy_search(self, term, limit):
+        """Returns the tasks best matching a term, ranked from the fuzzy index."""
+        return fuzzy_search_tasks(self.tasks, term, limit)
+
+    def filter(self, criterion, archived=False):
+        """Returns the tasks matching a filter criterion."""
+        return filter_tasks(self.tasks, criterion, self._archive(archived))
+
+    def query(self, query):
+        """Returns the tasks matching a parsed query, answered from the indexes."""
+        return query_tasks(self.tasks, query)
+
+    def run(self, message):
+        """
+        Runs a forwarded command line, capturing what it prints.
+
+        Args:
+            message (dict): A 'run' request.
+
+        Returns:
+            dict: The reply with the exit status and the captured output.
+        """
+        import cli
+        import task
+        from rich.console import Console
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        color = message.get("color", False)
+        console = Console(
+            file=stdout, width=message.get("width", 80), force_terminal=color,
+            color_system="truecolor" if color else None
+        )
+        cwd = os.getcwd()
+        stdin = sys.stdin
+        try:
+            # Relative paths, such as the file given to 'import', are the client's
+            os.chdir(message.get("cwd", cwd))
+            sys.stdin = io.StringIO(message.get("stdin", ""))
+            with redirect_stdout(stdout), redirect_stderr(stderr), task.console.redirect(console):
+                try:
+                    args = cli.build_parser().parse_args(message["argv"])
+                    status = cli.execute(args, self)
+                except SystemExit as e:
+                    # Raised by argparse for invalid command lines
+                    status = e.code if isinstance(e.code, int) else 1
+                except Exception as e:
+                    print(f"Error: {e}", file=sys.stderr)
+                    status = 1
+                    # Expected errors are reported by cli.execute, so this one may have broken the store
+                    self.reload()
+        finally:
+            sys.stdin = stdin
+            os.chdir(cwd)
+        return {"status": status, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+    def handle(self, connection):
+        """
+        Answers one request.
+
+        Returns:
+            bool: False if the request asked the daemon to shut down.
+        """
+        with connection:
+            connection.settimeout(REQUEST_TIMEOUT)
+            message = json.loads(_receive(connection) or b"{}")
+            op = message.get("op")
+            reply = {}
+            if op == "run":
+                # Commands change the store, which must not happen while it is being written
+                with self.writer.lock:
+                    reply = self.run(message)
+            connection.sendall(json.dumps(reply).encode("utf-8"))
+        return op != "shutdown"
+
+    def serve_forever(self):
+        """Answers requests until a 'shutdown' request or a signal stops the daemon."""
+        path = socket_path(self.file_path)
+        if os.path.exists(path):
+            # Left behind by a daemon that did not shut down cleanly; 'serve' checked it is not in use
+            os.remove(path)
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            # Only the owner may read or change the tasks through the socket. The mode is set by
+            # the umask as bind creates it, since changing it afterwards would leave a window
+            umask = os.umask(0o177)
+            try:
+                server.bind(path)
+            finally:
+                os.umask(umask)
+            try:
+                server.listen()
+                while True:
+                    connection, _ = server.accept()
+                    try:
+                        if not self.handle(connection):
+                            break
+                    except (OSError, ValueError) as e:
+                        print(f"Error: {e}", file=sys.stderr)
+            finally:
+                os.remove(path)
+                self.writer.close()
+
+def serve(file_path):
+    """
+    Runs a daemon for a tasks file in the foreground until it is stopped.
+
+    Args:
+        file_path (str): The path to the tasks file.
+
+    Returns:
+        int: The exit status.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        print("Error: The daemon needs Unix domain sockets, which this platform does not have.", file=sys.stderr)
+        return 1
+    if is_running(file_path):
+        print(f"Error: A daemon is already serving {os.path.abspath(file_path)}.", file=sys.stderr)
+        return 1
+    try:
+        daemon = Daemon(file_path)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    # Import rich now rather than in the first request that prints a table
+    import rich.console, rich.table
+    # Stop cleanly on 'kill' as well as on Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"Serving {len(daemon.tasks)} task(s) from {daemon.file_path} on {socket_path(file_path)}. "
+          "Stop with Ctrl+C or 'main.py serve --stop'.", file=sys.stderr)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
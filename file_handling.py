@@ -1,45 +1,1388 @@
-# handling.py
+# file_handling.py
 
+import codecs
+import contextlib
 import json
+import mmap
 import os
+import profiling
+import shutil
+import zlib
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from itertools import repeat
+from task_store import TaskStore
 
 """
 This module handles the data persistence for the To-Do application.
-It is responsible for reading from and writing to the JSON file where tasks are stored.
+It is responsible for reading from and writing to the file where tasks are stored.
+
+Each storage format is a backend class with 'load', 'save' and 'record'
+methods, picked by the file extension in 'get_backend'. 'load' returns a task
+store, which answers get, add (put), remove (delete), search/filter (query)
+and iteration; the module-level functions below delegate to the backend.
+
+The default backend is a JSON file. Its changes are journaled: every
+mutation is appended as one JSON line to a log file next to the snapshot
+(``tasks.json.log``). Loading replays the log on top of the snapshot, and
+once the log grows past ``COMPACTION_THRESHOLD`` bytes the snapshot is
+rewritten and the log is truncated.
+
+A path ending in ``.shards`` is a directory holding the sharded layout: the
+tasks are split by ID into shard files of ``SHARD_SIZE`` IDs each, listed in
+a small manifest. A change rewrites only the shards it touched, a lookup by
+ID reads only one shard, and a full scan reads the shards in parallel.
+
+Store metadata that is not part of any task, such as the next ID to hand
+out, is kept in a small JSON sidecar (``tasks.json.meta``) written with the
+snapshot.
+
+Completed tasks that are no longer worked on are moved out of the store by
+'archive_tasks' into a compressed, append-only archive next to it
+(``tasks.json.archive.gz``), so the working set that is loaded, searched and
+saved on every run stays small. The 'Archive' is only read when a lookup,
+search or filter asks for archived tasks too.
+
+Snapshots and metadata are written to a temporary file that is synced to disk
+and then renamed over the old one, so a crash while saving leaves either the
+old or the new file, never a truncated one. Log appends are synced too; a
+record torn by a crash is dropped when the log is next read.
+
+Read-only scans of large files run on every core: 'scan_tasks' has the
+backend split the tasks into chunks, e.g. byte ranges of a JSON snapshot or
+runs of shards, which worker processes read and match on their own.
+
+The module-level functions are timed by 'profiling' while a session is
+running, and the backends report the bytes they read and write to it.
 """
 
-def load_tasks(file_path):
+# Suffix of the append-only operation log kept next to the snapshot
+LOG_SUFFIX = ".log"
+
+# Suffix of the metadata file kept next to the snapshot
+META_SUFFIX = ".meta"
+
+# Size in bytes after which the log is folded back into the snapshot
+COMPACTION_THRESHOLD = 1024 * 1024
+
+# Bytes decoded at a time when streaming tasks out of a snapshot
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Suffix of the compressed archive of old completed tasks kept next to the snapshot
+ARCHIVE_SUFFIX = ".archive.gz"
+
+# Days after its completion that a task is moved to the archive
+ARCHIVE_AFTER_DAYS = 30
+
+# Name of the manifest in a sharded layout's directory
+MANIFEST_NAME = "manifest.json"
+
+# Prefix and suffix of the shard files in a sharded layout's directory
+SHARD_PREFIX = "shard-"
+SHARD_SUFFIX = ".json"
+
+# Bytes of task data from which read-only scans are split across processes;
+# below it, starting the processes costs more than they save
+PARALLEL_SCAN_MIN_BYTES = 16 * 1024 * 1024
+
+# How each task of a JSON snapshot written by 'JsonBackend.save' starts
+_TASK_START = b"\n    {"
+
+# Threads reading shards at once when every shard is needed
+SHARD_WORKERS = min(8, os.cpu_count() or 1)
+
+# zlib window bits for data with a gzip header, which 'zcat' can read
+_GZIP_WBITS = zlib.MAX_WBITS | 16
+
+@contextlib.contextmanager
+def _atomic_write(file_path, mode='w'):
     """
-    Loads tasks from a JSON file.
+    Opens a temporary file that replaces a file once the block has finished.
 
-    If the file does not exist, it creates an empty file and returns an empty list.
+    The data is synced to disk before the rename, and the directory after it.
+    If the block raises, the file is left as it was.
 
     Args:
-        file_path (str): The path to the tasks JSON file.
+        file_path (str): The file to replace.
+        mode (str): 'w' for text or 'wb' for binary data.
+
+    Yields:
+        file: The temporary file, to write the new contents to.
+    """
+    temp_path = f"{file_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, temp_path)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+    _sync_directory(os.path.dirname(os.path.abspath(file_path)))
+
+def _sync_directory(directory):
+    """Makes a rename in a directory durable; Windows neither allows nor needs this."""
+    if os.name == "posix":
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+def _append(path, data):
+    """
+    Appends data to a file and syncs it to disk.
 
     Returns:
-        list: A list of task dictionaries.
+        int: The size of the file after the append.
     """
-    if not os.path.exists(file_path):
-        with open(file_path, 'w') as f:
-            json.dump([], f)
-        return []
-    
+    with open(path, 'ab') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+        profiling.count_io(written=len(data))
+        return f.tell()
+
+def log_path(file_path):
+    """Returns the path of the operation log belonging to a snapshot file."""
+    return file_path + LOG_SUFFIX
+
+def meta_path(file_path):
+    """Returns the path of the metadata file belonging to a snapshot file."""
+    return file_path + META_SUFFIX
+
+def archive_path(file_path):
+    """Returns the path of the archive belonging to a tasks file."""
+    return file_path + ARCHIVE_SUFFIX
+
+def _load_metadata(file_path):
+    """Reads the metadata of a snapshot file, or an empty dict if there is none."""
     try:
-        with open(file_path, 'r') as f:
-            tasks = json.load(f)
-            return tasks
-    except json.JSONDecodeError:
-        # If the file is corrupted or empty, handle it gracefully
-        return []
+        with open(meta_path(file_path), 'r') as f:
+            metadata = json.load(f)
+            profiling.count_io(read=f.tell())
+            return metadata
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _save_metadata(tasks, file_path):
+    """Writes the metadata of a task store next to its snapshot file."""
+    with _atomic_write(meta_path(file_path)) as f:
+        json.dump({"next_id": tasks.next_id}, f)
+        profiling.count_io(written=f.tell())
+
+def apply_operation(tasks, operation):
+    """
+    Applies a single journaled operation to the loaded tasks.
+
+    Replaying is idempotent for 'add', 'update', 'delete' and 'archive', so
+    a log that survived a crash between writing the snapshot and truncating
+    the log is harmless. A 'delete' record is the tombstone of its task until
+    the next compaction drops both from the snapshot; an 'archive' record is
+    that of every task moved to the archive at once.
+
+    Args:
+        tasks (TaskStore): The tasks to modify in place.
+        operation (dict): The operation record, as returned by the mutating
+            functions in the 'task' module.
+    """
+    kind = operation["op"]
+    if kind == "add":
+        tasks.add(dict(operation["task"]))
+    elif kind == "update":
+        tasks.update(operation["id"], operation["fields"])
+    elif kind == "delete":
+        tasks.remove(operation["id"])
+    elif kind == "archive":
+        tasks.remove_many(operation["ids"])
+    elif kind == "renumber":
+        tasks.renumber(operation.get("start", 1))
+
+def _encode_operation(operation):
+    """Encodes an operation record as one line of the log."""
+    return (json.dumps(operation, separators=(",", ":")) + "\n").encode("utf-8")
+
+def _read_log(file_path):
+    """
+    Reads the complete records of the operation log for a snapshot.
+
+    A trailing line without a newline is the remains of an interrupted append
+    and is not returned.
+
+    Returns:
+        tuple: The list of operation records and the size in bytes they take up.
+    """
+    path = log_path(file_path)
+    operations = []
+    good_size = 0
+    if not os.path.exists(path):
+        return operations, good_size
+
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                operations.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+            good_size += len(line)
+    profiling.count_io(read=good_size)
+    return operations, good_size
+
+def _replay_log(tasks, file_path):
+    """
+    Replays the operation log for a snapshot on top of the loaded tasks.
+
+    A torn trailing record is cut off so that the next append starts on a
+    fresh line.
+    """
+    operations, good_size = _read_log(file_path)
+    for operation in operations:
+        apply_operation(tasks, operation)
+
+    path = log_path(file_path)
+    if os.path.exists(path) and good_size != os.path.getsize(path):
+        with open(path, 'r+b') as f:
+            f.truncate(good_size)
+
+def _truncate_log(file_path):
+    """Empties the operation log once the snapshot contains every change."""
+    path = log_path(file_path)
+    if os.path.exists(path):
+        with open(path, 'wb'):
+            pass
+
+def _iter_snapshot(file_path, start=0, stop=None):
+    """
+    Yields the tasks of a JSON snapshot one at a time.
+
+    The file is memory-mapped and decoded ``STREAM_CHUNK_SIZE`` bytes at a
+    time, and each task is parsed as soon as its closing brace has been read,
+    so memory stays bounded by the chunk size and the largest single task.
+
+    Args:
+        file_path (str): The path to the snapshot.
+        start (int): The byte offset to start at. Anything but 0 must be
+            the start of a task inside the array, as found by
+            'JsonBackend.scan_chunks'.
+        stop (int): The byte offset at which the next chunk starts, or None
+            to read to the end.
+    """
+    if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+        return
+
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        limit = len(data) if stop is None else min(stop, len(data))
+        offset = start
+        buffer = ""
+        pos = 0
+        opened = start > 0
+
+        while True:
+            # Skip whitespace and the separators between tasks
+            while pos < len(buffer) and buffer[pos] in " \t\r\n" + (",]" if opened else "["):
+                if buffer[pos] == "[":
+                    opened = True
+                elif buffer[pos] == "]":
+                    return
+                pos += 1
+
+            if pos < len(buffer):
+                try:
+                    task, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if offset >= limit:
+                        raise
+                    # The task continues in the next chunk
+                else:
+                    pos = end
+                    yield task
+                    continue
+            elif offset >= limit:
+                return
+
+            # Drop what has been parsed and decode the next chunk
+            chunk = data[offset:min(offset + STREAM_CHUNK_SIZE, limit)]
+            offset += len(chunk)
+            profiling.count_io(read=len(chunk))
+            buffer = buffer[pos:] + utf8.decode(chunk, final=offset >= limit)
+            pos = 0
+
+def _iter_with_log(tasks, operations):
+    """
+    Applies logged operations to a stream of snapshot tasks on the fly.
+
+    Produces the same tasks in the same order as replaying the log on a fully
+    loaded TaskStore: replaced tasks keep their place, and tasks added after
+    the snapshot, or deleted and added again, come last.
+    """
+    changes = {}  # task ID -> ("put", task) | ("patch", fields) | ("delete", None)
+    for operation in operations:
+        kind = operation["op"]
+        task_id = operation.get("id", operation.get("task", {}).get("id"))
+        if kind == "add":
+            state = changes.get(task_id, ("put", None))[0]
+            if state == "delete":
+                # A deleted task that comes back moves to the end
+                del changes[task_id]
+                state = "append"
+            elif state == "patch":
+                state = "put"
+            changes[task_id] = (state, dict(operation["task"]))
+        elif kind == "update":
+            state, value = changes.get(task_id, ("patch", {}))
+            if state != "delete":
+                value.update(operation["fields"])
+                changes[task_id] = (state, value)
+        elif kind == "delete":
+            changes[task_id] = ("delete", None)
+        elif kind == "archive":
+            changes.update((archived_id, ("delete", None)) for archived_id in operation["ids"])
+
+    for task in tasks:
+        state, value = changes.get(task["id"], (None, None))
+        if state is None:
+            yield task
+        elif state != "append":
+            del changes[task["id"]]
+            if state == "put":
+                yield value
+            elif state == "patch":
+                task.update(value)
+                yield task
+
+    for state, value in changes.values():
+        if state in ("put", "append"):
+            yield value
+
+class JsonBackend:
+    """
+    Stores tasks in a JSON snapshot with an append-only operation log.
+
+    The whole snapshot is loaded into an in-memory TaskStore.
+    """
+
+    # Whether 'record' may run on another thread than the one that loaded the
+    # tasks, as it does for 'background_writer.BackgroundWriter'
+    background_writes = True
+
+    # Whether 'load' reads tasks only when they are asked for, which makes
+    # looking up a few IDs in the loaded store cheaper than streaming the file
+    loads_on_demand = False
+
+    # Whether the loaded store answers searches, filters and queries from
+    # indexes on disk, which makes that cheaper than streaming the file
+    indexed_queries = False
+
+    def __init__(self, file_path):
+        """
+        Args:
+            file_path (str): The path to the tasks JSON file.
+        """
+        self.file_path = file_path
+
+    def load(self):
+        """
+        Loads tasks from the JSON file.
+
+        If the file does not exist, it creates an empty file and returns an empty store.
+        An empty file is an empty store as well. Any operations journaled since
+        the last snapshot are replayed on top.
+
+        Returns:
+            TaskStore: The loaded tasks, indexed by ID.
+
+        Raises:
+            ValueError: If the file is not valid JSON. It is left untouched, so
+                that it can be repaired rather than overwritten by the next save.
+        """
+        next_id = _load_metadata(self.file_path).get("next_id", 1)
+        if not os.path.exists(self.file_path):
+            with open(self.file_path, 'w') as f:
+                json.dump([], f)
+            tasks = TaskStore(next_id=next_id)
+        else:
+            with open(self.file_path, 'r') as f:
+                text = f.read()
+            profiling.count_io(read=len(text))
+            try:
+                tasks = TaskStore(json.loads(text) if text.strip() else [], next_id=next_id)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"The tasks file {self.file_path} is corrupted ({e}); repair it or move it aside") from None
+
+        _replay_log(tasks, self.file_path)
+        return tasks
+
+    def iter_tasks(self):
+        """
+        Yields the tasks one at a time without loading the whole file.
+
+        The snapshot is parsed incrementally and the operation log is applied
+        on the fly, so a caller can act on the first tasks before the rest of
+        the file has been read. A log that re-numbers tasks cannot be applied
+        to a stream; in that case the file is loaded in full.
+
+        Yields:
+            dict: Each task, in insertion order.
+        """
+        operations, _ = _read_log(self.file_path)
+        if any(operation["op"] == "renumber" for operation in operations):
+            yield from (dict(task) for task in self.load())
+            return
+        yield from _iter_with_log(_iter_snapshot(self.file_path), operations)
+
+    def scan_chunks(self, count):
+        """
+        Splits the snapshot into byte ranges that can be scanned independently.
+
+        'save' puts every task on a line of its own, indented by four spaces,
+        and a raw newline cannot occur inside a JSON string, so the start of
+        a task is found by searching for a newline, exactly those spaces and
+        a brace. A snapshot formatted otherwise stays in one piece.
+
+        Args:
+            count (int): The number of chunks wanted.
+
+        Returns:
+            tuple: The chunks, to be read with 'iter_chunk'; the operations of
+            the log, to be applied on top of them; and the size of the data in
+            bytes. None if the log re-numbers tasks, which only a full load
+            can apply.
+        """
+        operations, _ = _read_log(self.file_path)
+        if any(operation["op"] == "renumber" for operation in operations):
+            return None
+        size = os.path.getsize(self.file_path) if os.path.exists(self.file_path) else 0
+        if size == 0:
+            return [], operations, 0
+        starts = [0]
+        with open(self.file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for i in range(1, count):
+                found = data.find(_TASK_START, max(size * i // count, starts[-1]))
+                if found == -1:
+                    break
+                starts.append(found + 1)
+        return list(zip(starts, starts[1:] + [None])), operations, size
+
+    def iter_chunk(self, chunk):
+        """
+        Yields the snapshot tasks of one chunk from 'scan_chunks', without the log.
+
+        Args:
+            chunk (tuple): The byte offsets at which the chunk starts and stops.
+        """
+        return _iter_snapshot(self.file_path, *chunk)
+
+    def save(self, tasks):
+        """
+        Saves tasks to the JSON file.
+
+        The snapshot then contains every change, so the operation log is truncated.
+
+        Args:
+            tasks (TaskStore): The tasks to save.
+        """
+        with _atomic_write(self.file_path) as f:
+            json.dump([dict(task) for task in tasks], f, indent=4)
+            profiling.count_io(written=f.tell())
+        _save_metadata(tasks, self.file_path)
+        _truncate_log(self.file_path)
+
+    def record(self, tasks, operations):
+        """
+        Persists a batch of changes, compacting the log when it has grown too large.
+
+        The write cost is proportional to the size of the changes; only every so
+        often, when the log would pass ``COMPACTION_THRESHOLD``, is the full
+        snapshot rewritten instead. Moving tasks to the archive rewrites it
+        right away, since shrinking the snapshot is the point of archiving.
+
+        Args:
+            tasks (TaskStore): The current tasks, already containing the changes.
+            operations (list): The operation records describing the changes.
+        """
+        data = b"".join(_encode_operation(operation) for operation in operations)
+        path = log_path(self.file_path)
+        log_size = os.path.getsize(path) if os.path.exists(path) else 0
+        if log_size + len(data) > COMPACTION_THRESHOLD or any(operation["op"] == "archive" for operation in operations):
+            self.save(tasks)
+        else:
+            _append(path, data)
+
+class BinaryBackend(JsonBackend):
+    """
+    Stores tasks in a binary snapshot with the same append-only operation log.
+
+    The snapshot holds the store's columns as they are (see 'binary_snapshot'),
+    so loading and saving copy whole columns instead of parsing or formatting
+    every field. The next ID is part of the snapshot header.
+    """
+
+    def _read(self):
+        """Returns the contents of the snapshot, or None if there is none."""
+        # An empty file, e.g. created ahead or truncated, is an empty store, as for JSON
+        if not os.path.exists(self.file_path) or os.path.getsize(self.file_path) == 0:
+            return None
+        with open(self.file_path, 'rb') as f:
+            data = f.read()
+        profiling.count_io(read=len(data))
+        return data
+
+    def load(self):
+        """
+        Loads tasks from the binary snapshot and replays the operation log.
+
+        Returns:
+            TaskStore: The loaded tasks, indexed by ID.
+
+        Raises:
+            ValueError: If the file is not a binary snapshot this version can read.
+        """
+        from binary_snapshot import read_snapshot
+        data = self._read()
+        if data is None:
+            tasks = TaskStore()
+        else:
+            columns, next_id = read_snapshot(data)
+            tasks = TaskStore.from_columns(**columns, next_id=next_id)
+        _replay_log(tasks, self.file_path)
+        return tasks
+
+    def iter_tasks(self):
+        """
+        Yields the tasks one at a time, with the operation log applied.
+
+        Yields:
+            dict: Each task, in insertion order.
+        """
+        operations, _ = _read_log(self.file_path)
+        if any(operation["op"] == "renumber" for operation in operations):
+            yield from (dict(task) for task in self.load())
+            return
+        from binary_snapshot import iter_snapshot
+        data = self._read()
+        yield from _iter_with_log(iter_snapshot(data) if data else iter(()), operations)
+
+    def scan_chunks(self, count):
+        """
+        Splits the snapshot into row ranges that can be scanned independently.
+
+        Args:
+            count (int): The number of chunks wanted.
+
+        Returns:
+            tuple: The chunks, the operations of the log and the size of the
+            data in bytes, as for 'JsonBackend.scan_chunks', or None.
+        """
+        operations, _ = _read_log(self.file_path)
+        if any(operation["op"] == "renumber" for operation in operations):
+            return None
+        if not os.path.exists(self.file_path) or os.path.getsize(self.file_path) == 0:
+            return [], operations, 0
+        from binary_snapshot import task_count
+        with open(self.file_path, 'rb') as f:
+            rows = task_count(f.read(64))
+        bounds = [rows * i // count for i in range(count + 1)]
+        chunks = [(start, stop) for start, stop in zip(bounds, bounds[1:]) if start < stop]
+        return chunks, operations, os.path.getsize(self.file_path)
+
+    def iter_chunk(self, chunk):
+        """
+        Yields the snapshot tasks of one chunk from 'scan_chunks', without the log.
+
+        The file is memory-mapped, so only the pages holding the chunk's rows
+        of each column are read, besides the header and the extra fields.
+
+        Args:
+            chunk (tuple): The rows at which the chunk starts and stops.
+        """
+        from binary_snapshot import iter_snapshot
+        if not os.path.exists(self.file_path) or os.path.getsize(self.file_path) == 0:
+            return
+        with open(self.file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from iter_snapshot(data, *chunk)
+
+    def save(self, tasks):
+        """
+        Saves tasks as a binary snapshot and truncates the operation log.
+
+        Args:
+            tasks (TaskStore): The tasks to save. Any other collection of
+                tasks is copied into a TaskStore first.
+        """
+        if not isinstance(tasks, TaskStore):
+            tasks = TaskStore((dict(task) for task in tasks), next_id=tasks.next_id)
+        from binary_snapshot import write_snapshot
+        with _atomic_write(self.file_path, 'wb') as f:
+            profiling.count_io(written=write_snapshot(f, tasks.columns(), tasks.next_id))
+        _truncate_log(self.file_path)
+
+class SQLiteBackend:
+    """
+    Stores tasks in an SQLite database.
+
+    Loading only opens the database; queries run against it directly.
+    """
+
+    # The store writes through its connection, which belongs to the thread
+    # that opened it, and a commit is already atomic
+    background_writes = False
+
+    loads_on_demand = True
+
+    indexed_queries = True
+
+    def __init__(self, file_path):
+        """
+        Args:
+            file_path (str): The path to the database file.
+        """
+        self.file_path = file_path
+
+    def load(self):
+        """
+        Opens the database, creating it if needed.
+
+        Returns:
+            SQLiteTaskStore: A store answering every operation with queries.
+        """
+        from sqlite_store import SQLiteTaskStore
+        return SQLiteTaskStore(self.file_path)
+
+    def iter_tasks(self):
+        """
+        Yields the tasks one at a time straight from a database cursor.
+
+        Yields:
+            dict: Each task, in insertion order.
+        """
+        from sqlite_store import SQLiteTaskStore
+        store = SQLiteTaskStore(self.file_path)
+        try:
+            yield from store
+        finally:
+            store.close()
+
+    def scan_chunks(self, count):
+        """Returns None: the database answers searches and filters itself, on one connection."""
+        return None
+
+    def save(self, tasks):
+        """
+        Saves tasks to the database.
+
+        For the store loaded from this database this is just a commit. Any
+        other store, such as one loaded from JSON, replaces the database's
+        contents, which is how data is converted between formats.
+
+        Args:
+            tasks (TaskStore | SQLiteTaskStore): The tasks to save.
+        """
+        from sqlite_store import SQLiteTaskStore
+        if isinstance(tasks, SQLiteTaskStore):
+            tasks.commit()
+            return
+
+        store = SQLiteTaskStore(self.file_path)
+        try:
+            for task_id in store.ids():
+                store.remove(task_id)
+            for task in tasks:
+                store.add(dict(task))
+            store.next_id = tasks.next_id
+            store.commit()
+        finally:
+            store.close()
+
+    def record(self, tasks, operations):
+        """
+        Persists a batch of changes, which the store has already written.
+
+        Args:
+            tasks (SQLiteTaskStore): The current tasks, already containing the changes.
+            operations (list): The operation records describing the changes.
+        """
+        tasks.commit()
+
+class ShardedBackend:
+    """
+    Stores tasks in a directory of shard files, each holding a fixed range of IDs.
+
+    Every shard is a JSON array like ``tasks.json``, without the indentation.
+    The manifest (``manifest.json``) records the number of IDs per shard, the
+    next ID and the number of tasks in each shard, so loading reads nothing
+    else: it returns a ShardedTaskStore, which reads shards as they are needed.
+
+    The manifest is written before the shards, so its next ID is never behind
+    the IDs on disk. The shards are found by listing the directory, so a shard
+    the manifest does not know about, e.g. one copied in by hand, is still read.
+    """
+
+    background_writes = True
 
+    loads_on_demand = True
+
+    # Searching the loaded store would read every shard and build the text
+    # index first, which costs more than scanning the shards in parallel
+    indexed_queries = False
+
+    def __init__(self, file_path):
+        """
+        Args:
+            file_path (str): The path to the directory, ending in '.shards'.
+        """
+        self.file_path = file_path
+
+    def _path(self, name):
+        """Returns the path of a file in the directory."""
+        return os.path.join(self.file_path, name)
+
+    def _shard_path(self, index):
+        """Returns the path of the file of a shard."""
+        return self._path(f"{SHARD_PREFIX}{index:06d}{SHARD_SUFFIX}")
+
+    def _read_manifest(self):
+        """
+        Reads the manifest, or returns an empty dict if there is none.
+
+        Raises:
+            ValueError: If the manifest is not valid JSON.
+        """
+        path = self._path(MANIFEST_NAME)
+        try:
+            with open(path, 'r') as f:
+                manifest = json.load(f)
+                profiling.count_io(read=f.tell())
+                return manifest
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError as e:
+            raise ValueError(f"The manifest {path} is corrupted ({e}); repair it or move it aside") from None
+
+    def _shard_indexes(self):
+        """Returns the indexes of the shard files in the directory, in ascending order."""
+        if not os.path.isdir(self.file_path):
+            return []
+        indexes = []
+        for name in os.listdir(self.file_path):
+            if name.startswith(SHARD_PREFIX) and name.endswith(SHARD_SUFFIX):
+                with contextlib.suppress(ValueError):
+                    indexes.append(int(name[len(SHARD_PREFIX):-len(SHARD_SUFFIX)]))
+        return sorted(indexes)
+
+    def _read_shard(self, index):
+        """
+        Reads and parses one shard; this runs on the worker threads.
+
+        Returns:
+            tuple: The list of task dictionaries and the size of the file in bytes.
+
+        Raises:
+            ValueError: If the shard is not valid JSON.
+        """
+        path = self._shard_path(index)
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            return (json.loads(data) if data.strip() else []), len(data)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ValueError(f"The shard {path} is corrupted ({e}); repair it or move it aside") from None
+
+    def _read_shards(self, indexes):
+        """
+        Reads shards on a pool of threads, keeping a few ahead of the caller.
+
+        The threads overlap waiting for the disk and, on a free-threaded build
+        of Python, the parsing as well. No more than ``SHARD_WORKERS`` shards
+        are read ahead, so a caller that stops early does not read them all.
+
+        Args:
+            indexes (list): The indexes of the shards to read.
+
+        Yields:
+            tuple: The index and the list of task dictionaries of each shard,
+            in the order of the indexes.
+        """
+        if len(indexes) == 1:
+            tasks, size = self._read_shard(indexes[0])
+            profiling.count_io(read=size)
+            yield indexes[0], tasks
+            return
+
+        # Imported here: it pulls in 'logging', which every other command can do without
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=SHARD_WORKERS, thread_name_prefix="shard-reader") as pool:
+            pending = deque()
+            try:
+                for index in indexes:
+                    pending.append((index, pool.submit(self._read_shard, index)))
+                    if len(pending) > SHARD_WORKERS:
+                        ready, future = pending.popleft()
+                        tasks, size = future.result()
+                        # Counted here, since profiling follows the calling thread
+                        profiling.count_io(read=size)
+                        yield ready, tasks
+                while pending:
+                    ready, future = pending.popleft()
+                    tasks, size = future.result()
+                    profiling.count_io(read=size)
+                    yield ready, tasks
+            finally:
+                for _, future in pending:
+                    future.cancel()
+
+    def load(self):
+        """
+        Reads the manifest and returns a store that reads the shards on demand.
+
+        If the directory does not exist, it is created and the store is empty.
+
+        Returns:
+            ShardedTaskStore: The tasks, of which no shard has been read yet.
+
+        Raises:
+            ValueError: If the manifest is corrupted.
+        """
+        manifest = self._read_manifest()
+        os.makedirs(self.file_path, exist_ok=True)
+        known = {int(index): count for index, count in manifest.get("shards", {}).items()}
+        next_id = manifest.get("next_id", 1)
+        counts = {}
+        for index in self._shard_indexes():
+            if index not in known:
+                # Not written by this backend, so it is counted, and its IDs kept from being handed out again
+                tasks, _ = self._read_shard(index)
+                known[index] = len(tasks)
+                next_id = max([next_id] + [task["id"] + 1 for task in tasks])
+            counts[index] = known[index]
+        from sharded_store import SHARD_SIZE, ShardedTaskStore
+        return ShardedTaskStore(
+            os.path.abspath(self.file_path), self._read_shards, counts,
+            manifest.get("shard_size", SHARD_SIZE), next_id
+        )
+
+    def iter_tasks(self):
+        """
+        Yields the tasks one at a time, reading the following shards meanwhile.
+
+        Yields:
+            dict: Each task, in shard order.
+        """
+        for _, tasks in self._read_shards(self._shard_indexes()):
+            yield from tasks
+
+    def scan_chunks(self, count):
+        """
+        Splits the shards into runs of consecutive shards that can be scanned independently.
+
+        Args:
+            count (int): The number of chunks wanted.
+
+        Returns:
+            tuple: The chunks, no operations, since there is no log, and the
+            size of the data in bytes, as for 'JsonBackend.scan_chunks'.
+        """
+        indexes = self._shard_indexes()
+        size = sum(os.path.getsize(self._shard_path(index)) for index in indexes)
+        bounds = [len(indexes) * i // count for i in range(count + 1)]
+        chunks = [indexes[start:stop] for start, stop in zip(bounds, bounds[1:]) if start < stop]
+        return chunks, [], size
+
+    def iter_chunk(self, chunk):
+        """
+        Yields the tasks of one chunk from 'scan_chunks'.
+
+        Args:
+            chunk (list): The indexes of the shards in the chunk.
+        """
+        for index in chunk:
+            yield from self._read_shard(index)[0]
+
+    def _write(self, shards, counts, shard_size, next_id):
+        """
+        Writes the manifest and then the given shards.
+
+        Args:
+            shards (dict): The task dictionaries of each shard to write, by
+                index; the file of a shard without tasks is removed.
+            counts (dict): The number of tasks in every shard that has any, by index.
+            shard_size (int): The number of IDs per shard.
+            next_id (int): The next ID to hand out.
+        """
+        with _atomic_write(self._path(MANIFEST_NAME)) as f:
+            shard_counts = {str(index): count for index, count in sorted(counts.items())}
+            json.dump({"shard_size": shard_size, "next_id": next_id, "shards": shard_counts}, f)
+            profiling.count_io(written=f.tell())
+        removed = False
+        for index, tasks in sorted(shards.items()):
+            path = self._shard_path(index)
+            if tasks:
+                with _atomic_write(path) as f:
+                    f.write(json.dumps(tasks))
+                    profiling.count_io(written=f.tell())
+            elif os.path.exists(path):
+                os.remove(path)
+                removed = True
+        if removed:
+            _sync_directory(self.file_path)
+
+    def save(self, tasks):
+        """
+        Saves tasks to the sharded layout.
+
+        For the store loaded from this directory, only the shards it has
+        changed are rewritten, along with the manifest. Any other store
+        replaces the directory's contents, which is how data is converted
+        between formats.
+
+        Args:
+            tasks (ShardedTaskStore | TaskStore | SQLiteTaskStore): The tasks to save.
+        """
+        from sharded_store import SHARD_SIZE, ShardedTaskStore
+        os.makedirs(self.file_path, exist_ok=True)
+        if isinstance(tasks, ShardedTaskStore) and tasks.directory == os.path.abspath(self.file_path):
+            shards = {index: tasks.shard_tasks(index) for index in tasks.dirty_shards}
+            self._write(shards, tasks.shard_counts(), tasks.shard_size, tasks.next_id)
+            tasks.dirty_shards.difference_update(shards)
+            return
+
+        shards = {}
+        for task in tasks:
+            shards.setdefault(task["id"] // SHARD_SIZE, []).append(dict(task))
+        counts = {index: len(shard) for index, shard in shards.items()}
+        # The old shards that no new one replaces are removed
+        shards.update((index, []) for index in self._shard_indexes() if index not in shards)
+        self._write(shards, counts, SHARD_SIZE, tasks.next_id)
+
+    def record(self, tasks, operations):
+        """
+        Persists a batch of changes by rewriting the shards they touched.
+
+        The store keeps track of those shards itself, so the operation
+        records are not needed; the cost is that of writing the shards.
+
+        Args:
+            tasks (ShardedTaskStore): The current tasks, already containing the changes.
+            operations (list): The operation records describing the changes.
+        """
+        self.save(tasks)
+
+# Backends by file extension; anything else is stored as JSON
+BACKENDS = {
+    ".bin": BinaryBackend,
+    ".db": SQLiteBackend,
+    ".shards": ShardedBackend,
+    ".sqlite": SQLiteBackend,
+    ".sqlite3": SQLiteBackend,
+}
+
+def get_backend(file_path):
+    """
+    Returns the storage backend for a file, chosen by its extension.
+
+    Args:
+        file_path (str): The path to the tasks file.
+
+    Returns:
+        JsonBackend | BinaryBackend | SQLiteBackend | ShardedBackend: The backend for the file.
+    """
+    # A directory may be given with a trailing separator
+    extension = os.path.splitext(os.path.normpath(file_path))[1].lower()
+    return BACKENDS.get(extension, JsonBackend)(file_path)
+
+@profiling.timed("file_handling.load_tasks", records=lambda tasks, file_path: len(tasks))
+def load_tasks(file_path):
+    """
+    Loads tasks from a file with the backend matching its extension.
+
+    Args:
+        file_path (str): The path to the tasks file.
+
+    Returns:
+        TaskStore | SQLiteTaskStore: The loaded tasks.
+    """
+    return get_backend(file_path).load()
+
+@profiling.timed("file_handling.iter_tasks")
+def iter_tasks(file_path):
+    """
+    Yields the tasks of a file one at a time, for read-only scans.
+
+    Unlike load_tasks, this does not build a store or its indexes, and the
+    first tasks are available before the whole file has been read.
+
+    Args:
+        file_path (str): The path to the tasks file.
+
+    Yields:
+        dict: Each task, in insertion order.
+    """
+    yield from get_backend(file_path).iter_tasks()
+
+def _changed_ids(operations):
+    """Returns the IDs of the tasks that logged operations add, change or remove."""
+    ids = set()
+    for operation in operations:
+        if operation["op"] == "archive":
+            ids.update(operation["ids"])
+        elif "id" in operation:
+            ids.add(operation["id"])
+        elif "task" in operation:
+            ids.add(operation["task"]["id"])
+    return ids
+
+def _scan_chunk(file_path, chunk, function, argument, changed):
+    """
+    Scans one chunk of a file for 'scan_tasks'; this runs in a worker process.
+
+    Returns:
+        list: The tasks of the chunk that match, together with those the log
+        changes, which can only be matched once the log has been applied.
+    """
+    tasks = list(get_backend(file_path).iter_chunk(chunk))
+    # The scan functions yield the tasks they are given, so matches are known by identity
+    matching = {id(task) for task in function(tasks, argument)}
+    return [task for task in tasks if id(task) in matching or task["id"] in changed]
+
+def _scan_in_parallel(file_path, chunks, operations, function, argument):
+    """Runs 'scan_tasks' with one worker process per chunk."""
+    # Imported here: starting processes is only worth it for large files
+    from concurrent.futures import ProcessPoolExecutor
+
+    changed = _changed_ids(operations)
+    path = os.path.abspath(file_path)
+    with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+        parts = pool.map(_scan_chunk, repeat(path), chunks, repeat(function), repeat(argument), repeat(changed))
+        candidates = [task for part in parts for task in part]
+    # The log is applied in order, to the few tasks left, just like to a full stream
+    return list(function(_iter_with_log(candidates, operations), argument))
+
+@profiling.timed("file_handling.scan_tasks", records=lambda found, *_: len(found))
+def scan_tasks(file_path, function, argument, workers=None, min_bytes=PARALLEL_SCAN_MIN_BYTES):
+    """
+    Runs a scan over the tasks of a file, on several processes if the file is large.
+
+    The result is that of ``list(function(iter_tasks(file_path), argument))``,
+    in the same order. Above ``min_bytes`` of data, and with more than one
+    CPU, the backend splits the tasks into a chunk per worker process. Each
+    worker reads its chunk from the file itself, so neither the tasks nor
+    any other data are sent to it; only the matches are sent back, along with
+    the tasks the log changes. The log is applied to them in order and the
+    scan run once more over the result, so they are matched as they are now.
+
+    Args:
+        file_path (str): The path to the tasks file.
+        function (callable): A scan function defined at module level, such as
+            'task.scan_search_tasks', which takes a stream of tasks and the
+            argument and yields the matching tasks themselves.
+        argument: The search term, criterion or query for the function.
+        workers (int): The number of processes, by default one per CPU this
+            process may use.
+        min_bytes (int): The size of the data from which processes are used.
+
+    Returns:
+        list: The matching tasks, in insertion order.
+    """
+    workers = workers or os.process_cpu_count() or 1
+    plan = get_backend(file_path).scan_chunks(workers) if workers > 1 else None
+    if plan is not None:
+        chunks, operations, size = plan
+        if len(chunks) > 1 and size >= min_bytes:
+            from concurrent.futures import BrokenExecutor
+            try:
+                found = _scan_in_parallel(file_path, chunks, operations, function, argument)
+                profiling.count_io(read=size)
+                return found
+            except (OSError, BrokenExecutor, ValueError):
+                # E.g. no process support, a worker that died, or a snapshot
+                # the chunking misread; the serial scan reports real corruption
+                pass
+    return list(function(iter_tasks(file_path), argument))
+
+@profiling.timed("file_handling.save_tasks", records=lambda _, tasks, file_path: len(tasks))
 def save_tasks(tasks, file_path):
     """
-    Saves a list of tasks to a JSON file.
+    Saves all tasks to a file with the backend matching its extension.
+
+    Args:
+        tasks (TaskStore | SQLiteTaskStore): The tasks to save.
+        file_path (str): The path to the tasks file.
+    """
+    get_backend(file_path).save(tasks)
+
+def convert_tasks(source_path, target_path):
+    """
+    Copies all tasks from one file into another, e.g. from JSON to binary.
+
+    The formats are picked by the extensions, and the next ID carries over,
+    so converting back and forth loses nothing. The archive is copied along,
+    since it is the same in every format.
+
+    Args:
+        source_path (str): The file to read.
+        target_path (str): The file to write, replacing its tasks.
+
+    Returns:
+        int: The number of tasks copied.
+    """
+    tasks = load_tasks(source_path)
+    save_tasks(tasks, target_path)
+    if os.path.exists(archive_path(source_path)):
+        shutil.copyfile(archive_path(source_path), archive_path(target_path))
+    return len(tasks)
+
+@profiling.timed("file_handling.append_operation", records=lambda *_: 1)
+def append_operation(operation, file_path):
+    """
+    Appends one operation record to the log of a snapshot file.
 
     Args:
-        tasks (list): The list of task dictionaries to save.
+        operation (dict): The operation record to journal.
         file_path (str): The path to the tasks JSON file.
+
+    Returns:
+        int: The size of the log in bytes after the append.
+    """
+    return _append(log_path(file_path), _encode_operation(operation))
+
+def record_operation(tasks, operation, file_path):
+    """
+    Persists a single change with the backend matching the file's extension.
+
+    Args:
+        tasks (TaskStore | SQLiteTaskStore): The current tasks, already containing the change.
+        operation (dict): The operation record describing the change.
+        file_path (str): The path to the tasks file.
+    """
+    record_operations(tasks, [operation], file_path)
+
+@profiling.timed("file_handling.record_operations", records=lambda _, tasks, operations, file_path: len(operations))
+def record_operations(tasks, operations, file_path):
+    """
+    Persists a batch of changes at once, e.g. after a bulk command.
+
+    Args:
+        tasks (TaskStore | SQLiteTaskStore): The current tasks, already containing the changes.
+        operations (list): The operation records describing the changes.
+        file_path (str): The path to the tasks file.
+    """
+    if operations:
+        get_backend(file_path).record(tasks, operations)
+
+def _members(data, path):
+    """
+    Splits the gzip data of an archive into its members, one per append.
+
+    Yields:
+        tuple: The decompressed contents of each complete member and the
+        offset at which it ends. A member cut short by a crash is not returned.
+
+    Raises:
+        ValueError: If the data is not gzip data.
     """
-    with open(file_path, 'w') as f:
-        json.dump(tasks, f, indent=4)
\ No newline at end of file
+    view = memoryview(data)
+    pos = 0
+    while pos < len(view):
+        decompressor = zlib.decompressobj(_GZIP_WBITS)
+        parts = []
+        try:
+            while not decompressor.eof and pos < len(view):
+                chunk = view[pos:pos + STREAM_CHUNK_SIZE]
+                pos += len(chunk)
+                parts.append(decompressor.decompress(chunk))
+        except zlib.error as e:
+            raise ValueError(f"The archive {path} is corrupted ({e}); repair it or move it aside") from None
+        if not decompressor.eof:
+            return
+        pos -= len(decompressor.unused_data)
+        yield b"".join(parts), pos
+
+class Archive:
+    """
+    The cold tier of a tasks file: completed tasks moved out of the working set.
+
+    The archive is a gzip file of JSON lines, one task per line, whatever the
+    format of the tasks file. It is append-only: every batch of archived tasks
+    is added as a gzip member of its own, which 'zcat' and the 'gzip' module
+    read as one stream. Nothing is read until a task is looked up, searched or
+    filtered in it; the tasks are then loaded into a TaskStore once and kept
+    while the file does not change.
+    """
+
+    def __init__(self, file_path):
+        """
+        Args:
+            file_path (str): The path to the tasks file the archive belongs to.
+        """
+        self.path = archive_path(file_path)
+        self._tasks = None  # loaded by the first query
+        self._loaded_size = None  # size of the file when it was loaded
+
+    def _read(self):
+        """Returns the contents of the archive file, or empty bytes if there is none."""
+        if not os.path.exists(self.path):
+            return b""
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        profiling.count_io(read=len(data))
+        return data
+
+    def load(self):
+        """
+        Returns the archived tasks, reading the file on first use or when it has changed.
+
+        A task archived twice, which a crash between archiving and journaling
+        can cause, is kept once with its latest copy.
+
+        Returns:
+            TaskStore: The archived tasks, indexed by ID.
+
+        Raises:
+            ValueError: If the archive is corrupted.
+        """
+        if not self._is_loaded():
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            self._tasks, self._loaded_size = TaskStore(self._iter()), size
+        return self._tasks
+
+    def _is_loaded(self):
+        """Tells whether the loaded tasks are those of the file as it is now."""
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return self._tasks is not None and size == self._loaded_size
+
+    def _iter(self):
+        """Yields every task in the archive file, in the order archived."""
+        for contents, _ in _members(self._read(), self.path):
+            for line in contents.splitlines():
+                yield json.loads(line)
+
+    def append(self, tasks):
+        """
+        Adds tasks to the archive as one gzip member and syncs it to disk.
+
+        A member left incomplete by a crash during an earlier append is cut
+        off first, so that the new one can be read.
+
+        Args:
+            tasks (list): The task dictionaries to archive.
+
+        Raises:
+            ValueError: If the archive is corrupted.
+        """
+        good_size = 0
+        if os.path.exists(self.path):
+            for _, good_size in _members(self._read(), self.path):
+                pass
+            if good_size != os.path.getsize(self.path):
+                with open(self.path, 'r+b') as f:
+                    f.truncate(good_size)
+        lines = b"".join((json.dumps(dict(task), separators=(",", ":")) + "\n").encode("utf-8") for task in tasks)
+        size = _append(self.path, zlib.compress(lines, wbits=_GZIP_WBITS))
+        if self._tasks is not None and self._loaded_size == good_size:
+            # Keep the loaded tasks rather than reading everything again
+            for task in tasks:
+                self._tasks.add(dict(task))
+            self._loaded_size = size
+
+    @property
+    def next_id(self):
+        """One past the highest archived ID, or 1 if nothing has been archived."""
+        if not os.path.exists(self.path):
+            return 1
+        return self.load().next_id
+
+    def get(self, task_id):
+        """Returns the archived task with the given ID, or None if there is none."""
+        if not os.path.exists(self.path):
+            return None
+        return self.load().get(task_id)
+
+    def search(self, search_term):
+        """
+        Returns the archived tasks whose title or description contains a term.
+
+        Unless the archive is loaded already, this scans the file: building
+        the text index would cost several times as much as a single search.
+        """
+        if not os.path.exists(self.path):
+            return []
+        if self._is_loaded():
+            return self._tasks.search(search_term)
+        search_term = search_term.lower()
+        found = {}
+        for task in self._iter():
+            if search_term in task.get("title", "").lower() or search_term in task.get("description", "").lower():
+                found[task["id"]] = task
+            else:
+                # The latest copy of a task archived twice is the one that counts
+                found.pop(task["id"], None)
+        return list(found.values())
+
+    def filter(self, *criteria):
+        """Returns the archived tasks matching every criterion, like 'TaskStore.filter'."""
+        if not os.path.exists(self.path):
+            return []
+        return self.load().filter(*criteria)
+
+def _completion_time(task):
+    """
+    Returns when a task was completed, or None if that was not recorded.
+
+    Raises:
+        ValueError: If the recorded time is not an ISO 8601 timestamp.
+    """
+    completed_at = task.get("completed_at")
+    if not completed_at:
+        return None
+    moment = datetime.fromisoformat(completed_at)
+    # Times without a zone, e.g. from an imported file, are taken as UTC
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+@profiling.timed("file_handling.archive_tasks", records=lambda operation, *_: len(operation["ids"]) if operation else 0)
+def archive_tasks(tasks, archive, days=ARCHIVE_AFTER_DAYS):
+    """
+    Moves the completed tasks older than a policy from a store to its archive.
+
+    Tasks completed before completion times were recorded have no known age
+    and are only moved when every completed task is to be archived. The
+    tasks are appended to the archive, and synced, before they are removed
+    from the store, so a crash in between leaves them in both tiers rather
+    than in neither; the copy in the store takes precedence.
+
+    Args:
+        tasks (TaskStore | SQLiteTaskStore): The loaded tasks, changed in place.
+        archive (Archive): The archive of the tasks file.
+        days (float): How many days after its completion a task is archived;
+            0 archives every completed task.
+
+    Returns:
+        dict: The operation record of the move, to be journaled like any
+            other change, or None if no task was old enough.
+
+    Raises:
+        ValueError: If the archive is corrupted.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    old = []
+    for task in tasks.filter("completed"):
+        try:
+            completed = _completion_time(task)
+        except (TypeError, ValueError):
+            # Keep a task with an unreadable time rather than guess its age
+            continue
+        if (completed is None and days <= 0) or (completed is not None and completed <= cutoff):
+            old.append(dict(task))
+    if not old:
+        return None
+
+    archive.append(old)
+    ids = [task["id"] for task in old]
+    tasks.remove_many(ids)
+    return {"op": "archive", "ids": ids}
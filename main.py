@@ -1,26 +1,48 @@
 # main.py
 
-from rich.console import Console
-from rich.panel import Panel
-from rich.prompt import Prompt
-from file_handling import load_tasks, save_tasks
-from task import add_task, list_tasks, toggle_task_status, update_task, delete_task, find_task, search_tasks, filter_tasks
+import contextlib
+import os
+import signal
+import sys
+import threading
+import profiling
+from cli import run
+from file_handling import Archive, archive_tasks, get_backend, load_tasks
+from output import LazyConsole, escape
+from task import add_task, browse_tasks, toggle_task_status, update_task, delete_task, compact_task_ids, find_task, search_tasks, fuzzy_search_tasks, filter_tasks, query_tasks
+from task_store import OrderedTasks
 
 """
 This is the main entry point for the To-Do CLI application.
 It orchestrates the application flow, handling the main menu loop
-and calling functions from the 'task' and 'handling' modules.
+and calling functions from the 'task' and 'handling' modules. Changes are
+written by a 'background_writer.BackgroundWriter', so the menu comes back
+without waiting for the disk. At start-up, completed tasks older than the
+archive policy are moved to the archive, where Find and Search still look
+when a task is not among the others.
+When started with arguments, it runs a single command from the 'cli'
+module instead of the menu.
 """
 
-# Define the file path for the tasks JSON file
-FILE_PATH = "tasks.json"
+# Define the file path for the tasks file; a .db extension selects the SQLite backend
+FILE_PATH = os.environ.get("TODO_FILE", "tasks.json")
 
-# Initialize Rich Console
-console = Console()
+# Names of the menu actions by option, used to label them when profiling
+MENU_ACTIONS = {
+    "1": "add_task", "2": "list_tasks", "3": "toggle_task_status", "4": "find_task", "5": "search_tasks",
+    "6": "filter_tasks", "7": "update_task", "8": "delete_task", "9": "compact_task_ids", "10": "exit"
+}
+
+# Menu options that change the tasks, and so must not overlap with a background write
+MODIFYING_ACTIONS = {"1", "3", "7", "8", "9"}
+
+# Initialize Rich Console; rich is imported on first use, so commands don't pay for it
+console = LazyConsole()
 
 def print_menu():
 
     """Prints the main menu of the application."""
+    from rich.panel import Panel
 
     console.print(Panel(
 
@@ -44,7 +66,8 @@ def print_menu():
             "[bold green]6.[/bold green] Filter Tasks.\n"
             "[bold green]7.[/bold green] Update Task.\n"
             "[bold green]8.[/bold green] Delete Task.\n"
-            "[bold red]9.[/bold red] Exit.",
+            "[bold green]9.[/bold green] Compact Task IDs.\n"
+            "[bold red]10.[/bold red] Exit.",
 
             title="[bold green]Menu[/bold green]",
 
@@ -56,44 +79,74 @@ def print_menu():
 
     )
 
-def find_task_by_id(tasks):
+def find_task_by_id(tasks, archive=None):
     """
     Prompts the user for a task ID and displays the task details.
+
+    A task that is not among the tasks is looked up in the archive.
     """
+    from rich.panel import Panel
+    from rich.prompt import Prompt
     console.print("[bold cyan]Find Task by ID[/bold cyan]")
     task_id = Prompt.ask("Enter the task ID to find")
     try:
         task_id = int(task_id)
-        task = find_task(tasks, task_id)
+    except ValueError:
+        task_id = None
+        console.print("[bold red]Invalid input. Please enter a valid integer ID.[/bold red]")
+    if task_id is not None:
+        try:
+            task = find_task(tasks, task_id, archive)
+        except (OSError, ValueError) as e:
+            task = None
+            console.print(f"[bold red]Error: {escape(str(e))}[/bold red]")
         if task:
+            archived = " (archived)" if task_id not in tasks else ""
             console.print(Panel(
                 f"[bold]Title:[/bold] {task['title']}\n"
                 f"[bold]Description:[/bold] {task['description']}\n"
                 f"[bold]Priority:[/bold] {task['priority']}\n"
                 f"[bold]Status:[/bold] {task['status']}",
-                title=f"[bold]Task Details for ID: {task_id}[/bold]",
+                title=f"[bold]Task Details for ID: {task_id}{archived}[/bold]",
                 expand=False,
                 border_style="cyan"
             ))
         else:
             console.print(f"[bold red]Task with ID '{task_id}' not found.[/bold red]")
-    except ValueError:
-        console.print("[bold red]Invalid input. Please enter a valid integer ID.[/bold red]")
     
     console.print("[bold yellow]Press Enter to return to menu...[/bold yellow]")
     input()
 
-def search_tasks_by_term(tasks):
+def search_tasks_by_term(tasks, archive=None):
     """
     Prompts the user for a search term and displays matching tasks.
+
+    When no task contains the term, the archived tasks that do are shown,
+    and failing those the closest matches, best first, so a typo still finds
+    something.
     """
+    from rich.prompt import Prompt
     console.print("[bold cyan]Search Tasks[/bold cyan]")
     search_term = Prompt.ask("Enter task title")
     found_tasks = search_tasks(tasks, search_term)
     if found_tasks:
-        list_tasks(found_tasks)
-    else:
-        console.print(f"[bold red]No tasks found with the search term '{search_term}'.[/bold red]")
+        browse_tasks(found_tasks)
+        return
+    if archive is not None:
+        try:
+            found_tasks = search_tasks(tasks, search_term, archive)
+        except (OSError, ValueError) as e:
+            console.print(f"[bold red]Error: {escape(str(e))}[/bold red]")
+        if found_tasks:
+            console.print(f"[bold yellow]Only archived tasks contain '{escape(search_term)}':[/bold yellow]")
+            browse_tasks(found_tasks)
+            return
+    closest = fuzzy_search_tasks(tasks, search_term)
+    if closest:
+        console.print(f"[bold yellow]No tasks contain '{escape(search_term)}'. Closest matches:[/bold yellow]")
+        browse_tasks(OrderedTasks(closest))
+        return
+    console.print(f"[bold red]No tasks found with the search term '{escape(search_term)}'.[/bold red]")
     
     console.print("[bold yellow]Press Enter to return to menu...[/bold yellow]")
     input()
@@ -101,14 +154,29 @@ def search_tasks_by_term(tasks):
 def filter_tasks_by_criterion(tasks):
     """
     Prompts the user for a filter criterion and displays matching tasks.
+
+    A criterion with 'field:value' terms is a query (see the 'query' module),
+    whose results are shown in the query's order.
     """
+    from rich.prompt import Prompt
     console.print("[bold cyan]Filter Tasks[/bold cyan]")
-    filter_criterion = Prompt.ask("Enter the filter criterion (e.g., pending, completed, high, medium, low)")
-    found_tasks = filter_tasks(tasks, filter_criterion)
-    if found_tasks:
-        list_tasks(found_tasks)
+    filter_criterion = Prompt.ask(
+        "Enter the filter criterion (e.g., pending, completed, high, medium, low, or several like 'pending high'),\n"
+        "or a query like 'status:pending text:gym sort:priority limit:20'"
+    )
+    if ":" in filter_criterion:
+        try:
+            found_tasks = OrderedTasks(query_tasks(tasks, filter_criterion))
+        except ValueError as e:
+            found_tasks = None
+            console.print(f"[bold red]Error: {escape(str(e))}[/bold red]")
     else:
-        console.print(f"[bold red]No tasks found with the filter criterion '{filter_criterion}'.[/bold red]")
+        found_tasks = filter_tasks(tasks, filter_criterion)
+    if found_tasks:
+        browse_tasks(found_tasks)
+        return
+    if found_tasks is not None:
+        console.print(f"[bold red]No tasks found with the filter criterion '{escape(filter_criterion)}'.[/bold red]")
     
     console.print("[bold yellow]Press Enter to return to menu...[/bold yellow]")
     input()
@@ -117,55 +185,127 @@ def main():
     """
     The main function that runs the application loop.
     """
+    import daemon
+    from background_writer import BackgroundWriter
+
+    if daemon.is_running(FILE_PATH):
+        # The daemon's copy of the tasks would not see the menu's changes, nor the menu the daemon's
+        console.print(f"[bold red]A daemon is serving {FILE_PATH}. Use commands, or stop it with 'main.py serve --stop'.[/bold red]")
+        return
+
     # Load tasks from the file at the start of the application
-    tasks = load_tasks(FILE_PATH)
+    try:
+        tasks = load_tasks(FILE_PATH)
+    except (OSError, ValueError) as e:
+        console.print(f"[bold red]Error: {escape(str(e))}[/bold red]")
+        return
+    writer = BackgroundWriter(tasks, FILE_PATH)
+    archive = Archive(FILE_PATH)
+    # Stop on 'kill' as on Ctrl+C, so that pending changes are written either way
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
 
+    try:
+        # Keep the working set to the tasks still being worked on
+        operation = archive_tasks(tasks, archive)
+        if operation:
+            writer.record([operation])
+            console.print(f"[dim]Moved {len(operation['ids'])} completed task(s) to {escape(archive.path)}.[/dim]")
+    except (OSError, ValueError) as e:
+        console.print(f"[bold red]Error: Could not archive old completed tasks: {escape(str(e))}[/bold red]")
+
+    build_indexes_in_background(tasks, writer)
+    try:
+        menu_loop(tasks, writer, archive)
+    except KeyboardInterrupt:
+        console.print("\n[bold blue]Goodbye! 👋[/bold blue]")
+    finally:
+        try:
+            writer.close()
+        except Exception as e:
+            console.print(f"[bold red]Error: Could not save the latest changes: {escape(str(e))}[/bold red]")
+
+def build_indexes_in_background(tasks, writer):
+    """
+    Builds the search indexes of a store loaded into memory on another thread.
+
+    Otherwise the first search, or the closest matches after a typo, would
+    build them and stall the menu for seconds on a large store. The writer's
+    lock is held meanwhile, so the tasks do not change under the build; only
+    a change made right after startup waits for it. Stores that read their
+    tasks on demand, or whose connection belongs to this thread, are left
+    alone.
+    """
+    backend = get_backend(FILE_PATH)
+    if backend.loads_on_demand or not backend.background_writes:
+        return
+
+    def build():
+        with writer.lock:
+            tasks.build_indexes()
+
+    threading.Thread(target=build, name="build-indexes", daemon=True).start()
+
+def menu_loop(tasks, writer, archive=None):
+    """
+    Shows the menu and runs the chosen actions until the user exits.
+
+    Args:
+        tasks (TaskStore | SQLiteTaskStore): The loaded tasks.
+        writer (BackgroundWriter): Writes the changes in the background.
+        archive (Archive): The archive of old completed tasks, or None.
+    """
+    from rich.prompt import Prompt
     while True:
-        tasks_modified = False # Flag to track if tasks were modified in the current iteration
+        operation = None # Record of the change made in the current iteration, if any
         print_menu()
-        choice = Prompt.ask("Choose an option", choices=["1", "2", "3", "4", "5", "6", "7", "8", "9"], default="2")
-
-        if choice == '1':
-            add_task(tasks)
-            tasks_modified = True
-            list_tasks(tasks)
-            console.print("[bold yellow]Press Enter to return to menu...[/bold yellow]")
-            input()
-        elif choice == '2':
-            list_tasks(tasks)
-            console.print("[bold yellow]Press Enter to return to menu...[/bold yellow]")
-            input()
-        elif choice == '3':
-            toggle_task_status(tasks)
-            tasks_modified = True
-            list_tasks(tasks)
-            console.print("[bold yellow]Press Enter to return to menu...[/bold yellow]")
-            input()
-        elif choice == '4':
-            find_task_by_id(tasks)
-        elif choice == '5':
-            search_tasks_by_term(tasks)
-        elif choice == '6':
-            filter_tasks_by_criterion(tasks)
-        elif choice == '7':
-            update_task(tasks)
-            tasks_modified = True
-            list_tasks(tasks)
-            console.print("[bold yellow]Press Enter to return to menu...[/bold yellow]")
-            input()
-        elif choice == '8':
-            delete_task(tasks)
-            tasks_modified = True
-            list_tasks(tasks)
-            console.print("[bold yellow]Press Enter to return to menu...[/bold yellow]")
-            input()
-        elif choice == '9':
-            console.print("[bold blue]Goodbye! 👋[/bold blue]")
-            break
+        choice = Prompt.ask("Choose an option", choices=["1", "2", "3", "4", "5", "6", "7", "8", "9", "10"], default="2")
+
+        # Time the action while profiling; this includes the time spent at its prompts
+        lock = writer.lock if choice in MODIFYING_ACTIONS else contextlib.nullcontext()
+        with profiling.span(f"menu.{MENU_ACTIONS[choice]}"), lock:
+            if choice == '1':
+                operation = add_task(tasks)
+                console.print("[bold yellow]Press Enter to return to menu...[/bold yellow]")
+                input()
+            elif choice == '2':
+                browse_tasks(tasks)
+            elif choice == '3':
+                operation = toggle_task_status(tasks)
+                console.print("[bold yellow]Press Enter to return to menu...[/bold yellow]")
+                input()
+            elif choice == '4':
+                find_task_by_id(tasks, archive)
+            elif choice == '5':
+                search_tasks_by_term(tasks, archive)
+            elif choice == '6':
+                filter_tasks_by_criterion(tasks)
+            elif choice == '7':
+                operation = update_task(tasks)
+                console.print("[bold yellow]Press Enter to return to menu...[/bold yellow]")
+                input()
+            elif choice == '8':
+                operation = delete_task(tasks)
+                console.print("[bold yellow]Press Enter to return to menu...[/bold yellow]")
+                input()
+            elif choice == '9':
+                operation = compact_task_ids(tasks, archive)
+                console.print("[bold yellow]Press Enter to return to menu...[/bold yellow]")
+                input()
+            elif choice == '10':
+                console.print("[bold blue]Goodbye! 👋[/bold blue]")
+                break
         
-        # Save tasks if any modifications were made
-        if tasks_modified:
-            save_tasks(tasks, FILE_PATH)
-            
+        # Journal the change in the background if any modifications were made
+        if operation:
+            try:
+                writer.record([operation])
+            except Exception as e:
+                # Any error of a failed background write is reported here, not only I/O errors
+                console.print(f"[bold red]Error: Could not save changes, will retry: {escape(str(e))}[/bold red]")
+
 if __name__ == "__main__":
+    # --profile and --profile-stats FILE work for the menu and for commands alike
+    argv = profiling.configure(sys.argv[1:])
+    if argv:
+        sys.exit(run(argv, FILE_PATH))
     main()
\ No newline at end of file
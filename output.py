@@ -0,0 +1,80 @@
+# output.py
+
+import contextlib
+import json
+import sys
+
+"""
+This module contains the output helpers that do not depend on 'rich'.
+Importing rich is a large share of the start-up time of a command, so the
+console is only created on first use, and the machine-readable output formats
+used by the command mode never import rich at all.
+"""
+
+# Fields written by the plain output formats, in column order
+FIELDS = ("id", "status", "priority", "title", "description")
+
+class LazyConsole:
+    """
+    Stands in for a ``rich.console.Console`` and creates it on first use.
+
+    Any attribute access, such as ``console.print``, imports rich and is
+    forwarded to the real console from then on.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Args:
+            **kwargs: Passed on to the Console when it is created.
+        """
+        self._kwargs = kwargs
+        self._console = None
+
+    @contextlib.contextmanager
+    def redirect(self, console):
+        """
+        Sends everything printed to another console while the block runs.
+
+        Args:
+            console (rich.console.Console): The console to print to instead.
+        """
+        previous = self._console
+        self._console = console
+        try:
+            yield console
+        finally:
+            self._console = previous
+
+    def __getattr__(self, name):
+        if self._console is None:
+            from rich.console import Console
+            self._console = Console(**self._kwargs)
+        return getattr(self._console, name)
+
+def escape(text):
+    """Escapes rich markup in a piece of text, importing rich only when needed."""
+    from rich.markup import escape as rich_escape
+    return rich_escape(text)
+
+def _tsv_field(value):
+    """Formats a value for one TSV cell, keeping tabs and newlines out of it."""
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+def write_tasks(tasks, output_format, stream=None):
+    """
+    Writes tasks in a machine-readable format.
+
+    Args:
+        tasks (iterable): The tasks to write.
+        output_format (str): 'tsv' for a header line and one tab-separated line
+            per task, or 'json' for one JSON object per line.
+        stream (file): Where to write; standard output by default.
+    """
+    stream = stream or sys.stdout
+    if output_format == "json":
+        for task in tasks:
+            stream.write(json.dumps(dict(task), ensure_ascii=False) + "\n")
+    else:
+        stream.write("\t".join(FIELDS) + "\n")
+        for task in tasks:
+            stream.write("\t".join(_tsv_field(task.get(field, "")) for field in FIELDS) + "\n")
@@ -0,0 +1,300 @@
+# profiling.py
+
+import atexit
+import bisect
+import functools
+import os
+import sys
+import threading
+import time
+
+"""
+This module contains the opt-in profiling of the To-Do CLI.
+Menu actions, commands, storage calls and the expensive task queries are
+wrapped with 'timed' or 'span'. While profiling is off these wrappers only
+check one global and call through, so they cost next to nothing; once a
+session is started they record, per operation, the number of calls, their
+latency and a latency histogram, the number of tasks involved, and the bytes
+the storage layer reports through 'count_io'. The summary is printed to
+standard error when the program exits, and the session can also be recorded
+with cProfile and written as a pstats file.
+
+Profiling is switched on with '--profile' (summary only) or
+'--profile-stats FILE' (summary and pstats file) before any command, or with
+the TODO_PROFILE=1 and TODO_PROFILE_STATS=FILE environment variables.
+"""
+
+# Upper bounds of the latency histogram buckets, in seconds; the last bucket is open
+HISTOGRAM_BOUNDS = (0.0001, 0.001, 0.01, 0.1, 1.0)
+_HISTOGRAM_LABELS = ("<0.1ms", "<1ms", "<10ms", "<100ms", "<1s", ">=1s")
+
+# inspect.CO_GENERATOR; importing inspect would cost more start-up time than the rest of this module
+_CO_GENERATOR = 0x20
+
+class Stats:
+    """The measurements of one operation over a session."""
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.records = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+    def add(self, elapsed):
+        self.calls += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.histogram[bisect.bisect_left(HISTOGRAM_BOUNDS, elapsed)] += 1
+
+class _Span:
+    """Times one call of an operation, as a context manager."""
+
+    __slots__ = ("session", "stats", "start")
+
+    def __init__(self, session, name):
+        self.session = session
+        self.stats = session.stats(name)
+
+    def __enter__(self):
+        self.session.active.append(self.stats)
+        self.start = time.perf_counter()
+        return self.stats
+
+    def __exit__(self, *exc_info):
+        self.stats.add(time.perf_counter() - self.start)
+        active = self.session.active
+        # A generator abandoned early may close after spans opened later
+        if active[-1] is self.stats:
+            active.pop()
+        else:
+            active.remove(self.stats)
+        return False
+
+class Session:
+    """
+    Collects the measurements of one profiled run.
+    """
+
+    def __init__(self, stats_path=None):
+        """
+        Args:
+            stats_path (str): Where to write a cProfile pstats file when the
+                session ends, or None to skip cProfile.
+        """
+        self.operations = {}
+        self._local = threading.local()
+        self.stats_path = stats_path
+        self.profiler = None
+        self.started = time.perf_counter()
+        if stats_path:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stats(self, name):
+        """Returns the stats of an operation, creating them on first use."""
+        stats = self.operations.get(name)
+        if stats is None:
+            stats = self.operations[name] = Stats()
+        return stats
+
+    @property
+    def active(self):
+        """The stats of the spans open in the calling thread, outermost first."""
+        try:
+            return self._local.active
+        except AttributeError:
+            self._local.active = []
+            return self._local.active
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def stop(self):
+        """Stops cProfile and writes its pstats file, if it was requested."""
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.stats_path)
+            self.profiler = None
+
+    def summary(self):
+        """Returns the measurements as a plain-text table."""
+        title = f"Profile of {time.perf_counter() - self.started:.3f}s session"
+        if any(name.startswith("menu.") for name in self.operations):
+            title += " (menu actions include the time spent at prompts)"
+        lines = [
+            title,
+            f"{'operation':<32} {'calls':>6} {'total ms':>10} {'mean ms':>9} {'max ms':>9} "
+            f"{'records':>8} {'read':>9} {'written':>9}  " + " ".join(f"{label:>6}" for label in _HISTOGRAM_LABELS)
+        ]
+        for name, stats in sorted(self.operations.items(), key=lambda item: -item[1].total):
+            lines.append(
+                f"{name:<32} {stats.calls:>6} {stats.total * 1000:>10.2f} {stats.total * 1000 / stats.calls:>9.2f} "
+                f"{stats.max * 1000:>9.2f} {stats.records:>8} {_size(stats.bytes_read):>9} {_size(stats.bytes_written):>9}  "
+                + " ".join(f"{count:>6}" for count in stats.histogram)
+            )
+        if self.stats_path:
+            lines.append(f"cProfile statistics written to {self.stats_path} (read them with 'python -m pstats')")
+        return "\n".join(lines)
+
+def _size(count):
+    """Formats a byte count for the summary."""
+    for unit in ("B", "KB", "MB"):
+        if count < 1024:
+            return f"{count:.0f}{unit}" if unit == "B" else f"{count:.1f}{unit}"
+        count /= 1024
+    return f"{count:.1f}GB"
+
+# The running session, or None while profiling is off
+_session = None
+
+def is_enabled():
+    """Tells whether a profiling session is running."""
+    return _session is not None
+
+def start(stats_path=None):
+    """
+    Starts a profiling session whose summary is printed when the program exits.
+
+    Starting a session while one is running does nothing.
+
+    Args:
+        stats_path (str): Where to write a cProfile pstats file, or None.
+    """
+    global _session
+    if _session is None:
+        _session = Session(stats_path)
+        atexit.register(finish)
+
+def finish():
+    """Ends the running session, writes its pstats file and prints the summary."""
+    global _session
+    session, _session = _session, None
+    if session is not None:
+        session.stop()
+        print(session.summary(), file=sys.stderr)
+
+def configure(argv, environ=os.environ):
+    """
+    Starts profiling if the command line or the environment asks for it.
+
+    Args:
+        argv (list): The command-line arguments, without the program name.
+        environ (dict): The environment to read TODO_PROFILE and TODO_PROFILE_STATS from.
+
+    Returns:
+        list: The arguments with the leading profiling options removed.
+    """
+    enabled = environ.get("TODO_PROFILE", "") not in ("", "0")
+    stats_path = environ.get("TODO_PROFILE_STATS") or None
+    argv = list(argv)
+    while argv:
+        if argv[0] == "--profile":
+            enabled = True
+            argv.pop(0)
+        elif argv[0] == "--profile-stats" and len(argv) > 1:
+            stats_path = argv[1]
+            del argv[:2]
+        elif argv[0].startswith("--profile-stats="):
+            stats_path = argv.pop(0).partition("=")[2]
+        else:
+            break
+    if enabled or stats_path:
+        start(stats_path)
+    return argv
+
+class _NullSpan:
+    """Stands in for a span while profiling is off."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+def span(name):
+    """
+    Returns a context manager that times a block as one call of an operation.
+
+    Args:
+        name (str): The name of the operation, e.g. 'menu.add_task'.
+    """
+    if _session is None:
+        return _NULL_SPAN
+    return _session.span(name)
+
+def count(name, records=0):
+    """
+    Counts one call of an operation too quick to be worth timing, e.g. a cache hit.
+
+    Args:
+        name (str): The name of the operation in the summary.
+        records (int): The number of tasks the call involved.
+    """
+    if _session is not None:
+        stats = _session.stats(name)
+        stats.add(0.0)
+        stats.records += records
+
+def count_io(read=0, written=0):
+    """
+    Adds bytes read or written to every operation being timed in the calling thread.
+
+    Called by the storage layer where it reads and writes files.
+
+    Args:
+        read (int): The number of bytes read.
+        written (int): The number of bytes written.
+    """
+    if _session is not None:
+        for stats in _session.active:
+            stats.bytes_read += read
+            stats.bytes_written += written
+
+def timed(name, records=None):
+    """
+    Decorates a function so each call is timed while profiling is on.
+
+    Generator functions are timed from the first to the last item, and count
+    the items they yield as records.
+
+    Args:
+        name (str): The name of the operation in the summary.
+        records (callable): Called with the result and the arguments of a
+            call to count the tasks it involved, e.g. ``lambda tasks, path: len(tasks)``.
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorate(function):
+        if function.__code__.co_flags & _CO_GENERATOR:
+            @functools.wraps(function)
+            def generator_wrapper(*args, **kwargs):
+                if _session is None:
+                    return function(*args, **kwargs)
+                return _timed_items(_session, name, function(*args, **kwargs))
+            return generator_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _session is None:
+                return function(*args, **kwargs)
+            with _session.span(name) as stats:
+                result = function(*args, **kwargs)
+                if records is not None:
+                    stats.records += records(result, *args, **kwargs)
+                return result
+        return wrapper
+    return decorate
+
+def _timed_items(session, name, items):
+    """Yields the items of a generator, timing it as one call that involved every item."""
+    with session.span(name) as stats:
+        for item in items:
+            stats.records += 1
+            yield item
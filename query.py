@@ -0,0 +1,235 @@
+# query.py
+
+import heapq
+import shlex
+from itertools import islice
+
+"""
+This module contains the query language that combines searching and filtering.
+A query is a list of space-separated terms that must all hold:
+
+    status:pending            the status is one of the comma-separated values
+    priority:high,medium      the priority is one of the comma-separated values
+    text:gym                  the title or description contains the text; a
+                              word without a field means the same, and
+                              text:"buy milk" matches a phrase
+    id:100..200               the ID is in an inclusive range; either end may
+                              be left out (id:100..), and id:7 matches one ID
+    sort:priority             orders by id, title, status or priority (high
+                              first, pending first); sort:-priority reverses
+    limit:50                  stops after that many tasks
+
+For example 'status:pending priority:high text:gym sort:priority limit:50'.
+Without sort: the tasks come in insertion order, like searches and filters.
+
+'parse_query' turns the text into a 'Query' once. Stores run it with their
+own 'query' method, which picks the cheapest way to find the candidates;
+'Query.apply' runs it on any stream of task dictionaries. Either way matching
+tasks are produced lazily, so a limit stops the work as soon as it is reached.
+"""
+
+# Values of the fields with a fixed set of values, in the order sort: puts them
+STATUS_ORDER = ("pending", "completed")
+PRIORITY_ORDER = ("high", "medium", "low")
+
+# Fields that sort: accepts
+SORT_FIELDS = ("id", "title", "status", "priority")
+
+def _rank(order):
+    """Returns a sort key ranking the values of a field by their position in order."""
+    ranks = {value: i for i, value in enumerate(order)}
+    return lambda value: ranks.get(value.lower(), len(order))
+
+_SORT_KEYS = {
+    "id": lambda task: task["id"],
+    "title": lambda task, key=str.casefold: key(task["title"]),
+    "status": lambda task, rank=_rank(STATUS_ORDER): rank(task["status"]),
+    "priority": lambda task, rank=_rank(PRIORITY_ORDER): rank(task["priority"]),
+}
+
+class Query:
+    """
+    A parsed query: the conditions a task must meet, the order and the limit.
+
+    Attributes:
+        statuses (set): The allowed lowercased statuses, or None for any.
+        priorities (set): The allowed lowercased priorities, or None for any.
+        terms (list): Lowercased texts that must all occur in the title or description.
+        id_range (tuple): The lowest and highest ID allowed, either of which
+            may be None, or None for any ID.
+        sort (str): The field to order by, or None for insertion order.
+        descending (bool): Whether the order is reversed.
+        limit (int): The most tasks to return, or None for all.
+    """
+
+    def __init__(self):
+        self.statuses = None
+        self.priorities = None
+        self.terms = []
+        self.id_range = None
+        self.sort = None
+        self.descending = False
+        self.limit = None
+
+    def key(self):
+        """
+        Returns a hashable form of the query, e.g. to cache its results under.
+
+        Queries that differ only in the order or repetition of their values
+        and text terms select the same tasks, and have the same key.
+        """
+        return (
+            None if self.statuses is None else frozenset(self.statuses),
+            None if self.priorities is None else frozenset(self.priorities),
+            tuple(sorted(set(self.terms))),
+            self.id_range,
+            self.sort,
+            self.descending,
+            self.limit
+        )
+
+    def in_id_range(self, task_id):
+        """Tells whether an ID lies in the query's ID range."""
+        if self.id_range is None:
+            return True
+        low, high = self.id_range
+        return (low is None or task_id >= low) and (high is None or task_id <= high)
+
+    def matches(self, task):
+        """
+        Tells whether a task meets every condition of the query.
+
+        Args:
+            task (dict): The task.
+        """
+        if self.statuses is not None and task.get("status", "").lower() not in self.statuses:
+            return False
+        if self.priorities is not None and task.get("priority", "").lower() not in self.priorities:
+            return False
+        if not self.in_id_range(task["id"]):
+            return False
+        if self.terms:
+            title, description = task.get("title", "").lower(), task.get("description", "").lower()
+            return all(term in title or term in description for term in self.terms)
+        return True
+
+    def order(self, tasks, presorted=False):
+        """
+        Puts matching tasks in the query's order and cuts them off at its limit.
+
+        Unsorted results are passed through lazily. Sorting has to see every
+        match, but with a limit only that many are kept, in a heap.
+
+        Args:
+            tasks (iterable): The matching tasks, in insertion order.
+            presorted (bool): Whether the tasks already come in the query's order.
+
+        Returns:
+            iterator: The tasks to return.
+        """
+        if self.sort is None or presorted:
+            return islice(tasks, self.limit)
+        key = _SORT_KEYS[self.sort]
+        if self.limit is None:
+            return iter(sorted(tasks, key=key, reverse=self.descending))
+        # Like sorted(...)[:limit], ties keep their insertion order
+        select = heapq.nlargest if self.descending else heapq.nsmallest
+        return iter(select(self.limit, tasks, key=key))
+
+    def apply(self, tasks):
+        """
+        Runs the query on a stream of tasks, checking every one.
+
+        Args:
+            tasks (iterable): The tasks, e.g. from file_handling.iter_tasks.
+
+        Returns:
+            iterator: The matching tasks in the query's order, up to its limit.
+        """
+        return self.order(task for task in tasks if self.matches(task))
+
+def _values(field, value, allowed):
+    """Parses the comma-separated values of a status: or priority: term."""
+    values = {part.strip().lower() for part in value.split(",") if part.strip()}
+    unknown = sorted(values - set(allowed))
+    if unknown or not values:
+        raise ValueError(f"Invalid {field} '{unknown[0] if unknown else value}' in query. Please choose from {', '.join(allowed)}.")
+    return values
+
+def _id(text, term):
+    """Parses one end of an id: range."""
+    try:
+        return int(text) if text.strip() else None
+    except ValueError:
+        raise ValueError(f"Invalid ID range '{term}' in query. Use e.g. id:7, id:100..200 or id:100..") from None
+
+def parse_terms(terms):
+    """
+    Parses the terms of a query, e.g. the words of a command line.
+
+    Args:
+        terms (list): The terms, such as ['status:pending', 'text:buy milk'].
+
+    Returns:
+        Query: The parsed query.
+
+    Raises:
+        ValueError: If a term is not valid.
+    """
+    query = Query()
+    for term in terms:
+        field, colon, value = term.partition(":")
+        field = field.lower()
+        if not colon or field == "text":
+            text = (value if colon else term).lower()
+            if text:
+                query.terms.append(text)
+        elif field == "status":
+            values = _values("status", value, STATUS_ORDER)
+            query.statuses = values if query.statuses is None else query.statuses & values
+        elif field == "priority":
+            values = _values("priority", value, PRIORITY_ORDER)
+            query.priorities = values if query.priorities is None else query.priorities & values
+        elif field == "id":
+            low_text, dots, high_text = value.partition("..")
+            low = _id(low_text, term)
+            high = _id(high_text, term) if dots else low
+            if low is None and high is None:
+                raise ValueError(f"Invalid ID range '{term}' in query. Use e.g. id:7, id:100..200 or id:100..")
+            if query.id_range is not None:
+                # Several ranges must all hold, so only their overlap remains
+                old_low, old_high = query.id_range
+                low = old_low if low is None else low if old_low is None else max(low, old_low)
+                high = old_high if high is None else high if old_high is None else min(high, old_high)
+            query.id_range = (low, high)
+        elif field == "sort":
+            name = value.lower()
+            query.descending = name.startswith("-")
+            query.sort = name.lstrip("-")
+            if query.sort not in SORT_FIELDS:
+                raise ValueError(f"Invalid sort field '{value}' in query. Please choose from {', '.join(SORT_FIELDS)}.")
+        elif field == "limit":
+            try:
+                query.limit = int(value)
+            except ValueError:
+                query.limit = -1
+            if query.limit < 0:
+                raise ValueError(f"Invalid limit '{value}' in query. Use a whole number, e.g. limit:50.")
+        else:
+            raise ValueError(f"Unknown query field '{field}'. Please choose from status, priority, text, id, sort or limit.")
+    return query
+
+def parse_query(text):
+    """
+    Parses a query written as one line, such as 'status:pending text:"buy milk" limit:10'.
+
+    Args:
+        text (str): The query; values with spaces are quoted like in a shell.
+
+    Returns:
+        Query: The parsed query.
+
+    Raises:
+        ValueError: If the query is not valid.
+    """
+    return parse_terms(shlex.split(text))
@@ -0,0 +1,198 @@
+# query_cache.py
+
+from collections import OrderedDict
+from itertools import count
+
+"""
+This module contains the cache of query results used by 'task.search_tasks',
+'filter_tasks', 'query_tasks' and 'fuzzy_search_tasks'. The interactive menu
+and the daemon run the same searches and filters again and again against a
+store that has not changed in between; the cache answers those from memory.
+
+Every store carries a 'version' that takes a new value from 'next_version'
+whenever its tasks change, and a cached result is only returned for the
+version it was computed at. The counter is shared by all stores, so a version
+never repeats, not even after a store is rebuilt or re-numbered, and a result
+can never be returned for tasks other than those it was computed from.
+
+A result whose order is the insertion order of the store and that has no
+limit can also be patched when a single task is added, changed or deleted,
+so that the change does not throw it away: the one task is checked against
+the query, and the result moves on to the new version.
+
+The cache is a least-recently-used one, bounded both by the number of results
+and by the number of tasks they hold together, and counts its hits, misses,
+evictions and patches.
+"""
+
+# Hands out store versions, shared by every store so that a version never repeats
+next_version = count(1).__next__
+
+# The most results the cache holds
+MAX_ENTRIES = 64
+
+# The most tasks the cached results hold together; larger results are not cached
+MAX_TASKS = 200_000
+
+class _Entry:
+    """
+    A cached result together with the store version it belongs to.
+
+    The tasks are kept as a list until the result is first patched, and from
+    then on by ID in the same order, so that further patches take constant time.
+    """
+
+    __slots__ = ("version", "tasks", "matches")
+
+    def __init__(self, version, tasks, matches):
+        self.version = version
+        self.tasks = tasks
+        self.matches = matches
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def result(self):
+        """Returns a copy of the tasks as a list."""
+        return list(self.tasks.values() if isinstance(self.tasks, dict) else self.tasks)
+
+class QueryCache:
+    """
+    A bounded least-recently-used cache of query results by store version.
+
+    Attributes:
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that had to run the query.
+        evictions (int): Results dropped to stay within the bounds.
+        patches (int): Results carried over to a new version by 'patch'.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_tasks=MAX_TASKS):
+        """
+        Args:
+            max_entries (int): The most results to hold.
+            max_tasks (int): The most tasks the results may hold together.
+        """
+        self.max_entries = max_entries
+        self.max_tasks = max_tasks
+        self._entries = OrderedDict()  # key -> _Entry, least recently used first
+        self._size = 0  # tasks held by all entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.patches = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version):
+        """
+        Returns a cached result, or None if there is none for this version.
+
+        Args:
+            key (tuple): The normalized query.
+            version (int): The version of the store being queried.
+
+        Returns:
+            list: A copy of the cached tasks, so the caller may change it.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.result()
+
+    def put(self, key, version, tasks, matches=None):
+        """
+        Caches the result of a query, evicting the least recently used ones as needed.
+
+        Args:
+            key (tuple): The normalized query.
+            version (int): The version of the store the result was computed at.
+            tasks (list): The result; a copy is kept.
+            matches (callable): Tells whether a single task belongs in the
+                result, or None if the result cannot be patched, i.e. if it
+                is not in insertion order or has a limit.
+        """
+        self._discard(key)
+        if len(tasks) > self.max_tasks:
+            return
+        self._entries[key] = _Entry(version, list(tasks), matches)
+        self._size += len(tasks)
+        self._evict()
+
+    def patch(self, version, new_version, task_id, task, appended=False):
+        """
+        Carries the results of a version over a change to a single task.
+
+        Results that can be patched are brought up to date and move on to the
+        new version. The others, and patchable ones the change cannot be
+        applied to, are dropped, since their version is never queried again.
+
+        Args:
+            version (int): The version of the store before the change.
+            new_version (int): The version of the store after the change.
+            task_id (int): The ID of the changed task.
+            task (Mapping): The task after the change, or None if it was deleted.
+            appended (bool): Whether the task is new and comes last in the
+                insertion order of the store.
+        """
+        for key, entry in list(self._entries.items()):
+            if entry.version != version:
+                continue
+            if entry.matches is None or not self._patch(entry, task_id, task, appended):
+                self._discard(key)
+                continue
+            entry.version = new_version
+            self.patches += 1
+        # Added tasks grow the results
+        self._evict()
+
+    def _patch(self, entry, task_id, task, appended):
+        """Applies a change to one task to a result; False if it cannot be."""
+        if not isinstance(entry.tasks, dict):
+            # The ID of a deleted task can still be read from its view
+            entry.tasks = {found["id"]: found for found in entry.tasks}
+        tasks = entry.tasks
+        if task is None or not entry.matches(task):
+            if tasks.pop(task_id, None) is not None:
+                self._size -= 1
+            return True
+        if task_id in tasks or appended:
+            # Replacing keeps the place; stores that hand out snapshots rather than live views need the new one
+            self._size += task_id not in tasks
+            tasks[task_id] = task
+            return True
+        # A changed task that now matches belongs somewhere in the middle
+        return False
+
+    def _evict(self):
+        """Drops the least recently used results until the cache is within its bounds."""
+        while len(self._entries) > self.max_entries or self._size > self.max_tasks:
+            _, entry = self._entries.popitem(last=False)
+            self._size -= len(entry)
+            self.evictions += 1
+
+    def _discard(self, key):
+        """Drops a result, if it is cached."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry)
+
+    def clear(self):
+        """Drops every result; the statistics are kept."""
+        self._entries.clear()
+        self._size = 0
+
+    def stats(self):
+        """Returns the statistics and the current size of the cache as a dictionary."""
+        return {
+            "entries": len(self._entries),
+            "tasks": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "patches": self.patches
+        }
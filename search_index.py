@@ -0,0 +1,347 @@
+# search_index.py
+
+import heapq
+import re
+from bisect import bisect_left, insort
+from collections import Counter
+
+"""
+This module contains the inverted indexes used to answer task searches.
+'TextIndex' maps every lowercased word of a task's title and description to
+the IDs of the tasks containing it, and keeps a sorted list of the suffixes of
+all known words so that prefix and infix lookups are a binary search instead
+of a scan.
+
+'FuzzyIndex' ranks tasks by how similar their words are to the search terms,
+so that typos still find something. Its trigram index covers the vocabulary,
+i.e. every distinct word, rather than every task: a term's similar words are
+found among the few thousand known words, and their tasks come from the word
+postings. That keeps the index a small fraction of the text index even for
+hundreds of thousands of tasks.
+"""
+
+# A "word" is a maximal run of word characters in the lowercased text
+_WORD_RE = re.compile(r"\w+")
+
+# How much more a similar word counts in the title than in the description
+TITLE_WEIGHT = 2.0
+
+# Trigram similarity below which a word is not considered a match for a term
+MIN_SIMILARITY = 0.3
+
+def tokenize(text):
+    """Returns the set of lowercased words in a piece of text."""
+    return set(_WORD_RE.findall(text.lower()))
+
+def trigrams(word):
+    """
+    Returns the trigrams of a word, padded like PostgreSQL's pg_trgm.
+
+    The padding (two spaces before, one after) makes the start and end of a
+    word count, so short words get trigrams too: 'gym' has '  g', ' gy', 'gym'
+    and 'ym '.
+    """
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TextIndex:
+    """
+    An inverted index from words to task IDs.
+
+    A search term made only of word characters can only ever match inside a
+    single word, so the IDs of every word containing the term are exactly the
+    tasks whose text contains it. Terms that span several words are answered
+    with a candidate set that the caller must verify.
+    """
+
+    def __init__(self):
+        self._postings = {}  # word -> set of task IDs
+        self._suffixes = []  # sorted (suffix, word) pairs for every known word
+
+    @classmethod
+    def build(cls, entries):
+        """
+        Builds an index for many tasks at once, e.g. when a store is loaded.
+
+        The suffix list is sorted once at the end instead of being kept sorted
+        word by word as ``add`` does.
+
+        Args:
+            entries (iterable): ``(task_id, *texts)`` tuples.
+
+        Returns:
+            TextIndex: The new index.
+        """
+        index = cls()
+        postings = index._postings
+        for task_id, *texts in entries:
+            for word in set().union(*map(tokenize, texts)):
+                ids = postings.get(word)
+                if ids is None:
+                    ids = postings[word] = set()
+                ids.add(task_id)
+        index._suffixes = sorted((word[i:], word) for word in postings for i in range(len(word)))
+        return index
+
+    def add(self, task_id, *texts):
+        """
+        Indexes the given texts under a task ID.
+
+        Args:
+            task_id (int): The ID of the task the texts belong to.
+            *texts (str): The texts to index, e.g. the title and description.
+        """
+        for word in set().union(*map(tokenize, texts)):
+            ids = self._postings.get(word)
+            if ids is None:
+                ids = self._postings[word] = set()
+                for i in range(len(word)):
+                    insort(self._suffixes, (word[i:], word))
+            ids.add(task_id)
+
+    def remove(self, task_id, *texts):
+        """
+        Removes a task ID from the entries of the given texts.
+
+        Args:
+            task_id (int): The ID of the task the texts belong to.
+            *texts (str): The texts that were indexed for the task.
+        """
+        for word in set().union(*map(tokenize, texts)):
+            ids = self._postings.get(word)
+            if ids is None:
+                continue
+            ids.discard(task_id)
+            if not ids:
+                del self._postings[word]
+                for i in range(len(word)):
+                    del self._suffixes[bisect_left(self._suffixes, (word[i:], word))]
+
+    def has_word(self, word):
+        """Tells whether any task contains a word."""
+        return word in self._postings
+
+    def words(self):
+        """Returns a view of every word that occurs in some task."""
+        return self._postings.keys()
+
+    def ids_with(self, word):
+        """Returns the IDs of the tasks containing a word, which must not be changed."""
+        return self._postings.get(word, frozenset())
+
+    def _containing(self, fragment):
+        """Returns the IDs of all tasks with a word containing the fragment."""
+        ids = set()
+        i = bisect_left(self._suffixes, (fragment,))
+        while i < len(self._suffixes):
+            suffix, word = self._suffixes[i]
+            if not suffix.startswith(fragment):
+                break
+            ids |= self._postings[word]
+            i += 1
+        return ids
+
+    def lookup(self, term):
+        """
+        Looks up the tasks whose text may contain a lowercased search term.
+
+        Args:
+            term (str): The lowercased search term.
+
+        Returns:
+            tuple: A ``(ids, exact)`` pair, where ``exact`` tells whether every
+            ID is a guaranteed match or only a candidate to verify, or None if
+            the term has no word characters and the index cannot help.
+        """
+        fragments = _WORD_RE.findall(term)
+        if not fragments:
+            return None
+        if fragments == [term]:
+            return self._containing(term), True
+        return self._containing(max(fragments, key=len)), False
+
+class FuzzyIndex:
+    """
+    Ranks tasks by the trigram similarity of their words to a search term.
+
+    It relies on the TextIndex of the same tasks for the vocabulary and the
+    tasks containing each word, and adds a trigram index over the vocabulary
+    and the postings of the title words, which give title hits more weight.
+    The TextIndex must be changed first, so that removed words are gone from it.
+    """
+
+    def __init__(self, text_index):
+        """
+        Args:
+            text_index (TextIndex): The text index of the same tasks.
+        """
+        self._text = text_index
+        self._titles = {}  # word -> set of IDs of the tasks with the word in their title
+        self._words = {}  # trigram -> set of words containing it
+        self._sizes = {}  # word -> number of its trigrams
+
+    @classmethod
+    def build(cls, text_index, titles):
+        """
+        Builds a fuzzy index for many tasks at once.
+
+        Args:
+            text_index (TextIndex): The text index of the same tasks.
+            titles (iterable): ``(task_id, title)`` pairs.
+
+        Returns:
+            FuzzyIndex: The new index.
+        """
+        index = cls(text_index)
+        postings = index._titles
+        for task_id, title in titles:
+            for word in tokenize(title):
+                ids = postings.get(word)
+                if ids is None:
+                    ids = postings[word] = set()
+                ids.add(task_id)
+        for word in text_index.words():
+            index._add_word(word)
+        return index
+
+    def _add_word(self, word):
+        grams = trigrams(word)
+        self._sizes[word] = len(grams)
+        for gram in grams:
+            self._words.setdefault(gram, set()).add(word)
+
+    def _remove_word(self, word):
+        del self._sizes[word]
+        for gram in trigrams(word):
+            words = self._words[gram]
+            words.discard(word)
+            if not words:
+                del self._words[gram]
+
+    def add(self, task_id, title, description):
+        """Indexes a task after it has been added to the text index."""
+        title_words = tokenize(title)
+        for word in title_words:
+            self._titles.setdefault(word, set()).add(task_id)
+        for word in title_words | tokenize(description):
+            if word not in self._sizes:
+                self._add_word(word)
+
+    def remove(self, task_id, title, description):
+        """Removes a task after it has been removed from the text index."""
+        title_words = tokenize(title)
+        for word in title_words:
+            ids = self._titles.get(word)
+            if ids is not None:
+                ids.discard(task_id)
+                if not ids:
+                    del self._titles[word]
+        for word in title_words | tokenize(description):
+            if word in self._sizes and not self._text.has_word(word):
+                self._remove_word(word)
+
+    def similar_words(self, term, min_similarity=MIN_SIMILARITY):
+        """
+        Finds the known words similar to a word.
+
+        Similarity is the Jaccard index of the trigram sets, from 0 to 1.
+
+        Args:
+            term (str): A lowercased word.
+            min_similarity (float): The lowest similarity to return.
+
+        Returns:
+            list: ``(similarity, word)`` pairs, most similar first.
+        """
+        grams = trigrams(term)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._words.get(gram, ()))
+        # A word sharing n trigrams is at most n / len(grams) similar, however long it is
+        needed = min_similarity * len(grams)
+        similar = []
+        for word, count in shared.items():
+            if count >= needed:
+                similarity = count / (len(grams) + self._sizes[word] - count)
+                if similarity >= min_similarity:
+                    similar.append((similarity, word))
+        similar.sort(reverse=True)
+        return similar
+
+    def _ranked(self, term, title_weight, min_similarity):
+        """
+        Yields the tasks containing a word similar to one term, best first.
+
+        A task scores the similarity of its most similar word, multiplied by
+        the title weight if that word is in its title.
+
+        Yields:
+            tuple: A score and the set of IDs of the tasks with that score,
+            in descending order of score.
+        """
+        weighted = []
+        for similarity, word in self.similar_words(term, min_similarity):
+            weighted.append((similarity * title_weight, self._titles.get(word, frozenset())))
+            weighted.append((similarity, self._text.ids_with(word)))
+        weighted.sort(key=lambda entry: entry[0], reverse=True)
+        # Best scores come first, so each task keeps the first score it gets
+        seen = set()
+        for weight, ids in weighted:
+            new = ids - seen
+            if new:
+                seen |= new
+                yield weight, new
+
+    def search(self, term, limit, title_weight=TITLE_WEIGHT, min_similarity=MIN_SIMILARITY):
+        """
+        Finds the tasks whose words best match the words of a search term.
+
+        Each word of the term contributes its best match in a task, and the
+        score is their average, from 0 to 1, where 1 means every word is in
+        the title. Only the best ``limit`` tasks are kept, in a bounded heap.
+
+        Args:
+            term (str): The search term.
+            limit (int): The number of tasks to return.
+            title_weight (float): How much more a match in the title counts.
+            min_similarity (float): The lowest similarity for a word to match.
+
+        Returns:
+            list: ``(score, task_id)`` pairs, best first; equal scores by ID.
+        """
+        words = tokenize(term)
+        if not words or limit <= 0:
+            return []
+        scale = title_weight * len(words)
+        if len(words) == 1:
+            # The groups already come best first, so only the first few are needed
+            best = []
+            for score, ids in self._ranked(words.pop(), title_weight, min_similarity):
+                best += [(score / scale, task_id) for task_id in heapq.nsmallest(limit - len(best), ids)]
+                if len(best) == limit:
+                    break
+            return best
+
+        # Only the tasks matching the rarer words are summed up one by one; the
+        # others score what the most common word gives them, already grouped
+        ranked = [list(self._ranked(word, title_weight, min_similarity)) for word in words]
+        ranked.sort(key=lambda groups: sum(len(ids) for _, ids in groups))
+        common = ranked.pop()
+        totals = {}
+        for groups in ranked:
+            for score, ids in groups:
+                for task_id in ids:
+                    totals[task_id] = totals.get(task_id, 0) + score
+        common_scores = {}
+        for score, ids in common:
+            common_scores.update(dict.fromkeys(ids, score))
+        for task_id in totals:
+            totals[task_id] += common_scores.get(task_id, 0)
+        best = []
+        for score, ids in common:
+            best += [(score, task_id) for task_id in heapq.nsmallest(limit - len(best), ids.difference(totals))]
+            if len(best) == limit:
+                break
+        best += [(score, task_id) for task_id, score in heapq.nlargest(limit, totals.items(), key=lambda item: (item[1], -item[0]))]
+        best.sort(key=lambda pair: (-pair[0], pair[1]))
+        return [(score / scale, task_id) for score, task_id in best[:limit]]
@@ -0,0 +1,232 @@
+# sharded_store.py
+
+from task_store import TaskStore
+
+"""
+This module contains the task store of the sharded layout, in which the tasks
+are split by ID into shards of a fixed number of IDs that are kept in files of
+their own (see 'file_handling.ShardedBackend').
+
+A 'ShardedTaskStore' starts out empty and reads shards as they are needed: a
+lookup, change or removal by ID reads only the shard holding that ID, while
+anything that looks at every task, such as iterating, searching, filtering or
+querying, first reads all shards not loaded yet in one go, which the backend
+does in parallel. The store remembers which shards it has changed, so that
+saving it rewrites only those.
+"""
+
+# IDs per shard in a new layout; an existing layout keeps the size it was created with
+SHARD_SIZE = 10_000
+
+class ShardedTaskStore(TaskStore):
+    """
+    A TaskStore that loads its tasks one shard at a time, on demand.
+
+    Once every shard is loaded, the tasks come in shard order, i.e. by ID
+    range, and within a shard in insertion order, as they are saved.
+    """
+
+    def __init__(self, directory=None, read_shards=None, counts=None, shard_size=SHARD_SIZE, next_id=1):
+        """
+        Args:
+            directory (str): The absolute path of the directory holding the
+                shard files, or None for a store that has not been saved yet.
+            read_shards (callable): Called with a list of shard indexes; yields
+                the index and the list of task dictionaries of each shard.
+            counts (dict): The number of tasks in each shard on disk, by shard index.
+            shard_size (int): The number of IDs per shard.
+            next_id (int): The lowest ID the allocator may hand out.
+        """
+        super().__init__(next_id=next_id)
+        self.directory = directory
+        self.shard_size = shard_size
+        self.dirty_shards = set()  # shards changed since they were last written
+        self._read_shards = read_shards
+        self._unloaded = dict(counts or {})  # shard index -> number of tasks, for shards not read yet
+        self._members = {}  # shard index -> IDs of its tasks, in insertion order
+
+    def shard_of(self, task_id):
+        """Returns the index of the shard holding a task ID."""
+        return task_id // self.shard_size
+
+    def shard_counts(self):
+        """Returns the number of tasks in each shard that has any, by shard index."""
+        counts = {index: len(ids) for index, ids in self._members.items() if ids}
+        counts.update(self._unloaded)
+        return counts
+
+    def shard_tasks(self, index):
+        """Returns copies of the tasks of a loaded shard, in insertion order."""
+        tasks = []
+        for task_id in self._members.get(index, ()):
+            # Read from the columns directly, which is several times faster than copying a Task view
+            row = self._rows[task_id]
+            task = {
+                "id": task_id,
+                "title": self._titles[row],
+                "description": self._descriptions[row],
+                "priority": self._priorities[row],
+                "status": self._statuses[row]
+            }
+            task.update(self._extra.get(task_id, ()))
+            tasks.append(task)
+        return tasks
+
+    def _load(self, indexes):
+        """Reads the shards with the given indexes that are not loaded yet."""
+        missing = sorted(index for index in set(indexes) if index in self._unloaded)
+        if not missing:
+            return
+        for index, tasks in self._read_shards(missing):
+            del self._unloaded[index]
+            members = self._members.setdefault(index, {})
+            for task in tasks:
+                TaskStore.add(self, task)
+                members[task["id"]] = None
+
+    def _load_all(self):
+        """
+        Reads every shard not loaded yet, e.g. before a search.
+
+        Shards read on demand before a lower one are taken out and put back
+        after it, so that the tasks come in shard order.
+        """
+        if not self._unloaded:
+            return
+        first = min(self._unloaded)
+        if any(index > first for index in self._members):
+            loaded = {index: self.shard_tasks(index) for index in self._members}
+            members = self._members
+            TaskStore.__init__(self, next_id=self.next_id)
+            self._members = {}
+            for index, tasks in self._read_shards(sorted(self._unloaded)):
+                loaded[index] = tasks
+            self._unloaded = {}
+            for index in sorted(loaded):
+                ids = self._members[index] = {}
+                for task in loaded[index]:
+                    TaskStore.add(self, task)
+                    ids[task["id"]] = None
+            # Shards emptied in this session still have files to remove
+            self._members.update((index, {}) for index in members if index not in self._members)
+            return
+        self._load(list(self._unloaded))
+
+    def _changed(self, task_id):
+        """Notes that the shard of a task has to be written."""
+        self.dirty_shards.add(self.shard_of(task_id))
+
+    def __len__(self):
+        return len(self._rows) + sum(self._unloaded.values())
+
+    def __contains__(self, task_id):
+        self._load([self.shard_of(task_id)])
+        return super().__contains__(task_id)
+
+    def get(self, task_id):
+        """Returns the task with the given ID, reading its shard if needed, or None if it does not exist."""
+        self._load([self.shard_of(task_id)])
+        return super().get(task_id)
+
+    def add(self, task):
+        """Adds a task, replacing any task with the same ID, and marks its shard as changed."""
+        index = self.shard_of(task["id"])
+        self._load([index])
+        super().add(task)
+        self._members.setdefault(index, {})[task["id"]] = None
+        self._changed(task["id"])
+
+    def update(self, task_id, fields):
+        """Updates fields of an existing task and marks its shard as changed."""
+        self._load([self.shard_of(task_id)])
+        updated = super().update(task_id, fields)
+        if updated is not None:
+            self._changed(task_id)
+        return updated
+
+    def remove(self, task_id):
+        """Removes a task and marks its shard as changed."""
+        index = self.shard_of(task_id)
+        self._load([index])
+        removed = super().remove(task_id)
+        if removed is not None:
+            del self._members[index][task_id]
+            self._changed(task_id)
+        return removed
+
+    def remove_many(self, task_ids):
+        """Removes many tasks at once, reading the shards involved together."""
+        task_ids = list(dict.fromkeys(task_ids))
+        self._load({self.shard_of(task_id) for task_id in task_ids})
+        removed = super().remove_many(task_ids)
+        for task in removed:
+            del self._members[self.shard_of(task["id"])][task["id"]]
+            self._changed(task["id"])
+        return removed
+
+    def renumber(self, start=1):
+        """
+        Re-numbers all tasks in their current order.
+
+        Tasks move between shards, so every shard that held tasks before or
+        holds them afterwards is marked as changed.
+        """
+        self._load_all()
+        tasks = [dict(task) for task in self]
+        for i, task in enumerate(tasks):
+            task["id"] = start + i
+        TaskStore.__init__(self, next_id=start)
+        self._members = {index: {} for index in self._members}
+        for task in tasks:
+            TaskStore.add(self, task)
+            self._members.setdefault(self.shard_of(task["id"]), {})[task["id"]] = None
+        self.dirty_shards.update(self._members)
+
+    def __iter__(self):
+        self._load_all()
+        return super().__iter__()
+
+    def ids(self):
+        """Returns a view of all task IDs, reading every shard first."""
+        self._load_all()
+        return super().ids()
+
+    def sorted_tasks(self):
+        """Returns a live view of the tasks in ascending ID order, reading every shard first."""
+        self._load_all()
+        return super().sorted_tasks()
+
+    def columns(self):
+        """Returns copies of the columns, reading every shard first."""
+        self._load_all()
+        return super().columns()
+
+    def search(self, search_term):
+        """Finds the tasks whose title or description contains a term, reading every shard first."""
+        self._load_all()
+        return super().search(search_term)
+
+    def fuzzy_search(self, search_term, limit):
+        """Ranks the tasks by similarity to a term, reading every shard first."""
+        self._load_all()
+        return super().fuzzy_search(search_term, limit)
+
+    def build_indexes(self):
+        """Builds the text and fuzzy indexes now, reading every shard first."""
+        self._load_all()
+        super().build_indexes()
+
+    def count(self, field, value):
+        """Counts the tasks whose field has a value, reading every shard first."""
+        self._load_all()
+        return super().count(field, value)
+
+    def filter(self, *criteria):
+        """Returns the tasks matching every criterion, reading every shard first."""
+        self._load_all()
+        return super().filter(*criteria)
+
+    def query(self, query):
+        """Runs a parsed query, reading every shard first."""
+        self._load_all()
+        return super().query(query)
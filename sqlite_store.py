@@ -0,0 +1,448 @@
+# sqlite_store.py
+
+import json
+import sqlite3
+from query_cache import next_version
+from search_index import FuzzyIndex, TextIndex
+
+"""
+This module contains a task store kept in an SQLite database.
+It offers the same operations as 'task_store.TaskStore', but answers them with
+queries instead of holding the tasks in memory: the ID is the primary key,
+status and priority have their own indexes, and titles and descriptions are
+mirrored into an FTS5 trigram table for substring search. Opening the store
+does not read any tasks, so startup does not depend on the size of the data.
+Fuzzy search is the exception: it ranks with the same in-memory index as
+'task_store.TaskStore', built from the database by the first fuzzy search, so
+both stores return the same tasks in the same order.
+
+Changes are made inside a transaction that the storage backend commits after
+each journaled operation or save.
+"""
+
+# Fields stored in their own column; anything else goes into the 'extra' JSON
+_COLUMNS = ("id", "title", "description", "priority", "status")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    status TEXT NOT NULL,
+    extra TEXT,
+    seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_seq ON tasks (seq);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (lower(status));
+CREATE INDEX IF NOT EXISTS tasks_priority ON tasks (lower(priority));
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5 (
+    title, description, content='tasks', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+    INSERT INTO tasks_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    INSERT INTO tasks_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+END;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+# The trigram tokenizer can only use its index for terms of at least 3 characters
+_MIN_FTS_TERM = 3
+
+_SELECT = "SELECT id, title, description, priority, status, extra FROM tasks"
+
+def _to_task(row):
+    """Turns a result row into a task dictionary."""
+    task = dict(zip(_COLUMNS, row))
+    if row[5]:
+        task.update(json.loads(row[5]))
+    return task
+
+def _matches(task, term):
+    """Tells whether a lowercased term occurs in a task's title or description."""
+    return term in task["title"].lower() or term in task["description"].lower()
+
+class SQLiteSortedTasks:
+    """
+    A read-only view of the tasks in ID order, paged with LIMIT/OFFSET queries.
+    """
+
+    def __init__(self, store):
+        self._store = store
+
+    def __len__(self):
+        return len(self._store)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(len(self))
+            rows = self._store._execute(_SELECT + " ORDER BY id LIMIT ? OFFSET ?", (max(stop - start, 0), start))
+            return [_to_task(row) for row in rows]
+        if index < 0:
+            index += len(self)
+        row = self._store._execute(_SELECT + " ORDER BY id LIMIT 1 OFFSET ?", (index,)).fetchone()
+        if row is None:
+            raise IndexError(index)
+        return _to_task(row)
+
+    def position(self, task_id):
+        """Returns the index of a task ID in the view, or None if it is absent."""
+        if task_id not in self._store:
+            return None
+        return self._store._execute("SELECT COUNT(*) FROM tasks WHERE id < ?", (task_id,)).fetchone()[0]
+
+class SQLiteTaskStore:
+    """
+    A task store backed by an SQLite database.
+
+    Tasks are returned as plain dictionaries that reflect the database at the
+    time they were read; changes must go through ``update``.
+    """
+
+    def __init__(self, file_path):
+        """
+        Args:
+            file_path (str): The path to the database, created if needed.
+        """
+        self._conn = sqlite3.connect(file_path)
+        self._conn.executescript(_SCHEMA)
+        self._version = None
+        self._data_version = None  # of the database when the version was last taken
+        self._text_index = None  # built with the fuzzy index, see '_fuzzy'
+        self._fuzzy_index = None
+        self._index_data_version = None  # of the database when the indexes were built
+
+    def _execute(self, sql, parameters=()):
+        return self._conn.execute(sql, parameters)
+
+    def commit(self):
+        """Makes all changes since the last commit durable."""
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    @property
+    def version(self):
+        """
+        Changes with every change to the tasks (see 'query_cache').
+
+        Commits of other connections to the database count as well; SQLite
+        reports them through 'PRAGMA data_version'.
+        """
+        data_version = self._execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._data_version = data_version
+            self._version = next_version()
+        return self._version
+
+    def _fuzzy(self):
+        """
+        Returns the fuzzy index, reading the text of every task to build it on first use.
+
+        Changes through this store maintain it from then on; a commit of
+        another connection to the database has it built again.
+        """
+        data_version = self._execute("PRAGMA data_version").fetchone()[0]
+        if self._fuzzy_index is None or data_version != self._index_data_version:
+            rows = self._execute("SELECT id, title, description FROM tasks ORDER BY seq").fetchall()
+            self._text_index = TextIndex.build(rows)
+            self._fuzzy_index = FuzzyIndex.build(self._text_index, ((task_id, title) for task_id, title, _ in rows))
+            self._index_data_version = data_version
+        return self._fuzzy_index
+
+    def build_indexes(self):
+        """Builds the fuzzy index now rather than on the first fuzzy search."""
+        self._fuzzy()
+
+    def _index(self, task):
+        """Adds a task to the fuzzy index, if it has been built."""
+        if self._fuzzy_index is not None:
+            self._text_index.add(task["id"], task["title"], task["description"])
+            self._fuzzy_index.add(task["id"], task["title"], task["description"])
+
+    def _unindex(self, task):
+        """Removes a task from the fuzzy index, if it has been built."""
+        if self._fuzzy_index is not None:
+            self._text_index.remove(task["id"], task["title"], task["description"])
+            self._fuzzy_index.remove(task["id"], task["title"], task["description"])
+
+    def __iter__(self):
+        for row in self._execute(_SELECT + " ORDER BY seq"):
+            yield _to_task(row)
+
+    def __len__(self):
+        return self._execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def __contains__(self, task_id):
+        return self._execute("SELECT 1 FROM tasks WHERE id = ?", (task_id,)).fetchone() is not None
+
+    def get(self, task_id):
+        """Returns the task with the given ID, or None if it does not exist."""
+        row = self._execute(_SELECT + " WHERE id = ?", (task_id,)).fetchone()
+        return _to_task(row) if row else None
+
+    def ids(self):
+        """Returns all task IDs in insertion order."""
+        return [row[0] for row in self._execute("SELECT id FROM tasks ORDER BY seq")]
+
+    def sorted_tasks(self):
+        """Returns a live view of the tasks in ascending ID order."""
+        return SQLiteSortedTasks(self)
+
+    @property
+    def next_id(self):
+        """The lowest ID the allocator may hand out."""
+        row = self._execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+        return row[0] if row else 1
+
+    @next_id.setter
+    def next_id(self, value):
+        self._execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('next_id', ?)", (value,))
+
+    def allocate_id(self):
+        """Hands out a fresh task ID that has never been used in this store."""
+        return self.allocate_ids(1)[0]
+
+    def allocate_ids(self, count):
+        """
+        Hands out a block of consecutive fresh task IDs for bulk inserts.
+
+        Args:
+            count (int): The number of IDs to reserve.
+
+        Returns:
+            range: The reserved IDs.
+        """
+        start = self.next_id
+        self.next_id = start + count
+        return range(start, start + count)
+
+    def add(self, task):
+        """
+        Adds a task to the store, replacing any task with the same ID.
+
+        A replaced task keeps its place in the insertion order.
+
+        Args:
+            task (dict): The task to add. It must have an 'id' key.
+        """
+        if self._fuzzy_index is not None:
+            replaced = self.get(task["id"])
+            if replaced is not None:
+                self._unindex(replaced)
+        extra = {key: value for key, value in task.items() if key not in _COLUMNS}
+        self._execute(
+            "INSERT INTO tasks (id, title, description, priority, status, extra, seq)"
+            " VALUES (?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM tasks))"
+            " ON CONFLICT (id) DO UPDATE SET title = excluded.title, description = excluded.description,"
+            " priority = excluded.priority, status = excluded.status, extra = excluded.extra",
+            (task["id"], *(task.get(field, "") for field in _COLUMNS[1:]), json.dumps(extra) if extra else None)
+        )
+        self._index({field: task.get(field, "") for field in _COLUMNS})
+        if task["id"] >= self.next_id:
+            self.next_id = task["id"] + 1
+        self._version = next_version()
+
+    def update(self, task_id, fields):
+        """
+        Updates fields of an existing task.
+
+        Args:
+            task_id (int): The ID of the task to update.
+            fields (dict): The fields to overwrite. The ID cannot be changed.
+
+        Returns:
+            dict: The updated task, or None if it does not exist.
+        """
+        task = self.get(task_id)
+        if task is None:
+            return None
+        if "id" in fields:
+            raise ValueError("The ID of a task cannot be changed")
+        self._unindex(task)
+        task.update(fields)
+        extra = {key: value for key, value in task.items() if key not in _COLUMNS}
+        self._execute(
+            "UPDATE tasks SET title = ?, description = ?, priority = ?, status = ?, extra = ? WHERE id = ?",
+            (*(task[field] for field in _COLUMNS[1:]), json.dumps(extra) if extra else None, task_id)
+        )
+        self._index(task)
+        self._version = next_version()
+        return task
+
+    def remove(self, task_id):
+        """
+        Removes a task from the store.
+
+        Args:
+            task_id (int): The ID of the task to remove.
+
+        Returns:
+            dict: The removed task, or None if it does not exist.
+        """
+        task = self.get(task_id)
+        if task is not None:
+            self._execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+            self._unindex(task)
+            self._version = next_version()
+        return task
+
+    def remove_many(self, task_ids):
+        """
+        Removes many tasks at once, e.g. the tasks moved to the archive.
+
+        Args:
+            task_ids (iterable): The IDs of the tasks to remove; IDs that do not exist are skipped.
+
+        Returns:
+            list: The removed tasks.
+        """
+        removed = [task for task in map(self.get, dict.fromkeys(task_ids)) if task is not None]
+        self._conn.executemany("DELETE FROM tasks WHERE id = ?", ((task["id"],) for task in removed))
+        for task in removed:
+            self._unindex(task)
+        if removed:
+            self._version = next_version()
+        return removed
+
+    def renumber(self, start=1):
+        """
+        Re-numbers all tasks in their current order.
+
+        Args:
+            start (int): The first ID, e.g. one past the IDs that archived tasks keep.
+        """
+        tasks = list(self)
+        self._execute("DELETE FROM tasks")
+        # Every ID changes, so the index is built afresh by the next fuzzy search
+        self._text_index = self._fuzzy_index = None
+        self._version = next_version()
+        # Re-numbering is the one place where IDs are allowed to be reused
+        self.next_id = start
+        for i, task in enumerate(tasks):
+            task["id"] = start + i
+            self.add(task)
+
+    def search(self, search_term):
+        """
+        Finds the tasks whose title or description contains a term.
+
+        Terms long enough for the trigram index are looked up in the FTS
+        table, and the candidates are checked with the same case-insensitive
+        substring test as the in-memory store; shorter terms scan.
+
+        Args:
+            search_term (str): The term to search for.
+
+        Returns:
+            list: The matching tasks in insertion order.
+        """
+        search_term = search_term.lower()
+        if len(search_term) >= _MIN_FTS_TERM:
+            phrase = '"' + search_term.replace('"', '""') + '"'
+            rows = self._execute(
+                _SELECT + " WHERE id IN (SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ?) ORDER BY seq",
+                (phrase,)
+            )
+        else:
+            rows = self._execute(_SELECT + " ORDER BY seq")
+        return [task for task in map(_to_task, rows) if _matches(task, search_term)]
+
+    def fuzzy_search(self, search_term, limit):
+        """
+        Finds the tasks whose words best match the words of a term, best first.
+
+        The tasks are ranked by the fuzzy index of the 'search_index' module,
+        as in the in-memory store, and only the best are read.
+
+        Args:
+            search_term (str): The term to search for.
+            limit (int): The most tasks to return.
+
+        Returns:
+            list: The best matching tasks, best first.
+        """
+        if limit <= 0:
+            return []
+        return [self.get(task_id) for _, task_id in self._fuzzy().search(search_term, limit)]
+
+    def count(self, field, value):
+        """
+        Counts the tasks with a given status or priority using its index.
+
+        Args:
+            field (str): Either 'status' or 'priority'.
+            value (str): The value to count, compared case-insensitively.
+
+        Returns:
+            int: The number of matching tasks.
+        """
+        if field not in ("status", "priority"):
+            raise KeyError(field)
+        return self._execute(f"SELECT COUNT(*) FROM tasks WHERE lower({field}) = ?", (value.lower(),)).fetchone()[0]
+
+    def filter(self, *criteria):
+        """
+        Finds the tasks matching every criterion.
+
+        Each criterion matches a task whose status or priority equals it.
+
+        Args:
+            *criteria (str): The criteria, compared case-insensitively.
+
+        Returns:
+            list: The matching tasks in insertion order.
+        """
+        where = " AND ".join(["(lower(status) = ? OR lower(priority) = ?)"] * len(criteria)) or "1"
+        parameters = [value for criterion in criteria for value in (criterion.lower(),) * 2]
+        rows = self._execute(_SELECT + f" WHERE {where} ORDER BY seq", parameters)
+        return [_to_task(row) for row in rows]
+
+    def query(self, query):
+        """
+        Yields the tasks matching a query, in its order and up to its limit.
+
+        Status, priority and the ID range become a WHERE clause, so SQLite
+        picks the index to use, and text terms long enough for the trigram
+        index are looked up in the FTS table. The rows are checked with the
+        same case-insensitive tests as the in-memory store and read from the
+        cursor one at a time, so a limit stops the query early.
+
+        Args:
+            query (Query): The parsed query, see the 'query' module.
+
+        Returns:
+            iterator: The matching tasks.
+        """
+        where, parameters = [], []
+        for field, values in (("status", query.statuses), ("priority", query.priorities)):
+            if values is not None:
+                where.append(f"lower({field}) IN ({', '.join('?' * len(values))})")
+                parameters += sorted(values)
+        if query.id_range is not None:
+            for bound, operator in zip(query.id_range, (">=", "<=")):
+                if bound is not None:
+                    where.append(f"id {operator} ?")
+                    parameters.append(bound)
+        for term in query.terms:
+            if len(term) >= _MIN_FTS_TERM:
+                where.append("id IN (SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ?)")
+                parameters.append('"' + term.replace('"', '""') + '"')
+
+        sql = _SELECT + (" WHERE " + " AND ".join(where) if where else "")
+        if query.sort == "id":
+            sql += " ORDER BY id DESC" if query.descending else " ORDER BY id"
+        else:
+            sql += " ORDER BY seq"
+        rows = self._execute(sql, parameters)
+        return query.order((task for task in map(_to_task, rows) if query.matches(task)), presorted=query.sort == "id")
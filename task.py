@@ -1,74 +1,396 @@
 # task.py
 
-from rich.console import Console
-from rich.table import Table
-from rich.prompt import Prompt, Confirm
-from rich.markup import escape
+import profiling
+from datetime import datetime, timezone
+from itertools import islice
+from output import LazyConsole, escape
+from query import parse_query
+from query_cache import QueryCache
+from task_store import SortedTasks
 
 """
 This module contains the core logic for task manipulation.
 It handles adding, listing, updating, completing, and deleting tasks.
-All user-facing interactions and presentations are managed here using the 'rich' library.
+All user-facing interactions and presentations are managed here using the 'rich' library,
+which is imported only when a prompt or table is actually shown.
+Searches, filters and queries are answered from a 'query_cache.QueryCache'
+while the tasks have not changed, and the functions that change a single task
+patch the cached results rather than throw them away.
 """
 
-# Initialize Rich Console for beautiful output
-console = Console()
+# Initialize Rich Console for beautiful output; rich is imported on first use
+console = LazyConsole()
 
-def find_task(tasks, task_id):
+# Number of tasks shown per page when listing
+PAGE_SIZE = 20
+
+# Number of tasks a fuzzy search returns unless told otherwise
+FUZZY_LIMIT = 20
+
+# Allowed values of the fields with a fixed set of values
+PRIORITIES = ("low", "medium", "high")
+STATUSES = ("pending", "completed")
+
+# Results of searches, filters and queries, reused until the tasks change (see 'query_cache')
+query_cache = QueryCache()
+
+def _cached(tasks, key, run, matches=None):
+    """
+    Returns the result of a query from the cache, running and caching it if needed.
+
+    Args:
+        tasks (TaskStore | SQLiteTaskStore): The tasks being queried.
+        key (tuple): The normalized query.
+        run (callable): Runs the query against the tasks and returns the result as a list.
+        matches (callable): Tells whether a single task belongs in the result,
+            so that it can be patched, or None if it cannot be.
+
+    Returns:
+        list: The result, which the caller may change.
+    """
+    found = query_cache.get(key, tasks.version)
+    if found is not None:
+        profiling.count("query_cache.hit", len(found))
+        return found
+    with profiling.span("query_cache.miss") as stats:
+        found = run()
+        if stats is not None:
+            stats.records += len(found)
+    # Taken afterwards, since a store that loads its tasks on demand changes version while doing so
+    query_cache.put(key, tasks.version, found, matches)
+    return found
+
+def _patch_cache(tasks, version, task_id, appended=False):
+    """Carries the cached results over a change to a single task, made at the given version."""
+    if query_cache:
+        query_cache.patch(version, tasks.version, task_id, tasks.get(task_id), appended)
+
+def _with_archived(found, tasks, archived):
+    """
+    Adds archived matches to the matches among the tasks.
+
+    A task that is in both tiers, which a crash while archiving can cause, is
+    only returned from the tasks.
+    """
+    return found + [task for task in archived if task["id"] not in tasks]
+
+def find_task(tasks, task_id, archive=None):
     """Finds a task by its ID.
 
     Args:
-        tasks (list): The list of tasks.
+        tasks (TaskStore | SQLiteTaskStore): The tasks, indexed by ID.
         task_id (int): The ID of the task to find.
+        archive (Archive): The archive to look in as well if the task is not
+            among the tasks, or None to leave it unread.
 
     Returns:
         dict: The task with the matching ID, or None if not found.
     """
-    for task in tasks:
-        if task.get("id") == task_id:
-            return task
-    return None
+    task = tasks.get(task_id)
+    if task is None and archive is not None:
+        task = archive.get(task_id)
+    return task
 
-def search_tasks(tasks, search_term):
+@profiling.timed("task.search_tasks", records=lambda found, *_: len(found))
+def search_tasks(tasks, search_term, archive=None):
     """
     Searches for tasks by a search term in the title or description.
 
     Args:
-        tasks (list): The list of tasks.
+        tasks (TaskStore | SQLiteTaskStore): The tasks, indexed by ID.
         search_term (str): The term to search for.
+        archive (Archive): The archive to search as well, or None to leave it unread.
+
+    Returns:
+        list: A list of tasks that match the search term, archived ones last.
+    """
+    term = search_term.lower()
+    found = _cached(
+        tasks, ("search", term), lambda: tasks.search(search_term),
+        lambda task: any(scan_search_tasks((task,), term))
+    )
+    if archive is not None:
+        found = _with_archived(found, tasks, archive.search(search_term))
+    return found
+
+@profiling.timed("task.fuzzy_search_tasks", records=lambda found, *_: len(found))
+def fuzzy_search_tasks(tasks, search_term, limit=FUZZY_LIMIT):
+    """
+    Ranks tasks by how closely their words match a search term, tolerating typos.
+
+    Matches in the title count more than matches in the description, and only
+    the best ``limit`` tasks are returned.
+
+    Args:
+        tasks (TaskStore | SQLiteTaskStore): The tasks, indexed by ID.
+        search_term (str): The term to search for.
+        limit (int): The most tasks to return.
+
+    Returns:
+        list: The best matching tasks, best first.
+    """
+    return _cached(tasks, ("fuzzy", search_term, limit), lambda: tasks.fuzzy_search(search_term, limit))
+
+@profiling.timed("task.filter_tasks", records=lambda found, *_: len(found))
+def filter_tasks(tasks, filter_criterion, archive=None):
+    """
+    Filters tasks by status or priority.
+
+    Several space-separated criteria, like "pending high", must all match.
+
+    Args:
+        tasks (TaskStore | SQLiteTaskStore): The tasks, indexed by ID.
+        filter_criterion (str): The criterion to filter by (status or priority).
+        archive (Archive): The archive to filter as well, or None to leave it unread.
+
+    Returns:
+        list: A list of tasks that match the filter criterion, archived ones last.
+    """
+    criteria = filter_criterion.split() or [filter_criterion]
+    found = _cached(
+        tasks, ("filter", frozenset(criterion.lower() for criterion in criteria)), lambda: tasks.filter(*criteria),
+        lambda task: any(scan_filter_tasks((task,), filter_criterion))
+    )
+    if archive is not None:
+        found = _with_archived(found, tasks, archive.filter(*criteria))
+    return found
+
+@profiling.timed("task.query_tasks", records=lambda found, *_: len(found))
+def query_tasks(tasks, query):
+    """
+    Finds the tasks matching a query, such as 'status:pending text:gym sort:priority limit:10'.
+
+    See the 'query' module for the language.
+
+    Args:
+        tasks (TaskStore | SQLiteTaskStore): The tasks, indexed by ID.
+        query (str | Query): The query, as text or already parsed.
+
+    Returns:
+        list: The matching tasks in the query's order, up to its limit.
+
+    Raises:
+        ValueError: If the query is not valid.
+    """
+    if isinstance(query, str):
+        query = parse_query(query)
+    # Only results in insertion order and without a limit can take in a changed task
+    matches = query.matches if query.sort is None and query.limit is None else None
+    return _cached(tasks, ("query", query.key()), lambda: list(tasks.query(query)), matches)
+
+def scan_find_task(tasks, task_id):
+    """Finds a task by its ID in a stream of tasks, stopping at the first match.
+
+    Args:
+        tasks (iterable): The tasks, e.g. from file_handling.iter_tasks.
+        task_id (int): The ID of the task to find.
 
     Returns:
-        list: A list of tasks that match the search term.
+        dict: The task with the matching ID, or None if not found.
+    """
+    return next((task for task in tasks if task.get("id") == task_id), None)
+
+def scan_search_tasks(tasks, search_term):
+    """
+    Lazily yields the tasks of a stream that match a search term.
+
+    Matches exactly what search_tasks returns, but needs no index, so it can
+    answer while the tasks are still being read from disk.
+
+    Args:
+        tasks (iterable): The tasks, e.g. from file_handling.iter_tasks.
+        search_term (str): The term to search for.
+
+    Yields:
+        dict: Each task whose title or description contains the term.
     """
-    found_tasks = []
     search_term = search_term.lower()
     for task in tasks:
         if search_term in task.get("title", "").lower() or search_term in task.get("description", "").lower():
-            found_tasks.append(task)
-    return found_tasks
+            yield task
 
-def filter_tasks(tasks, filter_criterion):
+def scan_filter_tasks(tasks, filter_criterion):
     """
-    Filters tasks by status or priority.
+    Lazily yields the tasks of a stream that match a filter criterion.
+
+    Matches exactly what filter_tasks returns, but needs no index.
 
     Args:
-        tasks (list): The list of tasks.
+        tasks (iterable): The tasks, e.g. from file_handling.iter_tasks.
         filter_criterion (str): The criterion to filter by (status or priority).
 
-    Returns:
-        list: A list of tasks that match the filter criterion.
+    Yields:
+        dict: Each task matching every criterion.
     """
-    found_tasks = []
-    filter_criterion = filter_criterion.lower()
+    criteria = [criterion.lower() for criterion in filter_criterion.split() or [filter_criterion]]
     for task in tasks:
-        if task.get("status", "").lower() == filter_criterion or task.get("priority", "").lower() == filter_criterion:
-            found_tasks.append(task)
-    return found_tasks
+        values = (task.get("status", "").lower(), task.get("priority", "").lower())
+        if all(criterion in values for criterion in criteria):
+            yield task
+
+def scan_query_tasks(tasks, query):
+    """
+    Lazily yields the tasks of a stream that match a parsed query.
+
+    Matches exactly what query_tasks returns, but needs no index. Without
+    sort: the tasks come as they are read, so a limit stops reading early.
+
+    Args:
+        tasks (iterable): The tasks, e.g. from file_handling.iter_tasks.
+        query (Query): The parsed query.
+
+    Returns:
+        iterator: The matching tasks in the query's order, up to its limit.
+    """
+    return query.apply(tasks)
+
+def scan_page(tasks, page=1, page_size=PAGE_SIZE):
+    """
+    Returns one page of a stream of tasks, reading no further than its end.
+
+    Args:
+        tasks (iterable): The tasks, e.g. from file_handling.iter_tasks.
+        page (int): The page to return, starting at 1.
+        page_size (int): The number of tasks per page.
+
+    Returns:
+        list: The tasks of the page in the order of the stream; empty past the last page.
+    """
+    start = (max(page, 1) - 1) * page_size
+    return list(islice(tasks, start, start + page_size))
+
+def check_fields(fields):
+    """
+    Checks the values of a task's fields and brings them into the stored form.
+
+    Priorities and statuses are lowercased, an empty title becomes "Task" and
+    an empty description "-", as in the menu. Other fields are passed through.
+
+    Args:
+        fields (dict): Fields of a task, e.g. any of 'title', 'description',
+            'priority' and 'status'.
+
+    Returns:
+        dict: The checked fields, as a new dictionary.
+
+    Raises:
+        TypeError: If one of those four fields is not a string.
+        ValueError: If the priority or status is not valid.
+    """
+    fields = dict(fields)
+    for field in ("title", "description", "priority", "status"):
+        if field in fields and not isinstance(fields[field], str):
+            raise TypeError(f"The {field} must be a string, not {type(fields[field]).__name__}.")
+    if "title" in fields:
+        fields["title"] = fields["title"] or "Task"
+    if "description" in fields:
+        fields["description"] = fields["description"] or "-"
+    if "priority" in fields:
+        fields["priority"] = fields["priority"].lower()
+        if fields["priority"] not in PRIORITIES:
+            raise ValueError(f"Invalid priority '{fields['priority']}'. Please choose from Low, Medium, or High.")
+    if "status" in fields:
+        fields["status"] = fields["status"].lower()
+        if fields["status"] not in STATUSES:
+            raise ValueError(f"Invalid status '{fields['status']}'. Please choose from Pending or Completed.")
+    return fields
+
+def create_task(tasks, title, description="-", priority="medium", task_id=None):
+    """
+    Adds a new pending task without prompting.
+
+    Args:
+        tasks (TaskStore | SQLiteTaskStore): The tasks to add to.
+        title (str): The title; an empty title becomes "Task".
+        description (str): The description; an empty one becomes "-".
+        priority (str): One of 'low', 'medium' or 'high', in any case.
+        task_id (int): The ID to use, e.g. from a block reserved with
+            allocate_ids. A fresh ID is allocated if omitted.
+
+    Returns:
+        dict: The operation record describing the change.
+
+    Raises:
+        TypeError: If a field is not a string.
+        ValueError: If the priority is not valid.
+    """
+    fields = check_fields({"title": title, "description": description, "priority": priority})
+
+    # Take the next ID from the store's counter, so IDs of deleted tasks are never reused
+    if task_id is None:
+        task_id = tasks.allocate_id()
+
+    new_task = {"id": task_id, **fields, "status": "pending"}
+    # Fresh IDs are above all others, so a new task comes last in the order of every store
+    appended = bool(query_cache) and task_id not in tasks
+    version = tasks.version
+    tasks.add(new_task)
+    _patch_cache(tasks, version, task_id, appended)
+    return {"op": "add", "task": new_task}
+
+def change_task(tasks, task_id, fields):
+    """
+    Updates fields of an existing task without prompting.
+
+    Args:
+        tasks (TaskStore | SQLiteTaskStore): The tasks, indexed by ID.
+        task_id (int): The ID of the task to update.
+        fields (dict): The fields to overwrite: any of 'title', 'description',
+            'priority' and 'status'. An empty title becomes "Task" and an
+            empty description "-", as when the task was created.
+
+    Returns:
+        dict: The operation record describing the change.
+
+    Raises:
+        TypeError: If a field is not a string.
+        ValueError: If the task does not exist or a field value is not valid.
+    """
+    if task_id not in tasks:
+        raise ValueError(f"Task with ID '{task_id}' not found.")
+    unknown = set(fields) - {"title", "description", "priority", "status"}
+    if unknown:
+        raise ValueError(f"Unknown field '{sorted(unknown)[0]}'.")
+    fields = check_fields(fields)
+    if "status" in fields:
+        # The completion time decides when the task is archived
+        if fields["status"] != tasks.get(task_id)["status"].lower():
+            completed = fields["status"] == "completed"
+            fields["completed_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds") if completed else None
+
+    version = tasks.version
+    tasks.update(task_id, fields)
+    _patch_cache(tasks, version, task_id)
+    return {"op": "update", "id": task_id, "fields": fields}
+
+def remove_task(tasks, task_id):
+    """
+    Deletes a task without prompting, leaving the other IDs untouched.
+
+    Args:
+        tasks (TaskStore | SQLiteTaskStore): The tasks, indexed by ID.
+        task_id (int): The ID of the task to delete.
+
+    Returns:
+        dict: The operation record describing the change.
+
+    Raises:
+        ValueError: If the task does not exist.
+    """
+    version = tasks.version
+    if tasks.remove(task_id) is None:
+        raise ValueError(f"Task with ID '{task_id}' not found.")
+    _patch_cache(tasks, version, task_id)
+    return {"op": "delete", "id": task_id}
 
 def add_task(tasks):
     """
     Prompts the user for task details and adds a new task to the list.
+
+    Returns:
+        dict: The operation record describing the change, or None if cancelled.
     """
+    from rich.prompt import Prompt
     console.print("[bold cyan]Add a New Task[/bold cyan]")
     title = Prompt.ask("Enter Task Title (or type 'back' to return to the menu)")
     if title.lower() == 'back':
@@ -111,35 +433,65 @@ def add_task(tasks):
             if not description:
                 description = "-"
             continue
-        if priority_input in ["low", "medium", "high"]:
+        if priority_input in PRIORITIES:
             priority = priority_input
             break
         else:
             console.print("[bold red]Invalid priority. Please choose from Low, Medium, or High.[/bold red]")
 
+    operation = create_task(tasks, title, description, priority)
+    console.print(f"\n[bold green]✅ Task '{escape(title)}' added successfully![/bold green]")
+    return operation
+
+def _is_store(tasks):
+    """Tells a task store, of any backend, apart from a plain list of tasks."""
+    return hasattr(tasks, "sorted_tasks")
+
+def _sorted_view(tasks):
+    """Returns the tasks as a sliceable view in ascending ID order."""
+    if _is_store(tasks):
+        return tasks.sorted_tasks()
+    if isinstance(tasks, SortedTasks):
+        return tasks
+    return SortedTasks.of(tasks)
+
+def _page_count(tasks, page_size=PAGE_SIZE):
+    """Returns the number of pages needed to show the tasks."""
+    return max(1, -(-len(tasks) // page_size))
+
+@profiling.timed("task.list_tasks")
+def list_tasks(tasks, page=1, page_size=PAGE_SIZE):
+    """
+    Displays one page of tasks in a formatted table.
 
-    # Find the maximum existing ID and add 1, or start from 1 if no tasks exist
-    new_id = max([task.get("id", 0) for task in tasks] + [0]) + 1
+    Only the rows of the requested page are built, so the cost does not grow
+    with the number of tasks.
 
-    new_task = {
-        "id": new_id,
-        "title": title,
-        "description": description,
-        "priority": priority,
-        "status": "pending"  # Changed from 'completed'
-    }
-    tasks.append(new_task)
-    console.print(f"\n[bold green]✅ Task '{escape(title)}' added successfully![/bold green]")
+    Args:
+        tasks (TaskStore | SQLiteTaskStore | SortedTasks | list): The tasks to show.
+        page (int): The page to show, starting at 1. Out-of-range pages are
+            clamped to the first or last page.
+        page_size (int): The number of tasks per page.
 
-def list_tasks(tasks):
-    """
-    Displays all tasks in a formatted table.
+    Returns:
+        int: The page that was shown.
     """
+    from rich.table import Table
     if not tasks:
         console.print("[bold yellow]No tasks found. Add one to get started![/bold yellow]")
-        return
-
-    table = Table(title="[bold blue]Your To-Do List[/bold blue]", show_header=True, header_style="bold magenta")
+        return 1
+
+    view = _sorted_view(tasks)
+    pages = _page_count(view, page_size)
+    page = min(max(page, 1), pages)
+
+    title = "[bold blue]Your To-Do List[/bold blue]"
+    if pages > 1:
+        title += f" [dim](page {page} of {pages})[/dim]"
+    table = Table(title=title, show_header=True, header_style="bold magenta")
+    if _is_store(tasks):
+        # The status index makes these counts free
+        table.caption = f"{tasks.count('status', 'pending')} pending, {tasks.count('status', 'completed')} completed"
     table.add_column("ID", style="dim", width=4)
     table.add_column("Status", width=10)
     table.add_column("Title", min_width=20)
@@ -156,7 +508,7 @@ def list_tasks(tasks):
         "low": "bold green"
     }
 
-    for task in sorted(tasks, key=lambda t: t.get("id", 0)):
+    for task in view[(page - 1) * page_size:page * page_size]:
         task_id_str = escape(str(task.get("id", "N/A")))
         
         # Determine status and row style
@@ -182,14 +534,55 @@ def list_tasks(tasks):
             console.print(f"[bold red]Problematic task data: {task}[/bold red]")
     
     console.print(table)
+    return page
+
+def browse_tasks(tasks):
+    """
+    Pages through tasks interactively, rendering only the visible page.
+    """
+    from rich.prompt import Prompt
+    if not tasks:
+        list_tasks(tasks)
+        return
+
+    if not _is_store(tasks) and not isinstance(tasks, SortedTasks):
+        # Sort plain lists, like search results, once rather than on every page
+        tasks = SortedTasks.of(tasks)
+    view = _sorted_view(tasks)
+
+    page = 1
+    while True:
+        page = list_tasks(tasks, page)
+        pages = _page_count(view)
+        if pages == 1:
+            console.print("[bold yellow]Press Enter to return to menu...[/bold yellow]")
+            input()
+            return
+        choice = Prompt.ask("[n]ext, [p]revious, a task ID to jump to, or [q]uit", default="n" if page < pages else "q")
+        choice = choice.strip().lower()
+        if choice in ("q", "back"):
+            return
+        if choice == "n":
+            page += 1
+        elif choice == "p":
+            page -= 1
+        else:
+            try:
+                position = view.position(int(choice))
+            except ValueError:
+                position = None
+            if position is None:
+                console.print(f"[bold red]No task with ID '{escape(choice)}' in this list.[/bold red]")
+            else:
+                page = position // PAGE_SIZE + 1
 
 def get_task_id(prompt_text, tasks):
     """Helper function to get a valid task ID from the user."""
+    from rich.prompt import Prompt
     if not tasks:
         console.print("[bold yellow]No tasks available to select.[/bold yellow]")
         return None
 
-    valid_ids = [task["id"] for task in tasks]
     while True:
         try:
             task_id_str = Prompt.ask(prompt_text + " (or type 'back' to return to the menu)")
@@ -197,16 +590,22 @@ def get_task_id(prompt_text, tasks):
                 console.print("[yellow]Cancelled.[/yellow]")
                 return None
             task_id = int(task_id_str)
-            if task_id in valid_ids:
+            if task_id in tasks:
                 return task_id
             else:
                 raise ValueError
         except (ValueError, TypeError):
-            console.print(f"[bold red]Error: Invalid ID. Please choose from {', '.join(map(str, sorted(valid_ids)))}.[/bold red]")
+            if len(tasks) <= PAGE_SIZE:
+                console.print(f"[bold red]Error: Invalid ID. Please choose from {', '.join(map(str, sorted(tasks.ids())))}.[/bold red]")
+            else:
+                console.print("[bold red]Error: Invalid ID. Use 'List Tasks' to browse the available IDs.[/bold red]")
 
 def toggle_task_status(tasks):
     """
     Toggles a task's status between 'pending' and 'completed'.
+
+    Returns:
+        dict: The operation record describing the change, or None if cancelled.
     """
     if not tasks:
         console.print("[bold yellow]No tasks to mark.[/bold yellow]")
@@ -219,25 +618,26 @@ def toggle_task_status(tasks):
         return
     
     # Find the task with the matching ID
-    task = next((t for t in tasks if t.get("id") == task_id), None)
+    task = tasks.get(task_id)
     if not task:
         console.print("[bold red]Task not found.[/bold red]")
         return
         
     # Toggle status between 'pending' and 'completed'
-    if task["status"] == "completed":
-        task["status"] = "pending"
-        status_text = "pending"
-    else:
-        task["status"] = "completed"
-        status_text = "completed"
+    status_text = "pending" if task["status"] == "completed" else "completed"
+    operation = change_task(tasks, task_id, {"status": status_text})
     
     console.print(f"\n[bold green]✅ Task '{escape(task['title'])}' marked as {status_text}![/bold green]")
+    return operation
 
 def update_task(tasks):
     """
     Updates the details of an existing task.
+
+    Returns:
+        dict: The operation record describing the change, or None if cancelled.
     """
+    from rich.prompt import Prompt
     if not tasks:
         console.print("[bold yellow]No tasks to update.[/bold yellow]")
         return
@@ -249,7 +649,7 @@ def update_task(tasks):
         if task_id is None:
             return # User chose to go back to the main menu
 
-        task = next((t for t in tasks if t.get("id") == task_id), None)
+        task = tasks.get(task_id)
         if not task:
             console.print("[bold red]Task not found. Please enter a valid ID.[/bold red]")
             continue # Ask for ID again
@@ -318,7 +718,7 @@ def update_task(tasks):
             if priority_input.lower() == 'edit id':
                 restart_task_selection = True
                 break # Break from priority loop, outer loop will restart
-            if priority_input in ["low", "medium", "high"]:
+            if priority_input in PRIORITIES:
                 new_priority = priority_input
                 break
             else:
@@ -330,15 +730,21 @@ def update_task(tasks):
         # If we reach here, all fields are processed for the selected task
         break # Exit the outer task ID selection loop
 
-    task["title"] = new_title
-    task["description"] = new_description
-    task["priority"] = new_priority
+    operation = change_task(tasks, task_id, {"title": new_title, "description": new_description, "priority": new_priority})
     console.print(f"\n[bold green]✅ Task '{escape(new_title)}' updated successfully![/bold green]")
+    return operation
 
 def delete_task(tasks):
     """
-    Deletes a task from the list and re-numbers the remaining tasks.
+    Deletes a task from the list.
+
+    The IDs of the remaining tasks stay as they are; use compact_task_ids to
+    re-number them.
+
+    Returns:
+        dict: The operation record describing the change, or None if cancelled.
     """
+    from rich.prompt import Confirm
     if not tasks:
         console.print("[bold yellow]No tasks to delete.[/bold yellow]")
         return
@@ -350,7 +756,7 @@ def delete_task(tasks):
     if task_id is None:
         return
 
-    task_to_delete = next((task for task in tasks if task["id"] == task_id), None)
+    task_to_delete = tasks.get(task_id)
     if not task_to_delete:
         console.print("[bold red]Task not found.[/bold red]")
         return
@@ -358,13 +764,40 @@ def delete_task(tasks):
     task_title = task_to_delete['title']
     
     if Confirm.ask(f"Are you sure you want to delete the task '[bold red]{escape(task_title)}[/bold red]'?"):
-        # Remove the task
-        tasks.remove(task_to_delete)
-        
-        # Re-number the remaining tasks
-        for i, task in enumerate(tasks):
-            task["id"] = i + 1
+        # Remove the task, leaving the other IDs untouched
+        operation = remove_task(tasks, task_id)
             
-        console.print(f"\n[bold green]✅ Task '{escape(task_title)}' deleted and tasks re-numbered successfully![/bold green]")
+        console.print(f"\n[bold green]✅ Task '{escape(task_title)}' deleted successfully![/bold green]")
+        return operation
+    else:
+        console.print("\n[bold yellow]Task deletion cancelled.[/bold yellow]")
+
+def compact_task_ids(tasks, archive=None):
+    """
+    Re-numbers all tasks from 1, closing the gaps left by deleted tasks.
+
+    Archived tasks keep their IDs, so with an archive the tasks are numbered
+    from one past the highest archived ID instead.
+
+    Args:
+        archive (Archive): The archive of the tasks file, or None.
+
+    Returns:
+        dict: The operation record describing the change, or None if cancelled.
+    """
+    from rich.prompt import Confirm
+    if not tasks:
+        console.print("[bold yellow]No tasks to re-number.[/bold yellow]")
+        return
+
+    try:
+        start = archive.next_id if archive is not None else 1
+    except (OSError, ValueError) as e:
+        console.print(f"[bold red]Error: {escape(str(e))}[/bold red]")
+        return
+    if Confirm.ask(f"Re-number all tasks from {start}? Task IDs you noted down will change"):
+        tasks.renumber(start)
+        console.print("\n[bold green]✅ Tasks re-numbered successfully![/bold green]")
+        return {"op": "renumber", "start": start}
     else:
-        console.print("\n[bold yellow]Task deletion cancelled.[/bold yellow]")
\ No newline at end of file
+        console.print("\n[bold yellow]Re-numbering cancelled.[/bold yellow]")
\ No newline at end of file
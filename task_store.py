@@ -0,0 +1,738 @@
+# task_store.py
+
+import copy
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Mapping
+from itertools import islice
+from columns import CodeColumn, StringColumn
+from query import PRIORITY_ORDER, STATUS_ORDER
+from query_cache import next_version
+from search_index import FuzzyIndex, TextIndex
+
+"""
+This module contains the in-memory container for tasks.
+It keeps every task keyed by its ID so that lookups, existence checks and
+deletions by ID are constant-time, while still iterating in insertion order
+like the plain list it replaces. Secondary indexes used by searches and
+filters are kept in sync on every change; the text index is only built by the
+first search, since it costs more than the rest of loading put together.
+
+Tasks are not stored as dictionaries but in columns (see the 'columns'
+module), one row per task, and handed out as lightweight 'Task' views that
+behave like read-only dictionaries. The target is at most 200 bytes per task
+for the store itself on top of the UTF-8 size of its title and description.
+On 100,000 generated tasks with three-word titles and six-word descriptions,
+tracemalloc measured 222 bytes per task (61 of them text) against 457 for the
+same tasks as a list of dictionaries. The search and filter indexes come on
+top of that.
+"""
+
+# The fields every task has, in the order they are presented
+CORE_FIELDS = ("id", "title", "description", "priority", "status")
+
+# Fields with a small, fixed set of values that get an ID set per value
+FILTER_FIELDS = ("status", "priority")
+
+# Deleted rows are reclaimed once they outnumber the live ones and this minimum
+COMPACTION_MIN_ROWS = 1024
+
+def _check_text(*values):
+    """Raises TypeError unless every value is a string, as the text fields of a task must be."""
+    for value in values:
+        if not isinstance(value, str):
+            raise TypeError(f"Task fields must be strings, not {type(value).__name__}")
+
+class Task(Mapping):
+    """
+    A read-only, dictionary-like view of one task in a TaskStore.
+
+    The view holds only the store and the task ID, and reads every field from
+    the store's columns on access, so it always shows the current values.
+    Assigning a field goes through ``TaskStore.update`` to keep the indexes in
+    sync.
+    """
+
+    __slots__ = ("_store", "_id")
+
+    def __init__(self, store, task_id):
+        self._store = store
+        self._id = task_id
+
+    def __getitem__(self, key):
+        if key == "id":
+            # Known without the store, so even the view of a deleted task can tell which one it was
+            return self._id
+        return self._store._field(self._id, key)
+
+    def __setitem__(self, key, value):
+        self._store.update(self._id, {key: value})
+
+    def __iter__(self):
+        return iter(self._store._keys(self._id))
+
+    def __len__(self):
+        return len(self._store._keys(self._id))
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class SortedTasks:
+    """
+    A read-only view of tasks in ID order that can be indexed and sliced.
+
+    Only the requested window is materialized, so showing one page of a huge
+    list costs the size of the page.
+    """
+
+    def __init__(self, ids, lookup):
+        """
+        Args:
+            ids (list): The task IDs in ascending order.
+            lookup (callable): Maps a task ID to its task.
+        """
+        self._ids = ids
+        self._lookup = lookup
+
+    @classmethod
+    def of(cls, tasks):
+        """Builds a view over a plain list of tasks, such as search results."""
+        by_id = {task["id"]: task for task in tasks}
+        return cls(sorted(by_id), by_id.__getitem__)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._lookup(task_id) for task_id in self._ids[index]]
+        return self._lookup(self._ids[index])
+
+    def position(self, task_id):
+        """Returns the index of a task ID in the view, or None if it is absent."""
+        i = bisect_left(self._ids, task_id)
+        if i < len(self._ids) and self._ids[i] == task_id:
+            return i
+        return None
+
+class OrderedTasks(SortedTasks):
+    """
+    A read-only view of tasks in a given order, such as sorted query results.
+    """
+
+    def __init__(self, tasks):
+        """
+        Args:
+            tasks (iterable): The tasks, in the order to show them.
+        """
+        by_id = {task["id"]: task for task in tasks}
+        super().__init__(list(by_id), by_id.__getitem__)
+        self._positions = {task_id: i for i, task_id in enumerate(self._ids)}
+
+    def position(self, task_id):
+        """Returns the index of a task ID in the view, or None if it is absent."""
+        return self._positions.get(task_id)
+
+class TaskStore:
+    """
+    A columnar collection of tasks indexed by task ID.
+
+    Iterating over the store yields the tasks in the order they were added,
+    and ``len()``/truthiness behave like a list, so code that only reads the
+    tasks does not need to know it is not a list. Tasks must be changed through
+    ``update`` rather than in place, so that the indexes stay accurate.
+    """
+
+    def __init__(self, tasks=(), next_id=1):
+        """
+        Args:
+            tasks (iterable): The initial task dictionaries.
+            next_id (int): The lowest ID the allocator may hand out. It is
+                raised past the highest ID seen, so it never goes backwards.
+        """
+        self.next_id = next_id
+        self._rows = {}  # task ID -> row, in insertion order
+        self._ids = array('q')
+        self._titles = StringColumn()
+        self._descriptions = StringColumn()
+        self._priorities = CodeColumn(("low", "medium", "high"))
+        self._statuses = CodeColumn(("pending", "completed"))
+        self._extra = {}  # task ID -> fields beyond CORE_FIELDS, for the rare task that has any
+        self._dead_rows = 0  # rows of deleted tasks not yet reclaimed
+        self._sorted_ids = []  # all task IDs in ascending order
+        self._text_index = None  # built in one go by the first search
+        self._fuzzy_index = None  # built on top of it by the first fuzzy search
+        self._index_lock = threading.RLock()  # held while either is built, see 'build_indexes'
+        self._field_index = {field: {} for field in FILTER_FIELDS}  # field -> value -> IDs
+        self.version = next_version()  # changes with every change to the tasks (see 'query_cache')
+        for task in tasks:
+            self.add(task)
+
+    @classmethod
+    def from_columns(cls, ids, titles, descriptions, priorities, statuses, extra=None, next_id=1):
+        """
+        Builds a store directly from columns, e.g. those of a binary snapshot.
+
+        The columns are taken over as they are, one row per task, so no task
+        is added one by one; only the indexes are built.
+
+        Args:
+            ids (array): The task IDs, which must be unique.
+            titles (StringColumn): The titles.
+            descriptions (StringColumn): The descriptions.
+            priorities (CodeColumn): The priorities.
+            statuses (CodeColumn): The statuses.
+            extra (dict): Fields beyond CORE_FIELDS by task ID.
+            next_id (int): The lowest ID the allocator may hand out.
+
+        Returns:
+            TaskStore: The new store.
+        """
+        store = cls()
+        store._ids = ids
+        store._titles = titles
+        store._descriptions = descriptions
+        store._priorities = priorities
+        store._statuses = statuses
+        store._extra = dict(extra or {})
+        store._rows = dict(zip(ids, range(len(ids))))
+        if len(store._rows) != len(ids):
+            raise ValueError("Task IDs must be unique")
+        store._sorted_ids = sorted(store._rows)
+        store.next_id = max(next_id, store._sorted_ids[-1] + 1 if ids else 1)
+        for field, column in (("status", statuses), ("priority", priorities)):
+            # Group the IDs by code first, so each value's set is built in one pass
+            groups = [[] for _ in column.values]
+            for task_id, code in zip(ids, column.codes()):
+                groups[code].append(task_id)
+            values = store._field_index[field]
+            for value, group in zip(column.values, groups):
+                if group:
+                    values.setdefault(value.lower(), set()).update(group)
+        return store
+
+    def columns(self):
+        """
+        Returns copies of the columns holding only the live rows, in insertion order.
+
+        Returns:
+            dict: The 'ids', 'titles', 'descriptions', 'priorities', 'statuses'
+            and 'extra' columns, as accepted by ``from_columns``.
+        """
+        rows = list(self._rows.values())
+        return {
+            "ids": array('q', (self._ids[row] for row in rows)),
+            "titles": self._titles.take(rows),
+            "descriptions": self._descriptions.take(rows),
+            "priorities": self._priorities.take(rows),
+            "statuses": self._statuses.take(rows),
+            "extra": dict(self._extra)
+        }
+
+    def _text(self):
+        """
+        Returns the text index, indexing the text of every task at once on first use.
+
+        Most sessions never search, so loading a store does not pay for the
+        index; until it exists, changes do not need to maintain it either.
+        """
+        if self._text_index is None:
+            with self._index_lock:
+                # Another thread may have built it while this one waited
+                if self._text_index is None:
+                    self._text_index = TextIndex.build(
+                        (task_id, self._titles[row], self._descriptions[row]) for task_id, row in self._rows.items()
+                    )
+        return self._text_index
+
+    def _fuzzy(self):
+        """Returns the fuzzy index, building it, and the text index, on first use."""
+        if self._fuzzy_index is None:
+            with self._index_lock:
+                if self._fuzzy_index is None:
+                    self._fuzzy_index = FuzzyIndex.build(
+                        self._text(), ((task_id, self._titles[row]) for task_id, row in self._rows.items())
+                    )
+        return self._fuzzy_index
+
+    def build_indexes(self):
+        """
+        Builds the text and fuzzy indexes now rather than on the first search.
+
+        On a large store that takes seconds, which a long-running process
+        would rather spend when it starts than on the user's first typo. The
+        tasks must not change meanwhile; a search on another thread waits for
+        the index it needs instead of building it a second time.
+        """
+        self._fuzzy()
+
+    def __iter__(self):
+        for task_id in self._rows:
+            yield Task(self, task_id)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, task_id):
+        return task_id in self._rows
+
+    def _field(self, task_id, key):
+        """Reads one field of a task from the columns."""
+        row = self._rows[task_id]
+        if key == "id":
+            return task_id
+        if key == "title":
+            return self._titles[row]
+        if key == "description":
+            return self._descriptions[row]
+        if key == "priority":
+            return self._priorities[row]
+        if key == "status":
+            return self._statuses[row]
+        return self._extra.get(task_id, {})[key]
+
+    def _keys(self, task_id):
+        """Returns the field names of a task."""
+        if task_id not in self._rows:
+            raise KeyError(task_id)
+        extra = self._extra.get(task_id)
+        return CORE_FIELDS + tuple(extra) if extra else CORE_FIELDS
+
+    def _task(self, task_id):
+        return Task(self, task_id)
+
+    def get(self, task_id):
+        """Returns the task with the given ID, or None if it does not exist."""
+        return Task(self, task_id) if task_id in self._rows else None
+
+    def ids(self):
+        """Returns a view of all task IDs in insertion order."""
+        return self._rows.keys()
+
+    def sorted_tasks(self):
+        """Returns a live view of the tasks in ascending ID order."""
+        return SortedTasks(self._sorted_ids, self._task)
+
+    def allocate_id(self):
+        """Hands out a fresh task ID that has never been used in this store."""
+        return self.allocate_ids(1)[0]
+
+    def allocate_ids(self, count):
+        """
+        Hands out a block of consecutive fresh task IDs for bulk inserts.
+
+        Args:
+            count (int): The number of IDs to reserve.
+
+        Returns:
+            range: The reserved IDs.
+        """
+        ids = range(self.next_id, self.next_id + count)
+        self.next_id += count
+        return ids
+
+    def _index(self, task_id, row):
+        """Adds a task to the secondary indexes."""
+        if self._text_index is not None:
+            self._text_index.add(task_id, self._titles[row], self._descriptions[row])
+        if self._fuzzy_index is not None:
+            self._fuzzy_index.add(task_id, self._titles[row], self._descriptions[row])
+        for field, column in (("status", self._statuses), ("priority", self._priorities)):
+            self._field_index[field].setdefault(column[row].lower(), set()).add(task_id)
+
+    def _unindex(self, task_id, row):
+        """Removes a task from the secondary indexes."""
+        if self._text_index is not None:
+            self._text_index.remove(task_id, self._titles[row], self._descriptions[row])
+        if self._fuzzy_index is not None:
+            self._fuzzy_index.remove(task_id, self._titles[row], self._descriptions[row])
+        for field, column in (("status", self._statuses), ("priority", self._priorities)):
+            values = self._field_index[field]
+            value = column[row].lower()
+            values[value].discard(task_id)
+            if not values[value]:
+                del values[value]
+
+    def _in_order(self, ids):
+        """Returns the tasks with the given IDs in insertion order."""
+        return [Task(self, task_id) for task_id in sorted(ids, key=self._rows.__getitem__)]
+
+    def _matches(self, row, term):
+        """Tells whether a lowercased term occurs in a row's title or description."""
+        return term in self._titles[row].lower() or term in self._descriptions[row].lower()
+
+    def add(self, task):
+        """
+        Adds a task to the store, replacing any task with the same ID.
+
+        Args:
+            task (dict): The task to add. It must have an integer 'id' key;
+                missing text fields are stored as empty strings.
+
+        Raises:
+            TypeError: If the ID is not an integer or a text field is not a
+                string. The store is left unchanged.
+        """
+        task_id = task["id"]
+        title, description, priority, status = (task.get(field, "") for field in CORE_FIELDS[1:])
+        # Check and encode everything first, so that a bad task cannot leave the columns out of line
+        if not (type(title) is type(description) is type(priority) is type(status) is str):
+            _check_text(title, description, priority, status)
+        title, description = title.encode("utf-8"), description.encode("utf-8")
+        extra = {key: value for key, value in task.items() if key not in CORE_FIELDS}
+
+        row = self._rows.get(task_id)
+        if row is not None:
+            self._unindex(task_id, row)
+            self._titles.set_encoded(row, title)
+            self._descriptions.set_encoded(row, description)
+            self._priorities[row] = priority
+            self._statuses[row] = status
+        else:
+            # Appending the ID fails for anything but an integer, before anything else is changed
+            self._ids.append(task_id)
+            row = self._rows[task_id] = len(self._ids) - 1
+            self._titles.append_encoded(title)
+            self._descriptions.append_encoded(description)
+            self._priorities.append(priority)
+            self._statuses.append(status)
+            # New IDs come from the counter, so this is almost always an append
+            if not self._sorted_ids or task_id > self._sorted_ids[-1]:
+                self._sorted_ids.append(task_id)
+            else:
+                insort(self._sorted_ids, task_id)
+
+        if extra:
+            self._extra[task_id] = extra
+        else:
+            self._extra.pop(task_id, None)
+        self._index(task_id, row)
+        if task_id >= self.next_id:
+            self.next_id = task_id + 1
+        self.version = next_version()
+
+    def update(self, task_id, fields):
+        """
+        Updates fields of an existing task.
+
+        Args:
+            task_id (int): The ID of the task to update.
+            fields (dict): The fields to overwrite. The ID cannot be changed.
+
+        Returns:
+            Task: The updated task, or None if it does not exist.
+        """
+        row = self._rows.get(task_id)
+        if row is None:
+            return None
+        if "id" in fields:
+            raise ValueError("The ID of a task cannot be changed")
+        _check_text(*(fields[field] for field in CORE_FIELDS[1:] if field in fields))
+
+        self._unindex(task_id, row)
+        for key, value in fields.items():
+            if key == "title":
+                self._titles[row] = value
+            elif key == "description":
+                self._descriptions[row] = value
+            elif key == "priority":
+                self._priorities[row] = value
+            elif key == "status":
+                self._statuses[row] = value
+            else:
+                self._extra.setdefault(task_id, {})[key] = value
+        self._index(task_id, row)
+        self._maybe_compact()
+        self.version = next_version()
+        return Task(self, task_id)
+
+    def remove(self, task_id):
+        """
+        Removes a task from the store.
+
+        The row is left behind as a tombstone and reclaimed by ``compact``,
+        which runs by itself once deleted rows outnumber live ones.
+
+        Args:
+            task_id (int): The ID of the task to remove.
+
+        Returns:
+            dict: A copy of the removed task, or None if it does not exist.
+        """
+        if task_id not in self._rows:
+            return None
+        task = self._drop(task_id)
+        del self._sorted_ids[bisect_left(self._sorted_ids, task_id)]
+        self._maybe_compact()
+        self.version = next_version()
+        return task
+
+    def remove_many(self, task_ids):
+        """
+        Removes many tasks at once, e.g. the tasks moved to the archive.
+
+        Unlike removing them one by one, this rebuilds the list of sorted IDs
+        only once, so the cost does not grow with the product of the number of
+        tasks removed and the size of the store.
+
+        Args:
+            task_ids (iterable): The IDs of the tasks to remove; IDs that do not exist are skipped.
+
+        Returns:
+            list: Copies of the removed tasks.
+        """
+        removed = [self._drop(task_id) for task_id in dict.fromkeys(task_ids) if task_id in self._rows]
+        if removed:
+            self._sorted_ids = [task_id for task_id in self._sorted_ids if task_id in self._rows]
+            self._maybe_compact()
+            self.version = next_version()
+        return removed
+
+    def _drop(self, task_id):
+        """Removes an existing task, except from the sorted IDs, and returns a copy of it."""
+        task = dict(Task(self, task_id))
+        row = self._rows.pop(task_id)
+        self._unindex(task_id, row)
+        self._titles.drop(row)
+        self._descriptions.drop(row)
+        self._extra.pop(task_id, None)
+        self._dead_rows += 1
+        return task
+
+    def _maybe_compact(self):
+        """Compacts once deleted rows or overwritten text outweigh the live data."""
+        if self._dead_rows > max(len(self._rows), COMPACTION_MIN_ROWS):
+            self.compact()
+            return
+        garbage = self._titles.garbage + self._descriptions.garbage
+        if garbage > max(len(self._titles.data) + len(self._descriptions.data) - garbage, COMPACTION_MIN_ROWS * 64):
+            self.compact()
+
+    def compact(self):
+        """Reclaims the rows of deleted tasks and the text they left behind."""
+        rows = list(self._rows.values())
+        self._ids = array('q', (self._ids[row] for row in rows))
+        self._titles = self._titles.take(rows)
+        self._descriptions = self._descriptions.take(rows)
+        self._priorities = self._priorities.take(rows)
+        self._statuses = self._statuses.take(rows)
+        self._rows = {task_id: row for row, task_id in enumerate(self._ids)}
+        self._dead_rows = 0
+
+    def renumber(self, start=1):
+        """
+        Re-numbers all tasks in their current order.
+
+        Args:
+            start (int): The first ID, e.g. one past the IDs that archived tasks keep.
+        """
+        tasks = [dict(task) for task in self]
+        for i, task in enumerate(tasks):
+            task["id"] = start + i
+        # Re-numbering is the one place where IDs are allowed to be reused
+        self.__init__(tasks, next_id=start)
+
+    def search(self, search_term):
+        """
+        Finds the tasks whose title or description contains a term.
+
+        Matching is a case-insensitive substring test, answered from the text
+        index; only terms without any word characters fall back to a scan.
+
+        Args:
+            search_term (str): The term to search for.
+
+        Returns:
+            list: The matching tasks in insertion order.
+        """
+        search_term = search_term.lower()
+        found = self._text().lookup(search_term)
+        if found is None:
+            ids = (task_id for task_id, row in self._rows.items() if self._matches(row, search_term))
+            return [Task(self, task_id) for task_id in ids]
+        ids, exact = found
+        if not exact:
+            ids = [task_id for task_id in ids if self._matches(self._rows[task_id], search_term)]
+        return self._in_order(ids)
+
+    def fuzzy_search(self, search_term, limit):
+        """
+        Finds the tasks whose words are most similar to a term, best first.
+
+        Typos still match, and words in the title count more than words in
+        the description (see 'search_index.FuzzyIndex').
+
+        Args:
+            search_term (str): The term to search for.
+            limit (int): The most tasks to return.
+
+        Returns:
+            list: The best matching tasks, best first.
+        """
+        return [Task(self, task_id) for _, task_id in self._fuzzy().search(search_term, limit)]
+
+    def count(self, field, value):
+        """
+        Counts the tasks with a given status or priority without scanning.
+
+        Args:
+            field (str): Either 'status' or 'priority'.
+            value (str): The value to count, compared case-insensitively.
+
+        Returns:
+            int: The number of matching tasks.
+        """
+        return len(self._field_index[field].get(value.lower(), ()))
+
+    def filter(self, *criteria):
+        """
+        Finds the tasks matching every criterion.
+
+        Each criterion matches a task whose status or priority equals it, and
+        the ID sets of all criteria are intersected, smallest first.
+
+        Args:
+            *criteria (str): The criteria, compared case-insensitively.
+
+        Returns:
+            list: The matching tasks in insertion order.
+        """
+        id_sets = []
+        for criterion in criteria:
+            criterion = criterion.lower()
+            id_sets.append(set().union(*(values.get(criterion, ()) for values in self._field_index.values())))
+        if not id_sets:
+            return list(self)
+        id_sets.sort(key=len)
+        return self._in_order(id_sets[0].intersection(*id_sets[1:]))
+
+    def _plan(self, query):
+        """
+        Picks the cheapest way to find the candidates for a query.
+
+        Every access path is costed by the number of candidates it yields:
+        the ID range by binary search in the sorted IDs, status and priority
+        by the size of their ID sets, and text by its index lookup. A text
+        index that has not been built yet would cost a pass over every task,
+        so it is only built when the alternative is a scan. The cheapest path
+        drives, and the ID sets of the others are intersected with it, which
+        costs no more than the driver's size.
+
+        Args:
+            query (Query): The parsed query.
+
+        Returns:
+            tuple: The candidate IDs, or None to scan every task; whether they
+            are in ascending ID order; and the query reduced to the conditions
+            the candidates still have to be checked against.
+        """
+        residual = copy.copy(query)
+        residual.terms = list(query.terms)
+        paths = []  # (cost, candidate IDs), with exact ID sets only
+        for field, values in (("status", query.statuses), ("priority", query.priorities)):
+            if values is not None:
+                index = self._field_index[field]
+                sets = [index.get(value, set()) for value in values]
+                paths.append(sets[0] if len(sets) == 1 else set().union(*sets))
+                setattr(residual, "statuses" if field == "status" else "priorities", None)
+
+        id_range = None
+        if query.id_range is not None:
+            low, high = query.id_range
+            start = 0 if low is None else bisect_left(self._sorted_ids, low)
+            stop = len(self._sorted_ids) if high is None else bisect_right(self._sorted_ids, high)
+            id_range = self._sorted_ids[start:stop] if start < stop else []
+
+        smallest = min([len(ids) for ids in paths] + ([len(id_range)] if id_range is not None else []), default=len(self._rows))
+        if query.terms and (smallest >= len(self._rows) or self._text_index is not None):
+            for term in query.terms:
+                found = self._text().lookup(term)
+                if found is not None and found[1]:
+                    paths.append(found[0])
+                    residual.terms.remove(term)
+                elif found is not None and len(found[0]) < smallest:
+                    # Only candidates, to be checked against the term
+                    paths.append(set(found[0]))
+                    smallest = len(found[0])
+
+        if id_range is not None and all(len(id_range) <= len(ids) for ids in paths):
+            # The range drives, in ID order, and the sets only need membership tests
+            residual.id_range = None
+            return [task_id for task_id in id_range if all(task_id in ids for ids in paths)], True, residual
+        if not paths:
+            return None, False, residual
+        paths.sort(key=len)
+        candidates = paths[0].intersection(*paths[1:]) if len(paths) > 1 else paths[0]
+        return candidates, False, residual
+
+    def _meets(self, task_id, query):
+        """Tells whether the task with an ID meets every condition of a query."""
+        row = self._rows[task_id]
+        if query.statuses is not None and self._statuses[row].lower() not in query.statuses:
+            return False
+        if query.priorities is not None and self._priorities[row].lower() not in query.priorities:
+            return False
+        if not query.in_id_range(task_id):
+            return False
+        return all(self._matches(row, term) for term in query.terms)
+
+    def _grouped(self, field, order, ids, descending):
+        """
+        Yields IDs sorted by a status or priority, from its index, group by group.
+
+        Within a group the IDs keep their insertion order; values outside the
+        known order come last, or first when descending, like with sorted().
+        """
+        index = self._field_index[field]
+        groups = [index.get(value, ()) for value in order]
+        groups.append([task_id for value, group in index.items() if value not in order for task_id in group])
+        if descending:
+            groups.reverse()
+        wanted = None if ids is None else ids if isinstance(ids, set) else set(ids)
+        for group in groups:
+            members = group if wanted is None else wanted.intersection(group)
+            yield from sorted(members, key=self._rows.__getitem__)
+
+    def query(self, query):
+        """
+        Yields the tasks matching a query, in its order and up to its limit.
+
+        The candidates come from the cheapest access path (see ``_plan``) and
+        are checked against the conditions that path does not guarantee, so
+        the path only decides how much work is done, never the result. Tasks
+        sorted by ID, status or priority come straight out of the ID order or
+        the field index, so the work stops at the limit like it does without
+        sorting; only sorting by title has to see every match.
+
+        Args:
+            query (Query): The parsed query, see the 'query' module.
+
+        Returns:
+            iterator: The matching tasks.
+        """
+        ids, by_id, residual = self._plan(query)
+        if query.sort == "id":
+            if ids is None:
+                ids = self._sorted_ids
+            elif not by_id:
+                ids = sorted(ids)
+            ids = reversed(ids) if query.descending else ids
+        elif query.sort in ("status", "priority"):
+            order = STATUS_ORDER if query.sort == "status" else PRIORITY_ORDER
+            ids = self._grouped(query.sort, order, ids, query.descending)
+        elif ids is None:
+            ids = self._rows
+        else:
+            # Candidates go back to insertion order, which ties keep when sorting
+            ids = sorted(ids, key=self._rows.__getitem__)
+
+        matching = (task_id for task_id in ids if self._meets(task_id, residual))
+        if query.sort == "title":
+            key = lambda task_id: self._titles[self._rows[task_id]].casefold()
+            if query.limit is None:
+                matching = sorted(matching, key=key, reverse=query.descending)
+            else:
+                matching = (heapq.nlargest if query.descending else heapq.nsmallest)(query.limit, matching, key=key)
+        return (Task(self, task_id) for task_id in islice(matching, query.limit))
@@ -0,0 +1,38 @@
+# tests/conftest.py
+
+import random
+
+"""
+Helpers shared by the tests: random tasks with a mix of statuses, priorities
+and words, including accented ones, for the tests to build stores from.
+"""
+
+WORDS = ["gym", "milk", "call", "mom", "dentist", "buy", "read", "book", "walk", "café", "Éclair", "a-b"]
+
+def generate_tasks(count, seed, spacing=1, shuffled=False):
+    """
+    Returns random tasks with a mix of statuses, priorities and words.
+
+    Args:
+        count (int): The number of tasks.
+        seed (int): The seed of the random choices, so a test sees the same tasks every run.
+        spacing (int): The distance between consecutive IDs, which start at 1.
+        shuffled (bool): Whether the tasks come in a random ID order rather than ascending.
+
+    Returns:
+        list: The tasks as dictionaries.
+    """
+    rng = random.Random(seed)
+    ids = list(range(1, count * spacing + 1, spacing))
+    if shuffled:
+        rng.shuffle(ids)
+    return [
+        {
+            "id": task_id,
+            "title": " ".join(rng.sample(WORDS, 2)),
+            "description": rng.choice(WORDS + [""]),
+            "priority": rng.choice(["low", "medium", "high"]),
+            "status": rng.choice(["pending", "completed"])
+        }
+        for task_id in ids
+    ]
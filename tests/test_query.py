@@ -0,0 +1,104 @@
+# tests/test_query.py
+
+import random
+import pytest
+from conftest import WORDS, generate_tasks
+from query import parse_query
+from sqlite_store import SQLiteTaskStore
+from task import filter_tasks, query_tasks
+from task_store import TaskStore
+
+"""
+Tests of the query planner: every store must return exactly what running the
+query over the plain list of tasks returns, whichever access path it picks.
+"""
+
+def random_query(rng, count):
+    """Returns a random query text covering every kind of term."""
+    terms = []
+    if rng.random() < 0.5:
+        terms.append("status:" + ",".join(rng.sample(["pending", "completed"], rng.randint(1, 2))))
+    if rng.random() < 0.2:
+        terms.append("status:" + rng.choice(["pending", "completed"]))
+    if rng.random() < 0.5:
+        terms.append("priority:" + ",".join(rng.sample(["low", "medium", "high"], rng.randint(1, 3))))
+    if rng.random() < 0.5:
+        word = rng.choice(WORDS)
+        start = rng.randint(0, len(word) - 1)
+        terms.append("text:" + word[start:start + rng.randint(1, len(word))])
+    if rng.random() < 0.4:
+        low, high = sorted(rng.sample(range(count * 3), 2))
+        terms.append(rng.choice([f"id:{low}..{high}", f"id:{low}..", f"id:..{high}", f"id:{low}"]))
+    if rng.random() < 0.5:
+        terms.append("sort:" + rng.choice(["", "-"]) + rng.choice(["id", "title", "status", "priority"]))
+    if rng.random() < 0.4:
+        terms.append(f"limit:{rng.randint(0, 30)}")
+    return " ".join(terms)
+
+def expected(tasks, text):
+    """Runs a query over the plain list of tasks."""
+    return [task["id"] for task in parse_query(text).apply(tasks)]
+
+@pytest.fixture(params=["memory", "memory-indexed", "sqlite"])
+def make_store(request, tmp_path):
+    """Builds a store of each kind from a list of tasks; 'memory-indexed' has its text index built."""
+    def make(tasks):
+        if request.param == "sqlite":
+            store = SQLiteTaskStore(str(tmp_path / "tasks.db"))
+            for task in tasks:
+                store.add(task)
+            request.addfinalizer(store.close)
+            return store
+        store = TaskStore(tasks)
+        if request.param == "memory-indexed":
+            store.search("gym")
+        return store
+    return make
+
+def test_contradicting_statuses_find_nothing(make_store):
+    tasks = generate_tasks(50, seed=1, spacing=3, shuffled=True)
+    store = make_store(tasks)
+    assert query_tasks(store, "status:pending status:completed") == []
+    assert query_tasks(store, "status:pending status:completed sort:priority limit:5") == []
+
+def test_filter_with_contradicting_criteria_finds_nothing(make_store):
+    store = make_store(generate_tasks(50, seed=2, spacing=3, shuffled=True))
+    assert filter_tasks(store, "pending completed") == []
+
+@pytest.mark.parametrize("seed", range(5))
+def test_planner_matches_a_scan(make_store, seed):
+    tasks = generate_tasks(300, seed, spacing=3, shuffled=True)
+    store = make_store(tasks)
+    rng = random.Random(seed)
+    for _ in range(200):
+        text = random_query(rng, len(tasks))
+        assert [task["id"] for task in store.query(parse_query(text))] == expected(tasks, text), text
+
+def test_planner_matches_a_scan_after_changes(make_store):
+    tasks = generate_tasks(200, seed=7, spacing=3, shuffled=True)
+    store = make_store(tasks)
+    rng = random.Random(7)
+    for task in rng.sample(tasks, 40):
+        store.remove(task["id"])
+    for task in rng.sample([task for task in tasks if task["id"] in store], 40):
+        store.update(task["id"], {"status": "completed", "title": rng.choice(WORDS)})
+    current = [dict(task) for task in store]
+    for _ in range(200):
+        text = random_query(rng, len(tasks))
+        assert [task["id"] for task in store.query(parse_query(text))] == expected(current, text), text
+
+def test_fuzzy_search_ranks_like_the_in_memory_index(make_store):
+    tasks = generate_tasks(300, seed=8, spacing=3, shuffled=True)
+    store = make_store(tasks)
+    rng = random.Random(8)
+    store.fuzzy_search("gym", 5)
+    # Changed after the first search, so the index has to follow the changes
+    for task in rng.sample(tasks, 40):
+        store.remove(task["id"])
+    for task in rng.sample([task for task in tasks if task["id"] in store], 40):
+        store.update(task["id"], {"title": rng.choice(WORDS) + " " + rng.choice(WORDS)})
+    reference = TaskStore([dict(task) for task in store])
+    for term in ["dentsit", "gmy", "cafe", "eclair apointment", "zzz", rng.choice(WORDS)[1:]]:
+        for limit in (1, 5, 50):
+            found = [dict(task) for task in store.fuzzy_search(term, limit)]
+            assert found == [dict(task) for task in reference.fuzzy_search(term, limit)], term
@@ -0,0 +1,116 @@
+# tests/test_query_cache.py
+
+import random
+import pytest
+import task
+from conftest import WORDS, generate_tasks
+from file_handling import load_tasks, save_tasks
+from query_cache import QueryCache
+from sqlite_store import SQLiteTaskStore
+from task import (
+    PRIORITIES, STATUSES, change_task, create_task, filter_tasks, fuzzy_search_tasks, query_tasks, remove_task,
+    search_tasks
+)
+from task_store import TaskStore
+
+"""
+Tests of the query cache: whatever the changes in between, a result answered
+or patched by the cache must equal the result of running the query afresh.
+"""
+
+QUERIES = [
+    (search_tasks, "gym"),
+    (search_tasks, "éc"),
+    (search_tasks, "mo"),
+    (filter_tasks, "pending"),
+    (filter_tasks, "high completed"),
+    (query_tasks, "status:pending text:gym"),
+    (query_tasks, "priority:low sort:title"),
+    (query_tasks, "status:completed limit:5"),
+    (fuzzy_search_tasks, "dentsit"),
+]
+
+@pytest.fixture(params=["memory", "sqlite", "shards"])
+def store(request, tmp_path, monkeypatch):
+    """Returns a store of each kind holding the same tasks, with an empty cache of its own."""
+    monkeypatch.setattr(task, "query_cache", QueryCache())
+    tasks = generate_tasks(300, seed=1)
+    if request.param == "memory":
+        return TaskStore(tasks)
+    if request.param == "sqlite":
+        store = SQLiteTaskStore(str(tmp_path / "tasks.db"))
+        for new_task in tasks:
+            store.add(new_task)
+        request.addfinalizer(store.close)
+        return store
+    path = str(tmp_path / "tasks.shards")
+    save_tasks(TaskStore(tasks), path)
+    return load_tasks(path)
+
+def run_fresh(tasks, function, argument):
+    """Runs a query against an empty cache, leaving the cache of the test alone."""
+    cache = task.query_cache
+    task.query_cache = QueryCache()
+    try:
+        return [dict(found) for found in function(tasks, argument)]
+    finally:
+        task.query_cache = cache
+
+def change(tasks, rng):
+    """Applies one random change to the tasks, or none."""
+    ids = list(tasks.ids())
+    choice = rng.random()
+    if choice < 0.4:
+        return
+    if choice < 0.6:
+        create_task(tasks, rng.choice(WORDS), rng.choice(WORDS), rng.choice(PRIORITIES))
+    elif choice < 0.8:
+        fields = rng.choice([
+            {"status": rng.choice(STATUSES)}, {"priority": rng.choice(PRIORITIES)}, {"title": rng.choice(WORDS)}
+        ])
+        change_task(tasks, rng.choice(ids), fields)
+    elif choice < 0.97:
+        remove_task(tasks, rng.choice(ids))
+    elif choice < 0.99:
+        tasks.remove_many(rng.sample(ids, 3))
+    else:
+        tasks.renumber(rng.randint(1, 50))
+
+def test_cached_results_match_fresh_ones_after_changes(store):
+    rng = random.Random(2)
+    for _ in range(1500):
+        change(store, rng)
+        function, argument = rng.choice(QUERIES)
+        assert [dict(found) for found in function(store, argument)] == run_fresh(store, function, argument)
+    stats = task.query_cache.stats()
+    assert stats["hits"] and stats["patches"]
+
+def test_results_are_copies(store):
+    found = search_tasks(store, "gym")
+    found.clear()
+    assert search_tasks(store, "gym") == run_fresh(store, search_tasks, "gym")
+
+def test_cache_stays_within_its_bounds():
+    cache = QueryCache(max_entries=2, max_tasks=5)
+    cache.put(("a",), 1, [1, 2])
+    cache.put(("b",), 1, [3, 4])
+    assert cache.get(("a",), 1) == [1, 2]
+    cache.put(("c",), 1, [5])
+    # Over the entry bound, so the least recently used result, "b", goes
+    assert cache.get(("b",), 1) is None
+    assert cache.get(("a",), 1) == [1, 2]
+    cache.put(("d",), 1, [6, 7, 8, 9])
+    assert cache.stats()["tasks"] <= 5
+    cache.put(("e",), 1, list(range(6)))
+    assert cache.get(("e",), 1) is None
+    assert cache.get(("a",), 2) is None
+
+def test_patching_keeps_the_cache_within_its_bounds():
+    cache = QueryCache(max_tasks=5)
+    cache.put(("old",), 1, [{"id": 1}, {"id": 2}], matches=lambda task: True)
+    cache.put(("new",), 1, [{"id": 3}, {"id": 4}, {"id": 5}], matches=lambda task: True)
+    cache.patch(1, 2, 6, {"id": 6}, appended=True)
+    # Both results grew, so the least recently used one went
+    assert cache.stats()["tasks"] <= 5
+    assert cache.get(("old",), 2) is None
+    assert [task["id"] for task in cache.get(("new",), 2)] == [3, 4, 5, 6]
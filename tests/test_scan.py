@@ -0,0 +1,78 @@
+# tests/test_scan.py
+
+import os
+import random
+import pytest
+import file_handling
+from conftest import WORDS, generate_tasks
+from file_handling import Archive, archive_tasks, iter_tasks, load_tasks, record_operations, save_tasks, scan_tasks
+from query import parse_query
+from task import change_task, create_task, remove_task, scan_filter_tasks, scan_query_tasks, scan_search_tasks
+from task_store import TaskStore
+
+"""
+Tests of the parallel scan: splitting a file into chunks read by worker
+processes must return exactly what one streamed scan of the file returns,
+in the same order, including the changes still in the operation log.
+"""
+
+SCANS = [
+    (scan_search_tasks, "gym"),
+    (scan_search_tasks, "é"),
+    (scan_filter_tasks, "completed high"),
+    (scan_query_tasks, parse_query("status:pending text:mo")),
+]
+
+@pytest.fixture(params=[".json", ".bin", ".shards"])
+def changed_file(request, tmp_path):
+    """Saves tasks in each scannable format, then journals archives, adds, updates and deletes."""
+    path = str(tmp_path / ("tasks" + request.param))
+    # IDs 50 apart spread the tasks over several shards
+    save_tasks(TaskStore(generate_tasks(600, seed=3, spacing=50)), path)
+    tasks = load_tasks(path)
+    # Archived first: it rewrites the snapshot, so the changes after it stay in the log
+    operation = archive_tasks(tasks, Archive(path), days=0)
+    assert operation["ids"]
+    record_operations(tasks, [operation], path)
+    rng = random.Random(4)
+    operations = []
+    for _ in range(40):
+        task_id = rng.choice(list(tasks.ids()))
+        operations.append(change_task(tasks, task_id, {"title": "gym " + rng.choice(WORDS), "status": "pending"}))
+    operations += [remove_task(tasks, task_id) for task_id in rng.sample(list(tasks.ids()), 30)]
+    operations += [create_task(tasks, "gym " + rng.choice(WORDS), rng.choice(WORDS), "high") for _ in range(20)]
+    record_operations(tasks, operations, path)
+    if request.param != ".shards":
+        assert os.path.getsize(path + ".log") > 0
+    return path, [dict(task) for task in tasks]
+
+@pytest.mark.parametrize("function, argument", SCANS)
+@pytest.mark.parametrize("workers", [2, 3, 7])
+def test_parallel_scan_matches_a_serial_scan(changed_file, function, argument, workers, monkeypatch):
+    path, tasks = changed_file
+    scans = []
+    scan_in_parallel = file_handling._scan_in_parallel
+
+    def record_scan(file_path, chunks, *args):
+        # scan_tasks falls back to a serial scan on errors, which would hide them
+        found = scan_in_parallel(file_path, chunks, *args)
+        scans.append(len(chunks))
+        return found
+
+    monkeypatch.setattr(file_handling, "_scan_in_parallel", record_scan)
+    serial = [dict(task) for task in function(iter_tasks(path), argument)]
+    assert serial == [dict(task) for task in function(tasks, argument)]
+    assert [dict(task) for task in scan_tasks(path, function, argument, workers=workers, min_bytes=0)] == serial
+    assert scans and scans[0] > 1
+
+def test_small_files_are_scanned_serially(changed_file):
+    path, tasks = changed_file
+    assert scan_tasks(path, scan_search_tasks, "gym") == list(scan_search_tasks(iter_tasks(path), "gym"))
+
+@pytest.mark.parametrize("extension", [".json", ".bin"])
+def test_empty_files_hold_no_tasks(tmp_path, extension):
+    path = str(tmp_path / ("tasks" + extension))
+    open(path, "wb").close()
+    assert len(load_tasks(path)) == 0
+    assert list(iter_tasks(path)) == []
+    assert scan_tasks(path, scan_search_tasks, "gym", workers=2, min_bytes=0) == []